@@ -1,311 +1,511 @@
 import streamlit as st
-import google.generativeai as genai
-import json
-import re
 import os
-import hashlib
 from datetime import datetime
 
-try:
-    from prompt import LG_SYSTEM_PROMPT
-    PROMPT_AVAILABLE = True
-except ImportError:
-    LG_SYSTEM_PROMPT = "LG Art Director System STEP 2 v5.9.0 System Prompt Placeholder"
-    PROMPT_AVAILABLE = False
-
-APP_TITLE = "LG Art Director System STEP 2 v5.9.0"
+from core import (
+    MODEL_OPTIONS,
+    HOUSING_TYPE_OPTIONS,
+    HOUSING_TYPE_LABELS,
+    INTERIOR_STYLE_OPTIONS,
+    INTERIOR_STYLE_LABELS,
+    ROOM_TYPE_OPTIONS,
+    ENTROPY_LEVELS,
+    OUTPUT_PRESET_OPTIONS,
+    OUTPUT_PRESET_LABELS,
+    REGION_OPTIONS,
+    REGION_LABELS,
+    CITY_OPTIONS,
+    ASPECT_RATIO_OPTIONS,
+    ASPECT_RATIO_LABELS,
+    PROMPT_AVAILABLE,
+    GENERATION_CONFIG,
+    SYSTEM_VERSION,
+    get_system_prompt,
+    get_prompt_hash,
+    get_version,
+    estimate_tokens,
+    default_settings,
+    parse_step1_json,
+    apply_step1_values,
+    get_chat_session,
+    build_assistant_message,
+    make_assistant_message,
+    repair_handoff,
+    build_combined_prompt,
+    derived_handoff,
+    chunk_text,
+    StreamingHandoffDetector,
+)
+from backends import create_backend
+from fake_responses import render_canned_response
+from model_catalog import backend_fingerprint, get_model_catalog
+from cache import ResponseCache, make_cache_key
+from prompt_sections import assemble_system_prompt
+from handoff_schema import SCHEMA_VALIDATION_AVAILABLE, validate_step1
+from fanout import run_fanout
+from variants import DEFAULT_VARIANTS, MAX_VARIANTS, run_variants
+from qa_lint import ERROR, lint_response, qa_summary
+from step3_rules import merge_derived, rules_version
+from session_store import build_session_history, get_session_store, message_meta, turn_messages
+from handoff_store import get_handoff_store
+from history import DEFAULT_HISTORY_TOKEN_BUDGET, DEFAULT_KEEP_RECENT_TURNS, history_tokens
+from telemetry import get_telemetry
+from rate_limit import get_rate_limiter
+from router import TURN_INITIAL, TURN_REFINE, build_routes, classify_turn, get_router, parse_api_keys, route_models
+
+APP_TITLE = f"LG Art Director System STEP 2 v{SYSTEM_VERSION}"
 APP_CAPTION = "🏠 Interior & Background Prompt Generator"
+# 핸드오프 expander에 표시할 최대 스키마 오류 수
+MAX_SCHEMA_ERRORS_SHOWN = 12
+
+# 전체 렌더링할 최근 메시지 수 (그 이전 응답은 접힌 상태로 필요할 때만 렌더링)
+RECENT_RENDER_MESSAGES = 6
+# 세션 저장소에서 '이전 턴 더 보기' 한 번에 불러올 턴 수
+OLDER_TURNS_PAGE = 5
+# 메시지에 보관하는 변형 필드 (파싱/검증 결과 포함 - 렌더링 때 다시 파싱하지 않음)
+VARIANT_KEYS = (
+    "index", "content", "score", "checks", "elapsed_ms", "temperature", "json_data", "text_content", "schema_errors",
+)
+# 세션 복원 시 저장된 설정값으로 다시 초기화할 사이드바 위젯 key
+SETTINGS_WIDGET_KEYS = (
+    "region", "city", "age", "occupation", "fashion_color", "fashion_color_name", "aspect_ratio",
+    "housing_type", "interior_style", "room_types", "entropy_level", "output_preset",
+    "derive_fields", "compact_output",
+)
+
 SYSTEM_GREETING = (
     "Step 1 JSON을 붙여넣거나 직접 설정을 입력해주세요.\n\n"
     "**외관 + 인테리어 4분할 프롬프트**를 생성합니다.\n\n"
     "예시: `파리 아파트, 갤러리 큐레이터, 카멜 톤 인테리어`"
 )
 
-MODEL_OPTIONS = [
-    "gemini-2.0-flash",
-    "gemini-2.0-flash-001",
-    "gemini-2.0-flash-lite",
-    "gemini-2.5-flash",
-    "gemini-2.5-pro",
-    "gemini-flash-latest",
-    "gemini-pro-latest",
-]
-
-MODEL_EXCLUDE_TOKENS = (
-    "image", "audio", "tts", "native", "preview", "exp",
-    "embedding", "gemma", "nano", "aqa", "imagen", "veo", "robotics",
-)
 
-# Step 2 전용 옵션들
-HOUSING_TYPE_OPTIONS = ["STUDIO", "APARTMENT", "LOFT", "VILLA", "PENTHOUSE"]
-HOUSING_TYPE_LABELS = {
-    "STUDIO": "스튜디오 (20-35㎡)",
-    "APARTMENT": "아파트 (60-90㎡)",
-    "LOFT": "로프트 (80-120㎡)",
-    "VILLA": "빌라 (150㎡+)",
-    "PENTHOUSE": "펜트하우스 (150㎡+)",
-}
-
-INTERIOR_STYLE_OPTIONS = [
-    "PARIS_STYLE", "LONDON_STYLE", "MILAN_STYLE", "BERLIN_STYLE",
-    "SCANDI_STYLE", "VIENNA_STYLE", "MEDITERRANEAN_EU", "DUTCH_STYLE",
-    "MEXICO_STYLE", "BRAZIL_STYLE", "ARGENTINA_STYLE", "LATAM_MODERN",
-]
-INTERIOR_STYLE_LABELS = {
-    "PARIS_STYLE": "파리 스타일",
-    "LONDON_STYLE": "런던 스타일",
-    "MILAN_STYLE": "밀라노 스타일",
-    "BERLIN_STYLE": "베를린 스타일",
-    "SCANDI_STYLE": "스칸디나비안",
-    "VIENNA_STYLE": "비엔나 스타일",
-    "MEDITERRANEAN_EU": "지중해 스타일",
-    "DUTCH_STYLE": "더치 스타일",
-    "MEXICO_STYLE": "멕시코 스타일",
-    "BRAZIL_STYLE": "브라질 스타일",
-    "ARGENTINA_STYLE": "아르헨티나 스타일",
-    "LATAM_MODERN": "라틴 모던",
-}
-
-ROOM_TYPE_OPTIONS = ["Kitchen", "Living", "Bedroom", "Laundry", "Bathroom", "Study", "Dining"]
-
-ENTROPY_LEVELS = {
-    1: "극미니멀 (1-5개)",
-    2: "극미니멀 (1-5개)",
-    3: "미니멀 (5-10개)",
-    4: "미니멀 (5-10개)",
-    5: "큐레이티드 ⭐기본",
-    6: "큐레이티드 ⭐기본",
-    7: "풍성함 (30-50개)",
-    8: "풍성함 (30-50개)",
-    9: "맥시멀리스트 (60+)",
-    10: "맥시멀리스트 (60+)",
-}
-
-OUTPUT_PRESET_OPTIONS = ["BASIC", "DETAIL_PLUS", "NEGATIVE_PLUS", "COMPOSITE_READY"]
-OUTPUT_PRESET_LABELS = {
-    "BASIC": "기본",
-    "DETAIL_PLUS": "디테일 강화",
-    "NEGATIVE_PLUS": "여백 강화",
-    "COMPOSITE_READY": "합성용",
-}
-
-REGION_OPTIONS = ["EU", "LATAM"]
-REGION_LABELS = {"EU": "EU(유럽)", "LATAM": "LATAM(라틴아메리카)"}
-
-CITY_OPTIONS = {
-    "EU": [
-        "Paris (파리)", "London (런던)", "Rome (로마)", "Barcelona (바르셀로나)",
-        "Amsterdam (암스테르담)", "Berlin (베를린)", "Prague (프라하)", "Vienna (비엔나)",
-        "Madrid (마드리드)", "Florence (피렌체)", "Venice (베네치아)", "Lisbon (리스본)",
-        "Athens (아테네)", "Munich (뮌헨)", "Budapest (부다페스트)", "Brussels (브뤼셀)",
-    ],
-    "LATAM": [
-        "Mexico City (멕시코시티)", "Sao Paulo (상파울루)", "Buenos Aires (부에노스아이레스)",
-        "Rio de Janeiro (리우데자네이루)", "Bogota (보고타)", "Lima (리마)",
-        "Santiago (산티아고)", "Medellin (메데인)", "Cusco (쿠스코)", "Havana (아바나)",
-    ],
-}
-
-ASPECT_RATIO_OPTIONS = ["9:16", "16:9", "4:5", "1:1"]
-ASPECT_RATIO_LABELS = {
-    "9:16": "9:16 (세로)",
-    "16:9": "16:9 (와이드)",
-    "4:5": "4:5 (룩북)",
-    "1:1": "1:1 (정사각)",
-}
-
-JSON_BLOCK_RE = re.compile(r"```json\s*(.*?)\s*```", re.DOTALL | re.IGNORECASE)
-
-
-def default_settings():
-    return {
-        "project_id": "LG_AD_2026_STEP2_01",
-        "region": "EU",
-        "city": CITY_OPTIONS["EU"][0],
-        "season": "WINTER",
-        "age": 35,
-        "occupation": "Gallery Curator",
-        "fashion_color": "#C19A6B",
-        "fashion_color_name": "Camel",
-        "aspect_ratio": "4:5",
-        # Step 2 전용
-        "housing_type": "APARTMENT",
-        "interior_style": "PARIS_STYLE",
-        "room_types": ["Kitchen", "Living", "Bedroom", "Laundry"],
-        "entropy_level": 5,
-        "output_preset": "BASIC",
-    }
+@st.cache_resource
+def get_response_cache():
+    """프로세스 전체에서 공유하는 응답 캐시"""
+    return ResponseCache.from_env()
+
+
+def render_handoff(msg, expanded=False, repair_key=None):
+    """Step 3 핸드오프 expander + 스키마 검증 결과 (보완 버튼이 눌리면 True)"""
+    repair_clicked = False
+    with st.expander("📦 STEP 3 데이터 핸드오프(JSON)", expanded=expanded):
+        st.json(msg["json_data"])
+        errors = msg.get("schema_errors") or []
+        if not SCHEMA_VALIDATION_AVAILABLE:
+            st.caption("jsonschema 미설치 - 스키마 검증을 건너뜁니다.")
+        elif errors:
+            st.warning(f"⚠️ 스키마 검증 실패 {len(errors)}건 (LG_Step2_Schema v1.1)")
+            st.markdown("\n".join(
+                f"- `{error['path']}`: {error['message']}" for error in errors[:MAX_SCHEMA_ERRORS_SHOWN]
+            ))
+            if len(errors) > MAX_SCHEMA_ERRORS_SHOWN:
+                st.caption(f"외 {len(errors) - MAX_SCHEMA_ERRORS_SHOWN}건")
+            if repair_key:
+                repair_clicked = st.button("🔧 누락/오류 필드만 보완 요청", key=repair_key)
+        else:
+            st.success("✅ 스키마 검증 통과" + (" (보완 병합됨)" if msg.get("repaired") else ""))
+        st.caption("이 JSON 데이터를 복사하여 Step 3에 전달하세요.")
+        if msg.get("handoff_hash"):
+            st.caption(f"🗄️ 핸드오프 저장소 {msg['handoff_hash'][:12]} (python handoff_store.py export로 일괄 내보내기)")
+    return repair_clicked
+
+
+def render_assistant_body(msg, repair_key=None, message_index=None):
+    """파싱이 끝난 메시지 렌더링 (핸드오프 expander + 본문 + 변형 비교) - 보완 버튼이 눌리면 True"""
+    repair_clicked = False
+    if msg["json_data"]:
+        repair_clicked = render_handoff(msg, repair_key=repair_key)
+
+    if msg["text_content"]:
+        st.markdown(msg["text_content"])
+    render_route(msg)
+    render_qa(msg)
+    render_variants(msg, message_index)
+    return repair_clicked
+
+
+def render_qa(msg):
+    """로컬 QA 결과 expander (실패 항목이 있으면 펼침)"""
+    findings = msg.get("qa")
+    if not findings:
+        return
+    summary = qa_summary(findings)
+    icon = "❌" if summary["errors"] else "⚠️" if summary["warnings"] else "✅"
+    with st.expander(f"{icon} 로컬 QA {summary['passed']}/{summary['total']}", expanded=summary["errors"] > 0):
+        st.markdown("\n".join(
+            f"- {'✅' if finding['ok'] else '❌' if finding['severity'] == ERROR else '⚠️'} "
+            f"**{finding['label']}**: {finding['detail']}"
+            for finding in findings
+        ))
+
+
+def use_variant(message_index, variant_position):
+    """변형 비교에서 고른 변형으로 해당 응답과 모델 히스토리를 교체 (버튼 on_click)"""
+    msg = st.session_state["messages"][message_index]
+    variant = msg["variants"][variant_position]
+    # messages[0]은 인사말이라 model_messages와 한 칸씩 어긋남
+    model_messages = st.session_state["model_messages"]
+    model_index = message_index - 1
+    if 0 <= model_index < len(model_messages) and model_messages[model_index]["content"] == msg["content"]:
+        model_messages[model_index] = {"role": "assistant", "content": variant["content"]}
+    msg.pop("repaired", None)
+    # 변형은 생성 시점에 파싱/검증해 둔 결과를 그대로 사용
+    msg.update(
+        build_assistant_message(variant["content"], variant["json_data"], variant["text_content"], variant["schema_errors"]),
+        selected_variant=variant["index"],
+    )
+    msg["qa"] = lint_response(variant["content"], st.session_state["applied_settings"], json_data=msg["json_data"])
+    persist_revision(
+        msg, response=variant["content"], title=msg["title"], selected_variant=variant["index"], qa=msg["qa"], repaired=False
+    )
+    record_handoff(msg)
 
 
-def parse_step1_json(json_text):
-    """Step 1 JSON 파싱"""
-    if not json_text or not json_text.strip():
-        return None, "JSON이 비어있습니다."
-    
-    try:
-        match = JSON_BLOCK_RE.search(json_text)
-        if match:
-            json_text = match.group(1)
-        data = json.loads(json_text.strip())
-        return data, None
-    except json.JSONDecodeError as e:
-        return None, f"JSON 파싱 오류: {e}"
-
-
-def extract_step1_values(step1_json):
-    """Step 1 JSON에서 값 추출"""
-    if not step1_json:
-        return {}
-    
-    extracted = {}
-    extracted["region"] = step1_json.get("region", "EU")
-    extracted["city"] = step1_json.get("city", "Paris")
-    extracted["season"] = step1_json.get("season", "WINTER")
-    extracted["fashion_color"] = step1_json.get("fashion_color", "#C19A6B")
-    extracted["fashion_color_name"] = step1_json.get("fashion_color_name", "Camel")
-    extracted["aspect_ratio"] = step1_json.get("aspect_ratio", "4:5")
-    extracted["project_id"] = step1_json.get("project_id", "")
-    extracted["biometric_ids"] = step1_json.get("biometric_ids", [])
-    
-    fixed = step1_json.get("fixed", {})
-    extracted["age"] = fixed.get("age", 35)
-    extracted["occupation"] = fixed.get("occupation", "Gallery Curator")
-    
-    return extracted
+def record_handoff(msg):
+    """스키마 검증을 통과한 핸드오프를 핸드오프 저장소에 기록 (같은 JSON은 중복 저장되지 않음)"""
+    handoff_store = get_handoff_store()
+    if handoff_store is not None:
+        msg["handoff_hash"] = handoff_store.put(msg["json_data"], msg["schema_errors"])
 
 
-def fingerprint_key(api_key):
-    if not api_key:
-        return ""
-    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+def persist_revision(msg, response=None, **meta):
+    """저장된 턴의 수정(변형 교체 / 보완 병합)을 세션 저장소에 revision으로 추가"""
+    session_store = get_session_store()
+    session_id = st.session_state.get("session_id")
+    if session_store is not None and session_id and "turn" in msg:
+        session_store.revise_turn(session_id, msg["turn"], response=response, meta=meta)
 
 
-def load_model_options(api_key):
-    if not api_key:
-        return MODEL_OPTIONS
-    
-    fingerprint = fingerprint_key(api_key)
-    cached = st.session_state.get("model_options_cache", {})
-    if cached.get("fingerprint") == fingerprint and cached.get("options"):
-        return cached["options"]
-    
+def current_owner():
+    """로그인 사용자 email (st.login 미설정 / 비로그인이면 None)"""
     try:
-        genai.configure(api_key=api_key)
-        models = genai.list_models()
-        options = []
-        for model in models:
-            name = getattr(model, "name", "")
-            methods = getattr(model, "supported_generation_methods", []) or []
-            if "generateContent" not in methods:
-                continue
-            if name.startswith("models/"):
-                name = name.split("/", 1)[1]
-            options.append(name)
-        options = [
-            option for option in options
-            if option.startswith("gemini-")
-            and not any(token in option for token in MODEL_EXCLUDE_TOKENS)
-        ]
-        options = sorted(set(options))
-        if not options:
-            options = MODEL_OPTIONS
+        if st.user.get("is_logged_in"):
+            return st.user.get("email")
     except Exception:
-        options = MODEL_OPTIONS
-    
-    st.session_state["model_options_cache"] = {
-        "fingerprint": fingerprint,
-        "options": options,
-    }
-    return options
+        pass
+    return None
+
+
+def resume_session(session_id):
+    """저장된 세션의 최근 턴만 메모리로 읽어 대화를 이어감 (설정 / Step 1 JSON 포함, 다른 사용자의 세션은 거부)"""
+    session_store = get_session_store()
+    session = session_store.get_session(session_id) if session_store is not None else None
+    if session is None or session["owner"] != current_owner():
+        return False
+    offset = max(0, session["turns"] - session_store.memory_turns)
+    messages = [make_assistant_message(SYSTEM_GREETING)]
+    model_messages = []
+    for turn in session_store.load_turns(session_id, offset):
+        display, model = turn_messages(turn)
+        messages += display
+        model_messages += model
+
+    settings = dict(default_settings(), **(session["settings"] or {}))
+    for key in SETTINGS_WIDGET_KEYS:
+        st.session_state.pop(key, None)
+    st.session_state.update(
+        messages=messages,
+        model_messages=model_messages,
+        transcript_offset=offset,
+        older_turns_shown=0,
+        session_id=session_id,
+        applied_settings=settings,
+        last_turn_settings=dict(settings),
+        step1_json_data=session["step1_data"],
+        chat_session=None,
+    )
+    st.query_params["session"] = session_id
+    return True
+
+
+def trim_transcript():
+    """메모리 창(memory_turns)을 넘는 오래된 턴을 session_state에서 제거 (디스크에는 그대로 남음)"""
+    session_store = get_session_store()
+    if session_store is None or not st.session_state.get("session_id"):
+        return
+    messages = st.session_state["messages"]
+    overflow = (len(messages) - 1) // 2 - session_store.memory_turns
+    if overflow > 0:
+        # messages[0]은 인사말, 이후 (user, assistant) 쌍 - model_messages와 같은 순서
+        del messages[1:1 + 2 * overflow]
+        del st.session_state["model_messages"][:2 * overflow]
+        st.session_state["transcript_offset"] = st.session_state.get("transcript_offset", 0) + overflow
+
+
+def session_history():
+    """메모리 창 + 필요하면 디스크의 이전 턴으로 만든 압축 히스토리"""
+    return build_session_history(
+        get_session_store(),
+        st.session_state.get("session_id"),
+        st.session_state["model_messages"],
+        st.session_state.get("transcript_offset", 0),
+        st.session_state.get("history_token_budget", DEFAULT_HISTORY_TOKEN_BUDGET),
+        st.session_state.get("history_keep_turns", DEFAULT_KEEP_RECENT_TURNS),
+    )
 
 
-def build_chat_history(messages):
-    history = []
-    for msg in messages:
-        role = msg.get("role")
-        content = (msg.get("content") or "").strip()
-        if not content:
-            continue
-        if role == "user":
-            history.append({"role": "user", "parts": [content]})
-        elif role == "assistant":
-            history.append({"role": "model", "parts": [content]})
-    return history
+def show_older_turns():
+    st.session_state["older_turns_shown"] = st.session_state.get("older_turns_shown", 0) + OLDER_TURNS_PAGE
+
+
+def render_older_turns():
+    """메모리 창 이전 턴을 디스크에서 페이지 단위로 읽어 표시 (제목만, 펼칠 때 파싱 / 읽기 전용)"""
+    offset = st.session_state.get("transcript_offset", 0)
+    session_store = get_session_store()
+    if not offset or session_store is None:
+        return
+    shown = min(offset, st.session_state.get("older_turns_shown", 0))
+    if shown < offset:
+        st.button(f"📜 이전 턴 더 보기 ({offset - shown}개 저장됨)", key="show_older_turns", on_click=show_older_turns)
+    if not shown:
+        return
+    for turn in session_store.load_turns(st.session_state["session_id"], offset - shown, offset):
+        st.chat_message("user").write(turn["user_input"])
+        with st.chat_message("assistant"):
+            title = turn["meta"].get("title") or "이전 응답"
+            if st.toggle(f"📄 {title}", key=f"expand_turn_{turn['turn_no']}"):
+                render_assistant_body(turn_messages(turn)[0][1])
+
+
+def render_variants(msg, message_index=None):
+    """점수순 변형 나란히 비교 (message_index가 있으면 '이 변형 사용' 버튼 표시)"""
+    variants = msg.get("variants") or []
+    if len(variants) < 2:
+        return
+    selected = msg.get("selected_variant", variants[0]["index"])
+    with st.expander(f"🎲 변형 {len(variants)}개 비교 (로컬 점수순)", expanded=False):
+        for position, (column, variant) in enumerate(zip(st.columns(len(variants)), variants)):
+            with column:
+                marker = " ✔️ 사용 중" if variant["index"] == selected else ""
+                st.markdown(f"**#{position + 1} · 변형 {variant['index'] + 1}** — {variant['score']:.0f}점{marker}")
+                st.caption(
+                    " · ".join(f"{'✅' if check['ok'] else '⚠️'} {check['name']}" for check in variant["checks"])
+                    + f"\ntemperature {variant['temperature']} · {variant['elapsed_ms'] / 1000:.1f}s"
+                )
+                for check in variant["checks"]:
+                    if not check["ok"]:
+                        st.caption(f"{check['name']}: {check['detail']}")
+                if "text_content" not in variant:
+                    # 파싱 결과 없이 저장된 예전 세션의 변형 - 한 번만 파싱해 dict에 보관
+                    parsed = make_assistant_message(variant["content"], msg.get("derived"))
+                    variant.update({key: parsed[key] for key in ("json_data", "text_content", "schema_errors")})
+                with st.container(height=320):
+                    st.markdown(variant["text_content"])
+                if message_index is not None and variant["index"] != selected:
+                    st.button(
+                        "이 변형 사용",
+                        key=f"variant_{message_index}_{position}",
+                        on_click=use_variant,
+                        args=(message_index, position),
+                    )
+
+
+def render_route(msg):
+    """응답을 처리한 route (모델 / 키 / 턴 유형) 표시"""
+    route = msg.get("route")
+    if route:
+        turn_label = "첫 생성" if route.get("turn_type") == TURN_INITIAL else "수정"
+        st.caption(f"🧭 {route['model']} · key{route['key']} · {turn_label}")
+
+
+def load_model_options(backend, api_key):
+    """프로세스 공유 모델 카탈로그 (만료 시 기존 목록을 즉시 쓰고 백그라운드 갱신)"""
+    return get_model_catalog().get(backend, api_key, fallback=MODEL_OPTIONS)
+
+
+def resolve_system_prompt(settings):
+    """설정별 시스템 프롬프트 + 사이드바 표시용 크기 (선택적 조합 OFF면 전체)"""
+    if not st.session_state.get("selective_prompt", True):
+        return get_system_prompt(), "전체"
+    system_instruction, prompt_report = assemble_system_prompt(settings)
+    return system_instruction, (
+        f"{prompt_report['assembled_tokens']:,} 토큰 "
+        f"(-{prompt_report['saved_tokens']:,}, {prompt_report['saved_ratio']:.1%} 절감)"
+    )
 
 
-def get_chat_session(api_key, model_name, history):
-    genai.configure(api_key=api_key)
+@st.fragment
+def settings_panel():
+    """
+    Step 1 상속값 / Step 2 전용 설정 패널 (fragment - 위젯을 바꾸면 이 패널만 다시 실행)
+    applied_settings만 갱신하고, 대화 영역과 컨텍스트 박스는 다음 전체 실행(입력 전송 등) 때 반영
+    모듈 전역 대신 session_state의 applied_settings / backend_state만 읽음
+    """
+    st.markdown("---")
+    st.markdown('<p class="sidebar-label">📍 Step 1 상속값</p>', unsafe_allow_html=True)
     
-    generation_config = {
-        "temperature": 0.7,
-        "top_p": 0.95,
-        "top_k": 40,
-        "max_output_tokens": 8192,
+    settings = st.session_state["applied_settings"]
+
+    col_region, col_city = st.columns(2)
+    with col_region:
+        region = st.selectbox(
+            "지역",
+            REGION_OPTIONS,
+            index=REGION_OPTIONS.index(settings["region"]),
+            format_func=lambda x: REGION_LABELS[x],
+            key="region",
+        )
+    city_list = CITY_OPTIONS[region]
+    current_city = settings["city"] if settings["city"] in city_list else city_list[0]
+    with col_city:
+        city = st.selectbox("도시", city_list, index=city_list.index(current_city), key="city")
+
+    col_age, col_occ = st.columns(2)
+    with col_age:
+        age = st.number_input("나이", min_value=18, max_value=100, value=int(settings["age"]), key="age")
+    with col_occ:
+        occupation = st.text_input("직업", value=settings["occupation"], key="occupation")
+
+    col_color, col_colorname = st.columns(2)
+    with col_color:
+        fashion_color = st.text_input("패션컬러 (HEX)", value=settings["fashion_color"], key="fashion_color")
+    with col_colorname:
+        fashion_color_name = st.text_input("컬러명", value=settings["fashion_color_name"], key="fashion_color_name")
+
+    aspect_ratio = st.selectbox(
+        "비율",
+        ASPECT_RATIO_OPTIONS,
+        index=ASPECT_RATIO_OPTIONS.index(settings["aspect_ratio"]),
+        format_func=lambda x: ASPECT_RATIO_LABELS[x],
+        key="aspect_ratio",
+    )
+
+    st.markdown("---")
+    st.markdown('<p class="sidebar-label">🏠 Step 2 전용 설정</p>', unsafe_allow_html=True)
+
+    housing_type = st.selectbox(
+        "주거 유형",
+        HOUSING_TYPE_OPTIONS,
+        index=HOUSING_TYPE_OPTIONS.index(settings["housing_type"]),
+        format_func=lambda x: HOUSING_TYPE_LABELS[x],
+        key="housing_type",
+    )
+
+    interior_style = st.selectbox(
+        "인테리어 스타일",
+        INTERIOR_STYLE_OPTIONS,
+        index=INTERIOR_STYLE_OPTIONS.index(settings["interior_style"]),
+        format_func=lambda x: INTERIOR_STYLE_LABELS[x],
+        key="interior_style",
+    )
+
+    room_types = st.multiselect(
+        "룸 타입 (4분할)",
+        ROOM_TYPE_OPTIONS,
+        default=settings["room_types"],
+        key="room_types",
+    )
+    if len(room_types) == 0:
+        room_types = ["Kitchen", "Living", "Bedroom", "Laundry"]
+
+    entropy_level = st.slider(
+        "엔트로피 레벨",
+        min_value=1,
+        max_value=10,
+        value=settings["entropy_level"],
+        key="entropy_level",
+    )
+    st.caption(ENTROPY_LEVELS.get(entropy_level, ""))
+
+    output_preset = st.selectbox(
+        "출력 프리셋",
+        OUTPUT_PRESET_OPTIONS,
+        index=OUTPUT_PRESET_OPTIONS.index(settings["output_preset"]),
+        format_func=lambda x: OUTPUT_PRESET_LABELS[x],
+        key="output_preset",
+    )
+
+    derive_fields = st.toggle(
+        "Step 3 고정 필드 로컬 계산",
+        value=settings.get("derive_fields", True),
+        key="derive_fields",
+        help="포맷(§0.6 FORMAT MAPPING), Step 1 상속값, 설정값 그대로인 필드는 로컬에서 계산해 "
+             "모델이 생략한 값만 채우고, 모델은 나머지 필드만 출력합니다 (출력 토큰 절감, 값 일관성).",
+    )
+
+    compact_output = st.toggle(
+        "간결 출력 (QA 로컬 검사)",
+        value=settings.get("compact_output", False),
+        key="compact_output",
+        help="§10 QA 체크리스트를 생성하지 않고 응답마다 로컬 QA(비율, 패션 컬러, 쿼드런트, 네거티브, "
+             "camera_meta, 계절/기후 상충) 결과만 표시합니다. 출력 토큰과 시스템 프롬프트가 줄어듭니다.",
+    )
+
+    # 설정 업데이트
+    new_settings = {
+        "project_id": settings.get("project_id", "LG_AD_2026_STEP2_01"),
+        "region": region,
+        "city": city,
+        "season": settings.get("season", "WINTER"),
+        "climate_type": settings.get("climate_type", ""),
+        "age": age,
+        "occupation": occupation,
+        "fashion_color": fashion_color,
+        "fashion_color_name": fashion_color_name,
+        "aspect_ratio": aspect_ratio,
+        "housing_type": housing_type,
+        "interior_style": interior_style,
+        "room_types": room_types,
+        "entropy_level": entropy_level,
+        "output_preset": output_preset,
+        "compact_output": compact_output,
+        "derive_fields": derive_fields,
     }
-    
-    model = genai.GenerativeModel(
-        model_name=model_name,
-        generation_config=generation_config,
-        system_instruction=LG_SYSTEM_PROMPT,
+    st.session_state["applied_settings"] = new_settings
+
+    _, prompt_size = resolve_system_prompt(new_settings)
+    st.markdown("---")
+    st.caption(
+        f"시스템: LG Step2 Schema v{SYSTEM_VERSION} (prompt {get_prompt_hash()[:8]})\n"
+        f"시스템 프롬프트: {prompt_size}\n모델: {st.session_state['backend_state']['model']}"
     )
-    
-    return model.start_chat(history=history)
 
 
-def parse_response(text):
-    json_data = None
-    clean_text = text
-    
-    for match in JSON_BLOCK_RE.finditer(text):
-        candidate = match.group(1).strip()
-        try:
-            json_data = json.loads(candidate)
-            clean_text = (text[:match.start()] + text[match.end():]).strip()
-            break
-        except json.JSONDecodeError:
+@st.fragment
+def transcript_panel():
+    """
+    대화 기록 렌더링 (fragment - 사이드바 설정 변경으로는 다시 실행되지 않음)
+    최근 메시지만 전체 렌더링, 이전 응답은 제목만 표시하고 펼칠 때 렌더링
+    메모리 창 이전 턴은 세션 저장소에서 요청할 때만 읽음
+    보완 요청의 백엔드 / route는 session_state의 backend_state에서 읽음 (모듈 전역 사용 안 함)
+    """
+    backend_state = st.session_state["backend_state"]
+    render_older_turns()
+    messages = st.session_state["messages"]
+    collapsed_until = max(0, len(messages) - RECENT_RENDER_MESSAGES)
+    for index, msg in enumerate(messages):
+        if msg["role"] == "user":
+            st.chat_message("user").write(msg["content"])
             continue
-    
-    return json_data, clean_text
-
-
-def build_combined_prompt(settings, step1_data, user_input):
-    """Step 2용 프롬프트 조합"""
-    lines = [
-        "[STEP2_SYSTEM_OVERRIDE_DATA]",
-        f"Project_ID: {settings['project_id']}",
-        "",
-        "[STEP1_INHERITED_DATA]",
-        f"Region: {settings['region']}",
-        f"City: {settings['city']}",
-        f"Season: {settings['season']}",
-        f"Model_Age: {settings['age']}",
-        f"Occupation: {settings['occupation']}",
-        f"Fashion_Color: {settings['fashion_color']}",
-        f"Fashion_Color_Name: {settings['fashion_color_name']}",
-        f"Aspect_Ratio: {settings['aspect_ratio']}",
-    ]
-    
-    if step1_data:
-        lines.append("")
-        lines.append("[STEP1_JSON_BLOCK]")
-        lines.append("```json")
-        lines.append(json.dumps(step1_data, indent=2, ensure_ascii=False))
-        lines.append("```")
-    
-    lines.extend([
-        "",
-        "[STEP2_SETTINGS]",
-        f"Housing_Type: {settings['housing_type']}",
-        f"Interior_Style: {settings['interior_style']}",
-        f"Room_Types: {', '.join(settings['room_types'])}",
-        f"Entropy_Level: {settings['entropy_level']}",
-        f"Output_Preset: {settings['output_preset']}",
-        "",
-        "[USER_CREATIVE_DIRECTION]",
-        user_input,
-    ])
-    
-    return "\n".join(lines).strip()
+        if "json_data" not in msg:
+            msg.update(make_assistant_message(msg["content"], msg.get("derived")))
+        with st.chat_message("assistant"):
+            if index >= collapsed_until or st.toggle(f"📄 {msg['title'] or '이전 응답'}", key=f"expand_msg_{index}"):
+                if render_assistant_body(msg, repair_key=f"repair_{index}", message_index=index):
+                    if not backend_state["ready"]:
+                        st.error("API 키가 설정되지 않았습니다. .streamlit/secrets.toml을 확인해주세요.")
+                    else:
+                        try:
+                            with st.spinner("누락/오류 필드만 보완 요청 중..."):
+                                # 보완은 짧은 수정 요청이므로 refine 턴으로 라우팅
+                                _, (repaired, errors) = get_router().call(
+                                    backend_state["routes"],
+                                    TURN_REFINE,
+                                    lambda route, has_fallback: repair_handoff(
+                                        route.backend, route.model, msg["json_data"], msg["schema_errors"]
+                                    ),
+                                )
+                            msg.update(json_data=repaired, schema_errors=errors, repaired=True)
+                            if "qa" in msg:
+                                msg["qa"] = lint_response(
+                                    msg["content"], st.session_state["applied_settings"], json_data=repaired
+                                )
+                            persist_revision(msg, json_data=repaired, schema_errors=errors, repaired=True, qa=msg.get("qa"))
+                            record_handoff(msg)
+                            st.rerun(scope="fragment")
+                        except Exception as e:
+                            st.error(f"보완 요청 중 오류 발생: {e}")
 
 
 # ─────────────────────────────────────────────────────────────
@@ -403,10 +603,18 @@ if "applied_settings" not in st.session_state:
 if "step1_json_data" not in st.session_state:
     st.session_state["step1_json_data"] = None
 
+# ?session=<id> 로 열면 저장된 세션을 이어서 시작 (새로고침 / 재시작 후 복원)
+if "messages" not in st.session_state and get_session_store() is not None and st.query_params.get("session"):
+    if not resume_session(st.query_params["session"]):
+        # 없는 세션 / 다른 사용자의 세션 - 새 세션으로 시작
+        st.query_params.pop("session", None)
+
 api_key = ""
 api_source = ""
+backend = None
+routes = []
+backend_ready = False
 model_option = MODEL_OPTIONS[0]
-flash_context = False
 
 # ─────────────────────────────────────────────────────────────
 # Sidebar
@@ -414,7 +622,7 @@ flash_context = False
 with st.sidebar:
     # 로고 헤더 (Step 1과 동일)
     st.markdown(
-        """
+        f"""
         <div style="display: flex; align-items: center; gap: 12px; margin-bottom: 20px;">
             <div style="display: flex; align-items: center;">
                 <svg viewBox="0 0 593 114" xmlns="http://www.w3.org/2000/svg" style="height:30px; width:auto; display:block;">
@@ -431,7 +639,7 @@ with st.sidebar:
             </div>
             <div>
                 <div style="font-weight: bold; font-size: 1.1rem;">Art Director <span style="color: #10B981;">STEP 2</span></div>
-                <div style="font-size: 0.7rem; color: #888;">v5.9.0 PROFESSIONAL</div>
+                <div style="font-size: 0.7rem; color: #888;">v{SYSTEM_VERSION} PROFESSIONAL</div>
             </div>
         </div>
     """,
@@ -457,13 +665,117 @@ with st.sidebar:
                 api_source = ""
                 st.error("❌ API Key가 없습니다. .streamlit/secrets.toml을 설정해주세요.")
 
-        model_options = load_model_options(api_key)
+        backend = create_backend(api_key=api_key, responder=render_canned_response)
+        backend_ready = bool(api_key) or not backend.requires_api_key
+        if backend.name != "gemini":
+            st.info(f"🧪 {backend.name} 백엔드로 동작 중 (실제 모델 호출 없음)")
+
+        # 추가 키 (GOOGLE_API_KEYS: 목록 또는 쉼표 구분) - 키별 백엔드로 라우팅 / 장애 시 전환
+        route_keys = [api_key]
+        if backend.requires_api_key and api_key:
+            extra_keys = st.secrets["GOOGLE_API_KEYS"] if "GOOGLE_API_KEYS" in st.secrets else os.getenv("GOOGLE_API_KEYS", "")
+            route_keys = parse_api_keys(api_key, extra_keys)
+            if len(route_keys) > 1:
+                st.caption(f"🔑 API 키 {len(route_keys)}개 (장애/한도 초과 시 자동 전환)")
+        route_backends = [backend] + [
+            create_backend(api_key=key, responder=render_canned_response) for key in route_keys[1:]
+        ]
+
+        auto_route = st.toggle(
+            "자동 모델 라우팅",
+            value=True,
+            key="auto_route",
+            help="첫 생성·설정 변경 후 생성은 강한 모델(pro)로, 짧은 수정 턴은 빠른 모델(flash-lite)로 보냅니다. "
+                 "느리거나 한도를 초과한 모델/키는 자동으로 다음 후보로 넘깁니다.",
+        )
+        model_options = load_model_options(backend, api_key)
         if "model_option" not in st.session_state or st.session_state["model_option"] not in model_options:
             st.session_state["model_option"] = model_options[0]
         model_option = st.selectbox(
             "모델 선택",
             model_options,
             key="model_option",
+            disabled=auto_route,
+            help="자동 라우팅이 꺼져 있을 때 사용할 모델 (키 장애 시 전환은 계속 적용)",
+        )
+        if auto_route:
+            routes = build_routes([
+                (route_backend, key, route_models(load_model_options(route_backend, key)))
+                for route_backend, key in zip(route_backends, route_keys)
+            ])
+        else:
+            routes = build_routes([(route_backend, key, [model_option]) for route_backend, key in zip(route_backends, route_keys)])
+        # fragment만 다시 실행될 때는 모듈 전역이 갱신되지 않으므로 session_state로 전달
+        st.session_state["backend_state"] = {"ready": backend_ready, "routes": routes, "model": model_option}
+        catalog_info = get_model_catalog().info(backend, api_key)
+        if catalog_info is not None:
+            st.caption(
+                f"모델 목록: {int(catalog_info['age_s'] // 60)}분 전 갱신"
+                + (" · 백그라운드 갱신 중" if catalog_info["refreshing"] else "")
+            )
+        st.toggle(
+            "스트리밍 출력",
+            value=True,
+            key="stream_output",
+            help="응답을 생성되는 대로 표시하고, Step 3 JSON은 블록이 완성되는 즉시 먼저 표시합니다.",
+        )
+        st.toggle(
+            "응답 캐시 사용",
+            value=True,
+            key="use_response_cache",
+            help="동일한 설정·프롬프트·대화 이력이면 모델을 다시 호출하지 않고 저장된 응답을 반환합니다.",
+        )
+        col_budget, col_keep = st.columns(2)
+        with col_budget:
+            st.number_input(
+                "히스토리 토큰 예산",
+                min_value=2000,
+                max_value=200000,
+                value=DEFAULT_HISTORY_TOKEN_BUDGET,
+                step=2000,
+                key="history_token_budget",
+                help="이전 대화를 모델에 다시 보낼 때의 최대 토큰 수. 초과분은 오래된 턴부터 압축/제외됩니다.",
+            )
+        with col_keep:
+            st.number_input(
+                "원문 유지 턴 수",
+                min_value=0,
+                max_value=10,
+                value=DEFAULT_KEEP_RECENT_TURNS,
+                key="history_keep_turns",
+                help="최근 N개 턴의 응답은 원문 그대로, 그 이전 응답은 섹션 제목 + Step 3 JSON으로 압축합니다.",
+            )
+
+        st.toggle(
+            "선택적 프롬프트 조합",
+            value=True,
+            key="selective_prompt",
+            help="현재 주거 유형·지역·엔트로피 설정과 무관한 섹션(§4 지역 스타일, §6.3 스튜디오 예외 등)을 시스템 프롬프트에서 제외합니다.",
+        )
+        st.toggle(
+            "병렬 분할 생성 (fan-out)",
+            value=False,
+            key="fanout_mode",
+            help="외관·룸 쿼드런트별·핸드오프를 동시에 하위 요청으로 보내고 로컬에서 표준 출력 구조로 조립합니다. "
+                 "대기 시간이 가장 긴 섹션 하나 수준으로 줄어듭니다 (스트리밍 미적용).",
+        )
+        col_variants, col_variant_count = st.columns([3, 2])
+        with col_variants:
+            st.toggle(
+                "변형 동시 생성",
+                value=False,
+                key="variants_mode",
+                disabled=st.session_state.get("fanout_mode", False),
+                help="같은 프롬프트로 temperature를 달리한 변형 여러 개를 동시에 생성하고, 스키마 검증·룸 타입·비율·필수 섹션 "
+                     "로컬 점수로 최선안을 고릅니다. 나머지 변형은 응답 아래에서 나란히 비교할 수 있습니다 (스트리밍 미적용).",
+            )
+        with col_variant_count:
+            st.number_input("변형 수", min_value=2, max_value=MAX_VARIANTS, value=DEFAULT_VARIANTS, key="variants_count")
+
+        cache_stats = get_response_cache().stats()
+        st.caption(
+            f"응답 캐시: hit {cache_stats['hits']} / miss {cache_stats['misses']} "
+            f"({cache_stats['hit_rate']:.0%}) · 저장 {cache_stats['entries']}건"
         )
 
     st.markdown("---")
@@ -485,13 +797,17 @@ with st.sidebar:
             st.session_state["step1_json_data"] = None
         else:
             st.session_state["step1_json_data"] = parsed
-            extracted = extract_step1_values(parsed)
-            settings = st.session_state["applied_settings"]
-            for key, value in extracted.items():
-                if key in settings and value:
-                    settings[key] = value
-            st.session_state["applied_settings"] = settings
+            st.session_state["applied_settings"] = apply_step1_values(
+                st.session_state["applied_settings"], parsed
+            )
             st.success("✅ JSON 파싱 완료")
+            step1_errors = validate_step1(parsed)
+            if step1_errors:
+                # 생성은 막지 않고 기본값으로 채워질 필드만 알림 (배치 / ingest.py는 거절)
+                st.warning(
+                    "⚠️ Step 1 사전 검증 - 아래 필드는 기본값으로 채워집니다: "
+                    + ", ".join(f"`{e['path']}` ({e['message']})" for e in step1_errors)
+                )
     
     step1_data = st.session_state.get("step1_json_data")
     if step1_data:
@@ -499,117 +815,112 @@ with st.sidebar:
     else:
         st.markdown('<div class="step1-status step1-warn">⚠️ Step 1 JSON 없음 - 직접 입력 모드</div>', unsafe_allow_html=True)
 
-    st.markdown("---")
-    st.markdown('<p class="sidebar-label">📍 Step 1 상속값</p>', unsafe_allow_html=True)
-    
-    settings = st.session_state["applied_settings"]
-    previous_settings = settings.copy()
-
-    col_region, col_city = st.columns(2)
-    with col_region:
-        region = st.selectbox(
-            "지역",
-            REGION_OPTIONS,
-            index=REGION_OPTIONS.index(settings["region"]),
-            format_func=lambda x: REGION_LABELS[x],
-            key="region",
+    settings_panel()
+    system_instruction, _ = resolve_system_prompt(st.session_state["applied_settings"])
+
+    # 현재 프로세스 텔레메트리 (캐시 응답 제외 p50/p95)
+    telemetry_summary = get_telemetry().summary()
+    if telemetry_summary["requests"]:
+        def fmt_ms(value):
+            return "-" if value is None else f"{value / 1000:.1f}s"
+
+        st.caption(
+            f"📈 요청 {telemetry_summary['requests']}건 · "
+            f"지연 p50 {fmt_ms(telemetry_summary['latency_p50_ms'])} / p95 {fmt_ms(telemetry_summary['latency_p95_ms'])} · "
+            f"TTFT p50 {fmt_ms(telemetry_summary['ttft_p50_ms'])} / p95 {fmt_ms(telemetry_summary['ttft_p95_ms'])}\n"
+            f"JSON 파싱 실패 {telemetry_summary['parse_failure_rate']:.0%} · "
+            f"캐시 {telemetry_summary['cache_hits']}건 · 오류 {telemetry_summary['errors']}건"
+        )
+        st.download_button(
+            "📥 Prometheus 스냅샷",
+            get_telemetry().prometheus_text(),
+            file_name="lg_step2_metrics.prom",
+            mime="text/plain",
         )
-    city_list = CITY_OPTIONS[region]
-    current_city = settings["city"] if settings["city"] in city_list else city_list[0]
-    with col_city:
-        city = st.selectbox("도시", city_list, index=city_list.index(current_city), key="city")
-
-    col_age, col_occ = st.columns(2)
-    with col_age:
-        age = st.number_input("나이", min_value=18, max_value=100, value=int(settings["age"]), key="age")
-    with col_occ:
-        occupation = st.text_input("직업", value=settings["occupation"], key="occupation")
-
-    col_color, col_colorname = st.columns(2)
-    with col_color:
-        fashion_color = st.text_input("패션컬러 (HEX)", value=settings["fashion_color"], key="fashion_color")
-    with col_colorname:
-        fashion_color_name = st.text_input("컬러명", value=settings["fashion_color_name"], key="fashion_color_name")
-
-    aspect_ratio = st.selectbox(
-        "비율",
-        ASPECT_RATIO_OPTIONS,
-        index=ASPECT_RATIO_OPTIONS.index(settings["aspect_ratio"]),
-        format_func=lambda x: ASPECT_RATIO_LABELS[x],
-        key="aspect_ratio",
-    )
-
-    st.markdown("---")
-    st.markdown('<p class="sidebar-label">🏠 Step 2 전용 설정</p>', unsafe_allow_html=True)
-
-    housing_type = st.selectbox(
-        "주거 유형",
-        HOUSING_TYPE_OPTIONS,
-        index=HOUSING_TYPE_OPTIONS.index(settings["housing_type"]),
-        format_func=lambda x: HOUSING_TYPE_LABELS[x],
-        key="housing_type",
-    )
-
-    interior_style = st.selectbox(
-        "인테리어 스타일",
-        INTERIOR_STYLE_OPTIONS,
-        index=INTERIOR_STYLE_OPTIONS.index(settings["interior_style"]),
-        format_func=lambda x: INTERIOR_STYLE_LABELS[x],
-        key="interior_style",
-    )
-
-    room_types = st.multiselect(
-        "룸 타입 (4분할)",
-        ROOM_TYPE_OPTIONS,
-        default=settings["room_types"],
-        key="room_types",
-    )
-    if len(room_types) == 0:
-        room_types = ["Kitchen", "Living", "Bedroom", "Laundry"]
-
-    entropy_level = st.slider(
-        "엔트로피 레벨",
-        min_value=1,
-        max_value=10,
-        value=settings["entropy_level"],
-        key="entropy_level",
-    )
-    st.caption(ENTROPY_LEVELS.get(entropy_level, ""))
-
-    output_preset = st.selectbox(
-        "출력 프리셋",
-        OUTPUT_PRESET_OPTIONS,
-        index=OUTPUT_PRESET_OPTIONS.index(settings["output_preset"]),
-        format_func=lambda x: OUTPUT_PRESET_LABELS[x],
-        key="output_preset",
-    )
 
-    # 설정 업데이트
-    new_settings = {
-        "project_id": settings.get("project_id", "LG_AD_2026_STEP2_01"),
-        "region": region,
-        "city": city,
-        "season": settings.get("season", "WINTER"),
-        "age": age,
-        "occupation": occupation,
-        "fashion_color": fashion_color,
-        "fashion_color_name": fashion_color_name,
-        "aspect_ratio": aspect_ratio,
-        "housing_type": housing_type,
-        "interior_style": interior_style,
-        "room_types": room_types,
-        "entropy_level": entropy_level,
-        "output_preset": output_preset,
-    }
-    flash_context = new_settings != previous_settings
-    st.session_state["applied_settings"] = new_settings
+    # 공유 요청 제한기 상태 (모든 세션/배치 호출 공통)
+    limiter_stats = get_rate_limiter().stats()
+    if limiter_stats["rpm"] or limiter_stats["tpm"] or limiter_stats["retries"]:
+        limits = " · ".join(
+            text for text in (
+                f"{limiter_stats['rpm']:g} RPM" if limiter_stats["rpm"] else "",
+                f"{limiter_stats['tpm']:g} TPM" if limiter_stats["tpm"] else "",
+            ) if text
+        ) or "제한 없음"
+        wait_p95 = limiter_stats["wait_p95_s"]
+        st.caption(
+            f"⏳ 요청 제한 {limits} · 대기열 {limiter_stats['queue_depth']}건 · "
+            f"대기 p95 {'-' if wait_p95 is None else f'{wait_p95:.1f}s'} · "
+            f"재시도 {limiter_stats['retries']}회 · 최종 실패 {limiter_stats['failures']}건"
+        )
 
-    st.markdown("---")
-    st.caption(f"시스템: LG Step2 Schema v5.9.0\n모델: {model_option}")
+    # 라우팅 후보 상태 (지연 측정 / 장애 기록이 있는 route만)
+    if len(routes) > 1:
+        def fmt_route(row):
+            latencies = [value for value in row["p50_ms"].values() if value is not None]
+            text = row["name"]
+            if latencies:
+                text += f" p50 {min(latencies) / 1000:.1f}s"
+            if row["error_rate"]:
+                text += f" 오류 {row['error_rate']:.0%}"
+            if row["cooling_s"]:
+                text += f" ⏸{row['cooling_s']:.0f}s"
+            return text
+
+        route_rows = [
+            row for row in get_router().stats(routes)
+            if row["cooling_s"] or row["error_rate"] or any(v is not None for v in row["p50_ms"].values())
+        ]
+        if route_rows:
+            st.caption("🧭 " + " · ".join(fmt_route(row) for row in route_rows))
+
+    # 저장된 세션 이어하기 (project_id + 로그인 사용자별 최근 세션)
+    session_store = get_session_store()
+    if session_store is not None:
+        with st.expander("💾 세션 이어하기", expanded=False):
+            resume_project = st.text_input(
+                "project_id",
+                value=st.session_state["applied_settings"].get("project_id", ""),
+                key="resume_project_id",
+                help="같은 project_id로 저장된 내 세션만 표시합니다 (로그인하지 않았으면 비로그인 세션끼리).",
+            ).strip()
+            owner = current_owner()
+            if not resume_project:
+                st.caption("project_id를 입력하면 저장된 세션을 표시합니다.")
+                stored_sessions = {}
+            elif owner is None and resume_project == default_settings()["project_id"]:
+                # 기본 project_id는 모든 비로그인 사용자가 공유하므로 목록을 보이지 않음
+                st.caption("기본 project_id의 세션은 로그인한 경우에만 표시합니다. 프로젝트 고유 ID를 입력하세요.")
+                stored_sessions = {}
+            else:
+                stored_sessions = {
+                    row["session_id"]: row
+                    for row in session_store.list_sessions(resume_project, owner)
+                    if row["session_id"] != st.session_state.get("session_id")
+                }
+            if stored_sessions:
+                resume_id = st.selectbox(
+                    "저장된 세션",
+                    list(stored_sessions),
+                    format_func=lambda sid: (
+                        f"{stored_sessions[sid]['project_id']} · {stored_sessions[sid]['turns']}턴 · "
+                        f"{datetime.fromtimestamp(stored_sessions[sid]['updated_at']):%m-%d %H:%M}"
+                    ),
+                    key="resume_session_id",
+                )
+                st.button("↩️ 이 세션 이어하기", on_click=resume_session, args=(resume_id,))
+            elif resume_project:
+                st.caption("저장된 세션이 없습니다.")
+            if st.session_state.get("session_id"):
+                st.caption(f"현재 세션 {st.session_state['session_id']} (메모리 최근 {session_store.memory_turns}턴)")
 
     if st.button("🗑️ 대화 초기화", type="secondary"):
-        for key in ("messages", "model_messages", "chat_session", "step1_json_data"):
+        for key in (
+            "messages", "model_messages", "chat_session", "step1_json_data", "last_turn_settings",
+            "session_id", "transcript_offset", "older_turns_shown",
+        ):
             st.session_state.pop(key, None)
+        st.query_params.pop("session", None)
         st.rerun()
 
 # ─────────────────────────────────────────────────────────────
@@ -644,45 +955,39 @@ st.markdown(
 
 # Chat Messages
 if "messages" not in st.session_state:
-    st.session_state["messages"] = [{"role": "assistant", "content": SYSTEM_GREETING}]
+    st.session_state["messages"] = [make_assistant_message(SYSTEM_GREETING)]
 
 if "model_messages" not in st.session_state:
     st.session_state["model_messages"] = []
 
-api_key_fingerprint = fingerprint_key(api_key)
+api_key_fingerprint = backend_fingerprint(backend, api_key)
+prompt_hash = get_prompt_hash()
 if (
     st.session_state.get("active_model") != model_option
     or st.session_state.get("api_key_fingerprint") != api_key_fingerprint
+    or st.session_state.get("prompt_hash") != prompt_hash
 ):
     st.session_state["chat_session"] = None
     st.session_state["active_model"] = model_option
     st.session_state["api_key_fingerprint"] = api_key_fingerprint
+    st.session_state["prompt_hash"] = prompt_hash
+
+# 메모리에는 최근 턴만 유지 (버튼 콜백이 이전 rerun의 인덱스로 실행된 뒤에 정리)
+trim_transcript()
 
-if st.session_state.get("chat_session") is None and api_key:
+if st.session_state.get("chat_session") is None and backend_ready:
     try:
-        history = build_chat_history(st.session_state["model_messages"])
-        st.session_state["chat_session"] = get_chat_session(api_key, model_option, history)
+        history = session_history()
+        st.session_state["chat_session"] = get_chat_session(backend, model_option, history, system_instruction)
     except Exception as e:
         st.error(f"모델 연결 실패: {e}")
 
-for msg in st.session_state["messages"]:
-    if msg["role"] == "user":
-        st.chat_message("user").write(msg["content"])
-    else:
-        with st.chat_message("assistant"):
-            json_data, text_content = parse_response(msg["content"])
-
-            if json_data:
-                with st.expander("📦 STEP 3 데이터 핸드오프(JSON)", expanded=False):
-                    st.json(json_data)
-                    st.caption("이 JSON 데이터를 복사하여 Step 3에 전달하세요.")
-
-            if text_content:
-                st.markdown(text_content)
+# 대화 기록은 fragment - 펼치기 / 보완 / 변형 선택은 이 영역만 다시 실행
+transcript_panel()
 
 # Chat Input
 if user_input := st.chat_input("인테리어 컨셉이나 추가 지시사항을 입력하세요..."):
-    if not api_key:
+    if not backend_ready:
         st.error("API 키가 설정되지 않았습니다. .streamlit/secrets.toml을 확인해주세요.")
         st.stop()
 
@@ -696,29 +1001,265 @@ if user_input := st.chat_input("인테리어 컨셉이나 추가 지시사항을
         step1_data,
         user_input,
     )
+    # 조회 표로 정해지는 Step 3 필드는 로컬 계산 후 응답 JSON에 병합 (모델은 생략)
+    derived = derived_handoff(st.session_state["applied_settings"], step1_data)
+
+    # 턴마다 토큰 예산 안의 압축 히스토리로 세션을 새로 구성 (턴당 입력 비용 상한)
+    history = session_history()
+    response_cache = get_response_cache()
+    fanout_mode = st.session_state.get("fanout_mode", False)
+    variants_mode = st.session_state.get("variants_mode", False) and not fanout_mode
+    variants_count = int(st.session_state.get("variants_count", DEFAULT_VARIANTS))
+    generation_mode = "fanout" if fanout_mode else f"variants{variants_count}" if variants_mode else "single"
+    # 첫 생성 / 설정 변경 후 생성은 initial, 이후 수정 지시는 refine
+    last_turn_settings = st.session_state.get("last_turn_settings")
+    turn_type = classify_turn(
+        st.session_state["model_messages"],
+        settings_changed=last_turn_settings is not None and last_turn_settings != st.session_state["applied_settings"],
+    )
+    router = get_router()
 
-    st.chat_message("user").write(user_input)
-    st.session_state["messages"].append({"role": "user", "content": user_input})
-    st.session_state["model_messages"].append({"role": "user", "content": combined_prompt})
+    def response_cache_key(model_name):
+        return make_cache_key(system_instruction, model_name, GENERATION_CONFIG, history, combined_prompt,
+                              mode=generation_mode)
 
-    with st.spinner("Art Director가 인테리어 & 배경을 설계 중입니다..."):
-        try:
-            chat = st.session_state["chat_session"]
-            response = chat.send_message(combined_prompt)
-            full_response = response.text or ""
+    # 캐시는 실제로 응답한 모델 기준 - 조회는 지금 1순위로 시도할 route의 모델, 저장은 응답한 route의 모델
+    ranked_routes = router.rank(routes, turn_type)
+    cache_key = response_cache_key(ranked_routes[0].model if ranked_routes else model_option)
+    cached_response = None
+    if st.session_state.get("use_response_cache", True):
+        cached_response = response_cache.get(cache_key)
 
-            with st.chat_message("assistant"):
-                json_data, text_content = parse_response(full_response)
+    # 사용자 메시지는 응답과 함께 성공 시에만 히스토리에 추가 (최종 실패 시 히스토리 불변)
+    st.chat_message("user").write(user_input)
 
-                if json_data:
-                    with st.expander("📦 STEP 3 데이터 핸드오프(JSON)", expanded=True):
-                        st.json(json_data)
-                        st.info("✅ Step 3용 데이터가 생성되었습니다.")
+    stream_output = st.session_state.get("stream_output", True)
+    trace = get_telemetry().start(
+        source="app",
+        backend=backend.name,
+        model=model_option,
+        mode="fanout" if fanout_mode else "variants" if variants_mode else ("stream" if stream_output else "single"),
+        turn_type=turn_type,
+        prompt_version=get_version(),
+        prompt_hash=prompt_hash[:12],
+        system_tokens=estimate_tokens(system_instruction),
+        history_turns=len(history),
+        history_tokens=history_tokens(history),
+        cached=cached_response is not None,
+    )
+    try:
+        limiter = get_rate_limiter()
+        input_tokens = trace.record["system_tokens"] + trace.record["history_tokens"] + estimate_tokens(combined_prompt)
+        with st.chat_message("assistant"):
+            status_slot = st.empty()
+            handoff_slot = st.empty()
+            text_slot = st.empty()
+
+            def show_queue_wait(ahead, waited_s):
+                status_slot.caption(f"⏳ 요청 제한 대기 중 · 앞선 요청 {ahead}건 · {waited_s:.0f}s")
+
+            def show_retry(attempt, delay_s, error):
+                handoff_slot.empty()
+                text_slot.empty()
+                status_slot.warning(f"🔁 일시적 오류로 {delay_s:.1f}초 후 재시도합니다 (재시도 {attempt}회째): {error}")
+
+            def show_fallback(failed_route, next_route, error):
+                handoff_slot.empty()
+                text_slot.empty()
+                status_slot.warning(f"🔀 {failed_route.name} 실패 → {next_route.name}로 전환합니다: {error}")
+
+            def open_session(route):
+                with trace.stage("session"):
+                    chat = get_chat_session(route.backend, route.model, history, system_instruction)
+                st.session_state["chat_session"] = chat
+                return chat
+
+            def limited(func, has_fallback):
+                # 다른 route가 남아 있으면 같은 route 백오프 재시도 대신 바로 다음 route로
+                return limiter.call(
+                    func,
+                    input_tokens,
+                    trace=trace,
+                    on_wait=show_queue_wait,
+                    on_retry=show_retry,
+                    max_attempts=1 if has_fallback else None,
+                )
+
+            served_route = None
+            variants = []
+            if cached_response is not None:
+                full_response = cached_response
+            elif fanout_mode:
+                # 외관/쿼드런트/핸드오프 동시 요청 → 로컬 조립
+                with st.spinner("외관·쿼드런트를 병렬로 설계 중입니다..."), trace.stage("generate"):
+                    served_route, (full_response, fanout_timings) = router.call(
+                        routes,
+                        turn_type,
+                        lambda route, has_fallback: run_fanout(
+                            route.backend,
+                            route.model,
+                            st.session_state["applied_settings"],
+                            combined_prompt,
+                            history,
+                            system_instruction,
+                            trace=trace,
+                        ),
+                        on_fallback=show_fallback,
+                    )
+                trace.update(fanout_ms=fanout_timings)
+                st.caption(
+                    "⚡ fan-out " + " · ".join(f"{task} {ms / 1000:.1f}s" for task, ms in fanout_timings.items())
+                )
+            elif variants_mode:
+                # N개 변형 동시 생성 → 로컬 점수 1위를 응답으로 사용
+                with st.spinner(f"변형 {variants_count}개를 동시에 설계 중입니다..."), trace.stage("generate"):
+                    served_route, variants = router.call(
+                        routes,
+                        turn_type,
+                        lambda route, has_fallback: run_variants(
+                            route.backend,
+                            route.model,
+                            st.session_state["applied_settings"],
+                            combined_prompt,
+                            variants_count,
+                            history,
+                            system_instruction,
+                            seed=2 * st.session_state.get("transcript_offset", 0) + len(st.session_state["messages"]),
+                            trace=trace,
+                            derived=derived,
+                        ),
+                        on_fallback=show_fallback,
+                    )
+                full_response = variants[0]["content"]
+                trace.update(variant_scores=[variant["score"] for variant in variants])
+            elif stream_output:
+                # 스트리밍: chunk 도착 즉시 렌더링, JSON 블록이 닫히면 핸드오프 먼저 표시
+                # 재시도/route 전환 시 스트림을 처음부터 다시 받으므로 시도마다 새 세션 + 새 detector 사용
+                stream_state = {}
+
+                def stream_once(route):
+                    detector = stream_state["detector"] = StreamingHandoffDetector()
+                    response = open_session(route).send_message(combined_prompt, stream=True)
+                    for chunk in response:
+                        if not detector.text:
+                            status_slot.empty()
+                        handoff_pending = detector.json_data is None
+                        text = chunk_text(chunk)
+                        if text:
+                            trace.first_token()
+                        detector.feed(text)
+                        if handoff_pending and detector.json_data is not None:
+                            with handoff_slot.container():
+                                with st.expander("📦 STEP 3 데이터 핸드오프(JSON)", expanded=True):
+                                    st.json(merge_derived(detector.json_data, derived))
+                        text_slot.markdown(detector.visible_text() + " ▌")
+                    return response
+
+                with st.spinner("Art Director가 인테리어 & 배경을 설계 중입니다..."), trace.stage("generate"):
+                    served_route, response = router.call(
+                        routes,
+                        turn_type,
+                        lambda route, has_fallback: limited(lambda: stream_once(route), has_fallback),
+                        on_fallback=show_fallback,
+                    )
+                trace.add_usage(response)
+                full_response = stream_state["detector"].text
+            else:
+                with st.spinner("Art Director가 인테리어 & 배경을 설계 중입니다..."), trace.stage("generate"):
+                    served_route, response = router.call(
+                        routes,
+                        turn_type,
+                        lambda route, has_fallback: limited(
+                            lambda: open_session(route).send_message(combined_prompt), has_fallback
+                        ),
+                        on_fallback=show_fallback,
+                    )
+                    full_response = response.text or ""
+                trace.add_usage(response)
+            status_slot.empty()
+            if served_route is not None:
+                trace.update(model=served_route.model, route=served_route.name)
+
+            with trace.stage("parse"):
+                if variants:
+                    # 변형은 생성 시점에 이미 파싱/검증됨 - 1위 변형 결과 재사용
+                    best = variants[0]
+                    assistant_message = build_assistant_message(
+                        full_response, best["json_data"], best["text_content"], best["schema_errors"]
+                    )
+                else:
+                    assistant_message = make_assistant_message(full_response, derived)
+                assistant_message["qa"] = lint_response(
+                    full_response, st.session_state["applied_settings"], json_data=assistant_message["json_data"]
+                )
+            if derived:
+                assistant_message["derived"] = derived
+                trace.update(derived_rules=rules_version())
+            if served_route is not None:
+                assistant_message["route"] = served_route.describe(turn_type)
+            if variants:
+                assistant_message["variants"] = [
+                    {key: variant[key] for key in VARIANT_KEYS}
+                    for variant in variants
+                ]
+            text_content = assistant_message["text_content"]
+            trace.update(
+                parse_ok=assistant_message["json_data"] is not None,
+                schema_errors=len(assistant_message["schema_errors"]),
+                qa_failures=sum(1 for finding in assistant_message["qa"] if not finding["ok"]),
+                response_chars=len(full_response),
+            )
+
+            with trace.stage("render"):
+                if assistant_message["json_data"]:
+                    with handoff_slot.container():
+                        render_handoff(assistant_message, expanded=True)
+                else:
+                    handoff_slot.empty()
 
                 if text_content:
-                    st.markdown(text_content)
-
-            st.session_state["messages"].append({"role": "assistant", "content": full_response})
-            st.session_state["model_messages"].append({"role": "assistant", "content": full_response})
-        except Exception as e:
-            st.error(f"생성 중 오류 발생: {e}")
+                    text_slot.markdown(text_content)
+                else:
+                    text_slot.empty()
+
+            render_route(assistant_message)
+            render_qa(assistant_message)
+            # 사용자 메시지와 함께 추가될 위치 (다음 rerun부터 '이 변형 사용' 버튼이 이 인덱스를 사용)
+            render_variants(assistant_message, len(st.session_state["messages"]) + 1)
+            if cached_response is not None:
+                st.caption("⚡ 캐시된 응답 (모델 호출 없음)")
+            else:
+                served_model = served_route.model if served_route is not None else model_option
+                response_cache.put(response_cache_key(served_model), served_model, full_response)
+
+        record_handoff(assistant_message)
+        user_message = {"role": "user", "content": user_input}
+        session_store = get_session_store()
+        if session_store is not None:
+            # 턴은 디스크에 추가 전용으로 기록 (첫 턴에 세션 생성 → ?session= 으로 새로고침 후 복원)
+            if not st.session_state.get("session_id"):
+                st.session_state["session_id"] = session_store.create_session(
+                    st.session_state["applied_settings"].get("project_id"), owner=current_owner()
+                )
+                st.query_params["session"] = st.session_state["session_id"]
+            user_message["turn"] = assistant_message["turn"] = session_store.append_turn(
+                st.session_state["session_id"],
+                user_input,
+                combined_prompt,
+                full_response,
+                derived=derived,
+                meta=message_meta(assistant_message),
+                settings=st.session_state["applied_settings"],
+                step1_data=step1_data,
+            )
+        st.session_state["messages"] += [user_message, assistant_message]
+        st.session_state["model_messages"] += [
+            {"role": "user", "content": combined_prompt},
+            {"role": "assistant", "content": full_response},
+        ]
+        st.session_state["last_turn_settings"] = dict(st.session_state["applied_settings"])
+        trace.finish()
+    except Exception as e:
+        trace.finish(error=e)
+        st.error(f"생성 중 오류 발생: {e}")
+        st.caption("이번 입력은 대화 기록에 추가되지 않았습니다. 같은 내용으로 다시 시도할 수 있습니다.")
@@ -0,0 +1,284 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Model Backends
+모델 호출 인터페이스와 구현체
+- GeminiBackend: google.generativeai SDK (client_pool의 키별 클라이언트 사용)
+- FakeBackend: 네트워크 없이 주입된 응답을 재생 (지연/TTFT/토큰/오류 주입)
+  응답 내용은 호출 측이 정함 (fixture 목록 또는 responder - 앱/배치는 fake_responses.render_canned_response)
+
+채팅 세션은 SDK ChatSession과 같은 모양을 따른다:
+    chat.send_message(prompt, stream=False) -> response (.text, .usage_metadata)
+    await chat.send_message_async(prompt, stream=False)
+    stream=True이면 response를 순회하며 chunk.text를 받는다
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+from core import estimate_tokens
+from client_pool import get_client_pool, pooled_model_class
+
+BACKEND_ENV = "LG_MODEL_BACKEND"
+DEFAULT_BACKEND = "gemini"
+
+GEMINI_MODEL_EXCLUDE_TOKENS = (
+    "image", "audio", "tts", "native", "preview", "exp",
+    "embedding", "gemma", "nano", "aqa", "imagen", "veo", "robotics",
+)
+
+FAKE_MODEL_OPTIONS = ["fake-step2", "fake-step2-fast"]
+
+
+class BackendError(Exception):
+    """백엔드 호출 실패 (code: HTTP 상태 코드, SDK 예외와 동일한 속성명)"""
+
+    code = 500
+
+
+class RateLimitError(BackendError):
+    code = 429
+
+
+class ServiceUnavailableError(BackendError):
+    code = 503
+
+
+class UsageMetadata:
+    """SDK usage_metadata와 같은 필드명의 토큰 사용량"""
+
+    def __init__(self, prompt_token_count=0, candidates_token_count=0):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class ModelBackend:
+    """모델 백엔드 인터페이스"""
+
+    name = "base"
+    requires_api_key = False
+
+    def list_models(self):
+        raise NotImplementedError
+
+    def start_chat(self, model_name, history, generation_config, system_instruction):
+        raise NotImplementedError
+
+
+# ─────────────────────────────────────────────────────────────
+# Gemini
+# ─────────────────────────────────────────────────────────────
+
+class GeminiBackend(ModelBackend):
+    name = "gemini"
+    requires_api_key = True
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        # 전역 genai.configure 대신 키별 풀 클라이언트 사용 (세션 간 격리 + 연결 재사용)
+        self.clients = get_client_pool().get(api_key)
+
+    def list_models(self):
+        """generateContent 지원 gemini-* 텍스트 모델 목록 (정렬, 중복 제거)"""
+        import google.generativeai as genai
+
+        options = []
+        for model in genai.list_models(client=self.clients.model):
+            name = getattr(model, "name", "")
+            methods = getattr(model, "supported_generation_methods", []) or []
+            if "generateContent" not in methods:
+                continue
+            if name.startswith("models/"):
+                name = name.split("/", 1)[1]
+            options.append(name)
+        options = [
+            option for option in options
+            if option.startswith("gemini-")
+            and not any(token in option for token in GEMINI_MODEL_EXCLUDE_TOKENS)
+        ]
+        return sorted(set(options))
+
+    def start_chat(self, model_name, history, generation_config, system_instruction):
+        model = pooled_model_class()(
+            self.clients,
+            model_name=model_name,
+            generation_config=generation_config,
+            system_instruction=system_instruction,
+        )
+        return model.start_chat(history=history)
+
+
+# ─────────────────────────────────────────────────────────────
+# Fake (오프라인 부하/지연 테스트용)
+# ─────────────────────────────────────────────────────────────
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResponse:
+    """SDK GenerateContentResponse 대역 - stream이면 순회로 chunk 수신"""
+
+    def __init__(self, chunks, usage, delays, on_done):
+        self._chunks = chunks
+        self._delays = delays
+        self._on_done = on_done
+        self._consumed = False
+        self.usage_metadata = usage
+
+    @property
+    def text(self):
+        return "".join(self._chunks)
+
+    def _finish(self):
+        if not self._consumed:
+            self._consumed = True
+            self._on_done(self.text)
+
+    def __iter__(self):
+        for chunk, delay in zip(self._chunks, self._delays):
+            if delay:
+                time.sleep(delay)
+            yield FakeChunk(chunk)
+        self._finish()
+
+    async def __aiter__(self):
+        for chunk, delay in zip(self._chunks, self._delays):
+            if delay:
+                await asyncio.sleep(delay)
+            yield FakeChunk(chunk)
+        self._finish()
+
+
+class FakeChatSession:
+    def __init__(self, backend, model_name, history, system_instruction):
+        self.backend = backend
+        self.model_name = model_name
+        self.history = list(history)
+        self.system_instruction = system_instruction or ""
+
+    def _prepare(self, prompt, stream):
+        self.backend._maybe_fail()
+        response_text = self.backend._next_response(prompt)
+        context = self.system_instruction + "".join(
+            part for turn in self.history for part in turn.get("parts", [])
+        )
+        usage = UsageMetadata(
+            prompt_token_count=estimate_tokens(context) + estimate_tokens(prompt),
+            candidates_token_count=estimate_tokens(response_text),
+        )
+        chunks, delays = self.backend._schedule(response_text, usage.candidates_token_count, stream)
+
+        def on_done(text):
+            self.history.append({"role": "user", "parts": [prompt]})
+            self.history.append({"role": "model", "parts": [text]})
+
+        return FakeResponse(chunks, usage, delays, on_done)
+
+    def send_message(self, prompt, stream=False):
+        response = self._prepare(prompt, stream)
+        if not stream:
+            for _ in response:
+                pass
+        return response
+
+    async def send_message_async(self, prompt, stream=False):
+        response = self._prepare(prompt, stream)
+        if not stream:
+            async for _ in response:
+                pass
+        return response
+
+
+class FakeBackend(ModelBackend):
+    """
+    결정적(seed 고정) 로컬 백엔드 - 프롬프트 형식은 해석하지 않음
+    - responses: 재생할 응답 텍스트 목록 (순서대로 반복)
+    - responder: 목록이 없을 때 prompt → 응답 텍스트 함수 (없으면 프롬프트를 그대로 반환)
+    - ttft_s: 첫 토큰까지 지연, tokens_per_s: 디코딩 속도
+    - error_rate / rate_limit_rate: 요청당 503 / 429 주입 확률
+    """
+
+    name = "fake"
+
+    def __init__(self, responses=None, ttft_s=0.3, tokens_per_s=400.0, chunk_tokens=64,
+                 error_rate=0.0, rate_limit_rate=0.0, seed=0, responder=None):
+        self.responses = list(responses or [])
+        self.responder = responder
+        self.ttft_s = ttft_s
+        self.tokens_per_s = tokens_per_s
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cursor = 0
+
+    @classmethod
+    def from_env(cls, environ=None, responder=None):
+        """LG_FAKE_* 환경변수로 설정 (CI 벤치마크용) - LG_FAKE_FIXTURES가 있으면 responder보다 우선"""
+        env = os.environ if environ is None else environ
+        responses = []
+        fixtures_dir = env.get("LG_FAKE_FIXTURES", "")
+        if fixtures_dir and os.path.isdir(fixtures_dir):
+            for name in sorted(os.listdir(fixtures_dir)):
+                if name.endswith((".md", ".txt")):
+                    with open(os.path.join(fixtures_dir, name), "r", encoding="utf-8") as f:
+                        responses.append(f.read())
+        return cls(
+            responses=responses,
+            ttft_s=float(env.get("LG_FAKE_TTFT_MS", "300")) / 1000,
+            tokens_per_s=float(env.get("LG_FAKE_TOKENS_PER_S", "400")),
+            error_rate=float(env.get("LG_FAKE_ERROR_RATE", "0")),
+            rate_limit_rate=float(env.get("LG_FAKE_RATE_LIMIT_RATE", "0")),
+            seed=int(env.get("LG_FAKE_SEED", "0")),
+            responder=responder,
+        )
+
+    def list_models(self):
+        return list(FAKE_MODEL_OPTIONS)
+
+    def start_chat(self, model_name, history, generation_config, system_instruction):
+        return FakeChatSession(self, model_name, history, system_instruction)
+
+    def _maybe_fail(self):
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            raise RateLimitError("429 Resource has been exhausted (fake)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise ServiceUnavailableError("503 Service unavailable (fake)")
+
+    def _next_response(self, prompt):
+        if not self.responses:
+            return self.responder(prompt) if self.responder is not None else prompt
+        with self._lock:
+            text = self.responses[self._cursor % len(self.responses)]
+            self._cursor += 1
+        return text
+
+    def _schedule(self, text, output_tokens, stream):
+        """응답을 chunk로 나누고 chunk별 대기 시간 계산 (총합 = TTFT + 디코딩 시간)"""
+        n_chunks = max(1, -(-output_tokens // self.chunk_tokens)) if stream else 1
+        size = -(-len(text) // n_chunks) if text else 0
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] if size else [""]
+        decode_s = output_tokens / self.tokens_per_s if self.tokens_per_s > 0 else 0.0
+        per_chunk = decode_s / len(chunks)
+        delays = [self.ttft_s + per_chunk] + [per_chunk] * (len(chunks) - 1)
+        return chunks, delays
+
+
+def create_backend(name=None, api_key="", responder=None):
+    """
+    이름(기본: LG_MODEL_BACKEND 환경변수)으로 백엔드 생성
+    responder: fake 백엔드의 응답 생성 함수 (gemini는 무시)
+    """
+    name = (name or os.getenv(BACKEND_ENV, DEFAULT_BACKEND)).strip().lower()
+    if name == "fake":
+        return FakeBackend.from_env(responder=responder)
+    if name == "gemini":
+        return GeminiBackend(api_key)
+    raise ValueError(f"알 수 없는 백엔드: {name}")
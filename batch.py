@@ -0,0 +1,332 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Batch Runner
+Step 1 JSON 디렉터리 / NDJSON을 읽어 동시 요청 수 제한 하에 헤드리스 생성
+입력은 ingest.iter_step1_documents로 읽음 (하위 폴더, JSON 배열 / 연속 객체는 항목별 작업)
+결과(응답, Step 3 JSON, 오류)는 완료되는 순서대로 NDJSON에 기록
+동시 요청 수와 별개로 LG_RATE_LIMIT_RPM / LG_RATE_LIMIT_TPM 분당 한도를 지킴 (rate_limit)
+Step 1 필수 필드가 빠진 입력은 모델 호출 없이 status=rejected로 기록 (대량 입력은 ingest.py로 먼저 정리)
+
+사용 예:
+    python batch.py step1_outputs/ -o results.ndjson -c 8
+    python batch.py campaign.ndjson -o results.ndjson --model gemini-2.5-flash
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import nullcontext
+
+from core import (
+    MODEL_OPTIONS,
+    HOUSING_TYPE_OPTIONS,
+    INTERIOR_STYLE_OPTIONS,
+    OUTPUT_PRESET_OPTIONS,
+    default_settings,
+    apply_step1_values,
+    get_chat_session,
+    parse_response,
+    build_combined_prompt,
+    derived_handoff,
+    GENERATION_CONFIG,
+    get_system_prompt,
+    get_prompt_hash,
+    get_version,
+    estimate_tokens,
+)
+from backends import BACKEND_ENV, DEFAULT_BACKEND, create_backend
+from fake_responses import render_canned_response
+from cache import ResponseCache, make_cache_key
+from handoff_store import get_handoff_store
+from prompt_sections import assemble_system_prompt
+from handoff_schema import validate_handoff, validate_step1
+from ingest import iter_step1_documents
+from qa_lint import lint_response
+from step3_rules import merge_derived
+from fanout import generate_fanout
+from telemetry import get_telemetry
+from rate_limit import get_rate_limiter
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_USER_INPUT = "Step 1 데이터 기준으로 외관 + 인테리어 4분할 프롬프트를 생성해주세요."
+
+
+def build_job(source, step1_data, error, overrides, user_input, selective_prompt=True, validate_input=True):
+    """
+    단일 Step 1 입력(ingest.iter_step1_documents의 (source, 값, 오류)) → 생성 작업(설정 + 조합 프롬프트)
+    validate_input: step1_data 스키마 사전 검증 - 실패하면 기본값으로 채우지 않고 rejected 작업 반환
+    """
+    if error:
+        return {"source": source, "error": error}
+    if not isinstance(step1_data, dict):
+        return {"source": source, "error": "Step 1 JSON은 객체여야 합니다."}
+    if validate_input:
+        errors = validate_step1(step1_data)
+        if errors:
+            return {
+                "source": source,
+                "project_id": str(step1_data.get("project_id") or ""),
+                "status": "rejected",
+                "error": "Step 1 사전 검증 실패: " + "; ".join(f"{e['path']}: {e['message']}" for e in errors),
+            }
+
+    settings = apply_step1_values(default_settings(), step1_data)
+    settings.update(overrides)
+    if selective_prompt:
+        system_instruction = assemble_system_prompt(settings)[0]
+    else:
+        system_instruction = get_system_prompt()
+    return {
+        "source": source,
+        "project_id": settings["project_id"],
+        "settings": settings,
+        "system_instruction": system_instruction,
+        "prompt": build_combined_prompt(settings, step1_data, user_input),
+        "derived": derived_handoff(settings, step1_data),
+    }
+
+
+async def generate(backend, model_name, prompt, system_instruction=None, trace=None):
+    """
+    단일 턴 생성 (빈 히스토리 채팅 세션) - 공유 요청 제한기를 거치며 429/5xx는 백오프 후 재시도
+    trace가 있으면 세션/생성 시간, 대기 시간과 토큰 수 기록 (비스트리밍 - TTFT 없음)
+    """
+    input_tokens = estimate_tokens(system_instruction) + estimate_tokens(prompt)
+    if trace is None:
+        chat = get_chat_session(backend, model_name, [], system_instruction)
+        response = await get_rate_limiter().call_async(
+            lambda: chat.send_message_async(prompt), input_tokens=input_tokens
+        )
+        return response.text or ""
+
+    with trace.stage("session"):
+        chat = get_chat_session(backend, model_name, [], system_instruction)
+    with trace.stage("generate"):
+        response = await get_rate_limiter().call_async(
+            lambda: chat.send_message_async(prompt), input_tokens=input_tokens, trace=trace
+        )
+    # 스트리밍이 아니므로 TTFT는 기록하지 않음 (전체 응답 시간과 같아짐)
+    trace.add_usage(response)
+    return response.text or ""
+
+
+async def run_job(job, backend, model_name, cache=None, fanout=False, telemetry=None, handoff_store=None):
+    """
+    작업 실행 후 NDJSON 레코드 반환 - 예외는 레코드의 error로 기록
+    handoff_store: 스키마 검증을 통과한 핸드오프를 기록할 저장소 (레코드의 handoff_hash)
+    """
+    record = {
+        "source": job["source"],
+        "project_id": job.get("project_id", ""),
+        "model": model_name,
+        "status": "error",
+        "cached": False,
+        "elapsed_ms": 0,
+        "response": None,
+        "step3_json": None,
+        "schema_errors": [],
+        "qa": [],
+        "handoff_hash": None,
+        "error": job.get("error"),
+    }
+    if record["error"]:
+        record["status"] = job.get("status", "error")
+        return record
+
+    trace = None
+    if telemetry is not None:
+        trace = telemetry.start(
+            source="batch",
+            backend=backend.name,
+            model=model_name,
+            mode="fanout" if fanout else "single",
+            prompt_version=get_version(),
+            prompt_hash=get_prompt_hash()[:12],
+            project_id=record["project_id"],
+            history_turns=0,
+            history_tokens=0,
+        )
+    started = time.perf_counter()
+    try:
+        cache_key = None
+        full_response = None
+        if cache is not None:
+            cache_key = make_cache_key(
+                job["system_instruction"], model_name, GENERATION_CONFIG, [], job["prompt"],
+                mode="fanout" if fanout else "single",
+            )
+            full_response = cache.get(cache_key)
+            record["cached"] = full_response is not None
+        if full_response is None:
+            if fanout:
+                with trace.stage("generate") if trace is not None else nullcontext():
+                    full_response, _ = await generate_fanout(
+                        backend, model_name, job["settings"], job["prompt"],
+                        system_instruction=job["system_instruction"], trace=trace,
+                    )
+            else:
+                full_response = await generate(
+                    backend, model_name, job["prompt"], job["system_instruction"], trace
+                )
+            if cache is not None:
+                cache.put(cache_key, model_name, full_response)
+        with trace.stage("parse") if trace is not None else nullcontext():
+            json_data, _ = parse_response(full_response)
+            json_data = merge_derived(json_data, job["derived"])
+            record["schema_errors"] = [
+                {"path": e["path"], "message": e["message"]} for e in validate_handoff(json_data)
+            ] if json_data is not None else []
+            record["qa"] = [
+                finding for finding in lint_response(full_response, job["settings"], json_data=json_data)
+                if not finding["ok"]
+            ]
+        if handoff_store is not None:
+            record["handoff_hash"] = handoff_store.put(json_data, record["schema_errors"])
+        record["response"] = full_response
+        record["step3_json"] = json_data
+        record["status"] = "ok" if json_data is not None else "no_json"
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    if trace is not None:
+        trace.update(
+            cached=record["cached"],
+            parse_ok=record["step3_json"] is not None if record["response"] is not None else None,
+            schema_errors=len(record["schema_errors"]),
+            qa_failures=len(record["qa"]) if record["response"] is not None else None,
+        )
+        trace.finish(error=record["error"])
+    return record
+
+
+async def run_batch(sources, out, backend, model_name, concurrency=DEFAULT_CONCURRENCY,
+                    overrides=None, user_input=DEFAULT_USER_INPUT, cache=None, selective_prompt=True,
+                    fanout=False, telemetry=None, handoff_store=None, validate_input=True):
+    """
+    producer → 큐 → worker N개 구조로 동시 요청 수를 concurrency로 제한
+    각 결과는 완료 즉시 out에 한 줄씩 기록 (flush 포함)
+    """
+    overrides = overrides or {}
+    concurrency = max(1, int(concurrency))
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    counts = {"ok": 0, "no_json": 0, "error": 0, "rejected": 0}
+
+    async def producer():
+        for source, step1_data, error in sources:
+            await queue.put(build_job(source, step1_data, error, overrides, user_input, selective_prompt, validate_input))
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def worker():
+        while True:
+            job = await queue.get()
+            if job is None:
+                return
+            record = await run_job(job, backend, model_name, cache, fanout, telemetry, handoff_store)
+            counts[record["status"]] += 1
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+    await asyncio.gather(producer(), *(worker() for _ in range(concurrency)))
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="LG Art Director STEP 2 배치 생성")
+    parser.add_argument("input", help="Step 1 JSON 디렉터리, NDJSON(.ndjson/.jsonl) 또는 단일 JSON 파일")
+    parser.add_argument("-o", "--output", default="-", help="결과 NDJSON 경로 (기본: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"동시 요청 수 상한 (기본: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--backend", choices=["gemini", "fake"],
+                        default=os.getenv(BACKEND_ENV, DEFAULT_BACKEND),
+                        help=f"모델 백엔드 (기본: {BACKEND_ENV} 환경변수 또는 {DEFAULT_BACKEND})")
+    parser.add_argument("--model", help="모델 이름 (기본: 백엔드의 첫 번째 모델)")
+    parser.add_argument("--prompt", default=DEFAULT_USER_INPUT, help="공통 크리에이티브 디렉션")
+    parser.add_argument("--cache", action="store_true",
+                        help="응답 캐시 사용 (동일 입력은 모델 호출 생략, LG_RESPONSE_CACHE_* 환경변수로 설정)")
+    parser.add_argument("--full-prompt", action="store_true",
+                        help="선택적 프롬프트 조합 없이 전체 시스템 프롬프트 전송")
+    parser.add_argument("--fanout", action="store_true",
+                        help="외관/쿼드런트/핸드오프를 동시 하위 요청으로 생성 후 로컬 조립")
+    parser.add_argument("--no-telemetry", action="store_true",
+                        help="텔레메트리 기록 끄기 (기본: LG_TELEMETRY_* 경로에 JSONL/Prometheus 기록)")
+    parser.add_argument("--no-handoff-store", action="store_true",
+                        help="검증 통과 핸드오프를 저장소에 기록하지 않음 (기본: LG_HANDOFF_STORE_PATH)")
+    parser.add_argument("--skip-step1-validation", action="store_true",
+                        help="Step 1 사전 검증 생략 (누락 필드는 기본값으로 채워 생성)")
+    parser.add_argument("--housing-type", choices=HOUSING_TYPE_OPTIONS)
+    parser.add_argument("--interior-style", choices=INTERIOR_STYLE_OPTIONS)
+    parser.add_argument("--room-types", help="쉼표 구분 룸 타입 (예: Kitchen,Living,Bedroom,Laundry)")
+    parser.add_argument("--entropy-level", type=int, choices=range(1, 11))
+    parser.add_argument("--output-preset", choices=OUTPUT_PRESET_OPTIONS)
+    parser.add_argument("--compact-output", action="store_true",
+                        help="§10 QA 체크리스트 생성 생략 (레코드의 qa에 로컬 QA 실패 항목 기록)")
+    parser.add_argument("--no-derive-fields", action="store_true",
+                        help="조회 표로 정해지는 Step 3 필드도 모델이 직접 출력 (기본: 로컬 계산 후 병합)")
+    return parser.parse_args(argv)
+
+
+def settings_overrides(args):
+    """CLI 인자 중 지정된 Step 2 설정만 추출"""
+    overrides = {}
+    if args.housing_type:
+        overrides["housing_type"] = args.housing_type
+    if args.interior_style:
+        overrides["interior_style"] = args.interior_style
+    if args.room_types:
+        overrides["room_types"] = [r.strip() for r in args.room_types.split(",") if r.strip()]
+    if args.entropy_level:
+        overrides["entropy_level"] = args.entropy_level
+    if args.output_preset:
+        overrides["output_preset"] = args.output_preset
+    if args.compact_output:
+        overrides["compact_output"] = True
+    if args.no_derive_fields:
+        overrides["derive_fields"] = False
+    return overrides
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    api_key = os.getenv("GOOGLE_API_KEY", "").strip()
+    backend = create_backend(args.backend, api_key, responder=render_canned_response)
+    if backend.requires_api_key and not api_key:
+        raise SystemExit("GOOGLE_API_KEY 환경변수가 필요합니다.")
+    model_name = args.model or (MODEL_OPTIONS[0] if backend.requires_api_key else backend.list_models()[0])
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    started = time.perf_counter()
+    try:
+        counts = asyncio.run(run_batch(
+            iter_step1_documents(args.input),
+            out,
+            backend,
+            model_name,
+            concurrency=args.concurrency,
+            overrides=settings_overrides(args),
+            user_input=args.prompt,
+            cache=ResponseCache.from_env() if args.cache else None,
+            selective_prompt=not args.full_prompt,
+            fanout=args.fanout,
+            telemetry=None if args.no_telemetry else get_telemetry(),
+            handoff_store=None if args.no_handoff_store else get_handoff_store(),
+            validate_input=not args.skip_step1_validation,
+        ))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print(
+        f"완료: {total}건 (ok={counts['ok']}, no_json={counts['no_json']}, error={counts['error']}, "
+        f"rejected={counts['rejected']}) "
+        f"/ {elapsed:.1f}s / {total / elapsed if elapsed else 0:.2f} req/s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Hot Path Micro-benchmarks
+프롬프트 조합 / 히스토리 구성 / 응답 파싱 / 로컬 QA 경로의 호출당 시간을 측정하고
+저장된 기준값(bench_baseline.json) 대비 회귀 여부를 판정
+
+- 모든 fixture는 고정 seed로 합성 (네트워크/API 키 불필요)
+- 측정값은 같은 프로세스에서 잰 기준 연산(calibration) 시간으로 나눠 정규화하므로
+  다른 머신에서 만든 기준값과도 대략 비교 가능
+- 전체를 rounds회 번갈아 측정해 라운드별 정규화 값의 중앙값을 사용 (라운드마다 기준 연산을 다시 잼)
+- 정규화 값이 기준값보다 threshold 이상 느려지면 해당 벤치마크만 다시 측정해 확인하고,
+  두 번 모두 느릴 때만 회귀로 판정 (종료 코드 1)
+
+사용 예:
+    python bench.py                         # 기준값과 비교 (회귀 시 exit 1)
+    python bench.py --update-baseline       # 현재 결과를 기준값으로 저장
+    python bench.py -k parse_response       # 이름에 포함된 벤치마크만
+    python bench.py --threshold 0.3         # 허용 회귀율 30%
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+
+from fake_responses import render_canned_response
+from core import (
+    build_chat_history,
+    build_combined_prompt,
+    default_settings,
+    extract_step1_values,
+    parse_response,
+)
+from handoff_store import HandoffStore
+from history import build_compact_history
+from prompt import PromptRegistry, load_system_prompt
+from qa_lint import lint_response
+from response_blocks import ParsedResponse, scan_blocks
+
+SEED = 20260101
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+DEFAULT_THRESHOLD = 0.50
+DEFAULT_REPEAT = 3
+DEFAULT_ROUNDS = 3
+MIN_RUN_S = 0.05
+
+WORDS = (
+    "oak plaster brass linen velvet marble terrazzo walnut ceramic wool jute rattan "
+    "window light shadow morning dusk patina texture grain lamp rug shelf sofa"
+).split()
+
+
+# ─────────────────────────────────────────────────────────────
+# Fixtures (고정 seed 합성 데이터)
+# ─────────────────────────────────────────────────────────────
+
+def _sentence(rng, n_words):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+
+
+def make_step1_json(rng, n_scenes):
+    """Step 1 출력 형태의 큰 JSON (scene 항목 수로 크기 조절)"""
+    return {
+        "project_id": f"LG_AD_2026_BENCH_{n_scenes}",
+        "region": "EU",
+        "city": "Paris",
+        "season": "WINTER",
+        "fashion_color": "#C19A6B",
+        "fashion_color_name": "Camel",
+        "aspect_ratio": "4:5",
+        "biometric_ids": [f"bio_{rng.randrange(10**8):08d}" for _ in range(8)],
+        "fixed": {"age": 35, "occupation": "Gallery Curator"},
+        "scenes": [
+            {
+                "scene_id": f"S{index:04d}",
+                "mood": _sentence(rng, 6),
+                "wardrobe": {"top": _sentence(rng, 5), "bottom": _sentence(rng, 5), "accent": "#%06X" % rng.randrange(1 << 24)},
+                "notes": [_sentence(rng, 12) for _ in range(3)],
+            }
+            for index in range(n_scenes)
+        ],
+    }
+
+
+def make_model_output(rng, target_tokens=8000):
+    """표준 Output Structure + 여러 fenced 블록(깨진 json 포함)으로 약 target_tokens 길이의 응답"""
+    base = render_canned_response("")
+    padding = []
+    while len(base) + sum(len(p) for p in padding) < target_tokens * 4:
+        padding.append(_sentence(rng, 24))
+    notes = "\n".join(padding)
+    return "\n\n".join([
+        "```markdown\n" + notes[: len(notes) // 3] + "\n```",
+        "```json\n{\"draft\": true, \"incomplete\": \n```",
+        "```python\nprint('not a handoff')\n```",
+        base,
+        notes[len(notes) // 3:],
+    ])
+
+
+def make_session(rng, n_turns, step1_json):
+    """n_turns 턴의 model_messages (user=조합 프롬프트, assistant=표준 응답)"""
+    settings = default_settings()
+    response = render_canned_response(build_combined_prompt(settings, step1_json, ""))
+    messages = []
+    for turn in range(n_turns):
+        messages.append({
+            "role": "user",
+            "content": build_combined_prompt(settings, step1_json, _sentence(rng, 10) + f" (turn {turn})"),
+        })
+        messages.append({"role": "assistant", "content": response + "\n" + _sentence(rng, 20)})
+    return messages
+
+
+def make_handoff_store(rng, n_handoffs):
+    """n_handoffs개 핸드오프를 담은 메모리 저장소 (프로젝트 500개 × 도시 / 스타일 / 룸 조합)"""
+    store = HandoffStore(":memory:")
+    cities = ("Paris", "Seoul", "Tokyo", "New York", "Milan")
+    styles = ("MINIMAL", "SCANDI", "JAPANDI", "INDUSTRIAL")
+    rooms = ("Kitchen", "Living", "Bedroom", "Laundry")
+    store.put_many(
+        {
+            "schema_version": "1.1",
+            "project_id": f"LG_AD_2026_BENCH_{index % 500:03d}",
+            "step1_data": {"city": rng.choice(cities), "fashion_color": "#C19A6B"},
+            "step2_data": {"interior_style": rng.choice(styles), "notes": _sentence(rng, 30)},
+            "room_target": {"room_type": rng.choice(rooms), "grid_zone": "Upper-left"},
+        }
+        for index in range(n_handoffs)
+    )
+    return store
+
+
+def build_benchmarks():
+    """[(이름, 호출 함수)] - fixture는 여기서 한 번만 생성"""
+    rng = random.Random(SEED)
+    settings = default_settings()
+    step1_small = make_step1_json(rng, 40)
+    step1_large = make_step1_json(rng, 400)
+    output_8k = make_model_output(rng)
+    output_50kb = make_model_output(rng, target_tokens=12500)
+    sessions = {n: make_session(rng, n, step1_small) for n in (10, 50, 200)}
+    handoffs = make_handoff_store(rng, 20000)
+
+    benches = [
+        ("load_system_prompt.cached", load_system_prompt),
+        ("load_system_prompt.cold", lambda: PromptRegistry(check_interval_s=0)),
+        ("build_combined_prompt.step1_40_scenes", lambda: build_combined_prompt(settings, step1_small, "bench")),
+        ("build_combined_prompt.step1_400_scenes", lambda: build_combined_prompt(settings, step1_large, "bench")),
+        ("extract_step1_values.step1_400_scenes", lambda: extract_step1_values(step1_large)),
+        ("parse_response.8k_tokens", lambda: parse_response(output_8k)),
+        ("parse_response.50kb", lambda: parse_response(output_50kb)),
+        ("scan_blocks.50kb", lambda: scan_blocks(output_50kb)),
+        ("response_sections.50kb", lambda: ParsedResponse(output_50kb).sections),
+        ("qa_lint.50kb", lambda: lint_response(output_50kb, settings)),
+        ("handoff_store.find_project.20k", lambda: handoffs.find(project_id="LG_AD_2026_BENCH_042")),
+        ("handoff_store.count_city_room.20k", lambda: handoffs.count(city="Paris", room_type="kitchen")),
+    ]
+    for n_turns, messages in sessions.items():
+        benches.append((f"build_chat_history.turns_{n_turns}", lambda m=messages: build_chat_history(m)))
+    for n_turns, messages in sessions.items():
+        benches.append((f"build_compact_history.turns_{n_turns}", lambda m=messages: build_compact_history(m)))
+    return benches
+
+
+# ─────────────────────────────────────────────────────────────
+# 측정
+# ─────────────────────────────────────────────────────────────
+
+def _calibration_workload():
+    data = {"values": list(range(200)), "text": "calibration " * 50}
+    total = 0
+    for _ in range(20):
+        total += len(json.loads(json.dumps(data))["values"])
+        total += sum(i * i for i in range(500))
+    return total
+
+
+def measure(func, repeat=DEFAULT_REPEAT):
+    """호출당 최소 시간(초) - autorange로 반복 횟수를 정한 뒤 repeat회 중 최솟값"""
+    timer = timeit.Timer(func)
+    loops, elapsed = timer.autorange()
+    while elapsed < MIN_RUN_S:
+        loops *= 2
+        elapsed = timer.timeit(loops)
+    return min(timer.repeat(repeat=repeat, number=loops)) / loops
+
+
+def run(pattern=None, repeat=DEFAULT_REPEAT, rounds=DEFAULT_ROUNDS, names=None):
+    """
+    rounds회 측정 → (기준 연산 중앙값, {이름: {"per_call_us", "normalized"}})
+    라운드마다 실행 전후 기준 연산 중 빠른 쪽으로 정규화하고 (측정 중 CPU 부하 변동 완화),
+    라운드별 값의 중앙값을 결과로 사용 (일시적인 부하로 튄 라운드 하나는 무시)
+    names: 지정하면 이 이름들만 측정 (회귀 확인용)
+    """
+    benchmarks = [
+        (name, func) for name, func in build_benchmarks()
+        if (not pattern or pattern in name) and (names is None or name in names)
+    ]
+    calibrations = []
+    per_call = {name: [] for name, _ in benchmarks}
+    normalized = {name: [] for name, _ in benchmarks}
+    for _ in range(max(1, rounds)):
+        before = measure(_calibration_workload, repeat)
+        raw = {name: measure(func, repeat) for name, func in benchmarks}
+        calibration_s = min(before, measure(_calibration_workload, repeat))
+        calibrations.append(calibration_s)
+        for name, per_call_s in raw.items():
+            per_call[name].append(per_call_s)
+            normalized[name].append(per_call_s / calibration_s)
+    results = {
+        name: {
+            "per_call_us": round(statistics.median(per_call[name]) * 1e6, 3),
+            "normalized": round(statistics.median(normalized[name]), 6),
+        }
+        for name, _ in benchmarks
+    }
+    return statistics.median(calibrations), results
+
+
+def compare(results, baseline, threshold):
+    """[(이름, 결과, 기준, 비율, 상태)] - 상태: ok / regression / faster / new"""
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append((name, result, None, None, "new"))
+            continue
+        ratio = result["normalized"] / base["normalized"] if base["normalized"] else 1.0
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, result, base, ratio, status))
+    return rows
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("benchmarks", {})
+
+
+def save_baseline(path, calibration_s, results):
+    payload = {
+        "meta": {
+            "seed": SEED,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "calibration_us": round(calibration_s * 1e6, 3),
+        },
+        "benchmarks": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LG Art Director STEP 2 hot path 벤치마크")
+    parser.add_argument("-k", dest="pattern", help="이름에 이 문자열이 포함된 벤치마크만 실행")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="기준값 JSON 경로")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"허용 회귀율 (기본: {DEFAULT_THRESHOLD} = 50%%, 공유 CI 측정 노이즈 고려)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="라운드당 반복 측정 횟수 (최솟값 사용)")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="전체 측정 라운드 수 (중앙값 사용)")
+    parser.add_argument("--update-baseline", action="store_true", help="현재 결과를 기준값으로 저장")
+    args = parser.parse_args(argv)
+
+    calibration_s, results = run(args.pattern, args.repeat, args.rounds)
+    baseline = load_baseline(args.baseline)
+    rows = compare(results, baseline, args.threshold)
+
+    flagged = {row[0] for row in rows if row[4] == "regression"}
+    if flagged and not args.update_baseline:
+        # 회귀로 보인 항목만 다시 측정 - 두 번 측정 중 빠른 쪽으로 판정
+        _, confirm = run(args.pattern, args.repeat, args.rounds, names=flagged)
+        for name, result in confirm.items():
+            if result["normalized"] < results[name]["normalized"]:
+                results[name] = result
+        rows = compare(results, baseline, args.threshold)
+
+    print(f"calibration: {calibration_s * 1e6:.1f} us  (threshold +{args.threshold:.0%})")
+    print(f"{'BENCHMARK':<42} {'PER CALL':>12} {'BASELINE':>12} {'RATIO':>7}  STATUS")
+    for name, result, base, ratio, status in rows:
+        base_text = f"{base['per_call_us']:.1f} us" if base else "-"
+        ratio_text = f"{ratio:.2f}x" if ratio is not None else "-"
+        print(f"{name:<42} {result['per_call_us']:>9.1f} us {base_text:>12} {ratio_text:>7}  {status}")
+
+    if args.update_baseline:
+        if args.pattern:
+            merged = dict(baseline)
+            merged.update(results)
+            results = merged
+        save_baseline(args.baseline, calibration_s, results)
+        print(f"\n기준값 저장: {args.baseline}")
+        return 0
+
+    regressions = [row[0] for row in rows if row[4] == "regression"]
+    if regressions:
+        print(f"\n회귀 {len(regressions)}건: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Response Cache
+동일 설정/프롬프트 재요청 시 모델 호출 없이 응답을 반환하는 SQLite 캐시
+
+키 = sha256(프롬프트 세트 해시, 시스템 프롬프트, 모델명, generation_config, 히스토리, 조합 프롬프트)
+- prompts/ 파일이 바뀌면 prompt.PromptRegistry의 해시가 바뀌어 기존 항목은 자동으로 무효화
+- TTL 경과 항목은 조회되지 않고, 최대 항목 수를 넘으면 마지막 접근이 오래된 순(LRU)으로 삭제
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from core import get_prompt_hash
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "response_cache.sqlite3")
+DEFAULT_TTL_S = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 500
+
+
+def make_cache_key(system_instruction, model_name, generation_config, history, prompt, mode="single"):
+    """mode: 생성 방식 (fan-out 등 같은 입력이라도 출력이 다른 경로는 별도 키)"""
+    payload = {
+        "prompt_set": get_prompt_hash(),
+        "system": hashlib.sha256((system_instruction or "").encode("utf-8")).hexdigest(),
+        "model": model_name,
+        "generation_config": generation_config,
+        "history": history,
+        "prompt": prompt,
+    }
+    if mode != "single":
+        payload["mode"] = mode
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite 기반 응답 캐시 (프로세스 내 스레드 간 공유)"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_s=DEFAULT_TTL_S, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " hit_count INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls):
+        """LG_RESPONSE_CACHE_* 환경변수로 설정"""
+        return cls(
+            path=os.getenv("LG_RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttl_s=float(os.getenv("LG_RESPONSE_CACHE_TTL_S", DEFAULT_TTL_S)),
+            max_entries=int(os.getenv("LG_RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+        )
+
+    def get(self, key):
+        """캐시된 응답 텍스트 (없거나 만료되면 None)"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl_s),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ?, hit_count = hit_count + 1 WHERE key = ?",
+                (now, key),
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model_name, response):
+        if not response:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_access, hit_count)"
+                " VALUES (?, ?, ?, ?, ?, 0)",
+                (key, model_name, response, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        expired = self._conn.execute(
+            "DELETE FROM responses WHERE created_at <= ?", (now - self.ttl_s,)
+        ).rowcount
+        overflow = self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        self.evictions += max(0, expired) + max(0, overflow)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+        }
@@ -1,17 +1,50 @@
+"""
+모델 목록 확인 CLI (model_catalog 공유 캐시 사용)
+
+사용 예:
+    python check.py              # 캐시가 신선하면 캐시, 아니면 API 조회
+    python check.py --refresh    # 캐시 무시하고 다시 조회
+    python check.py --backend fake
+"""
+
+import argparse
 import os
-import google.generativeai as genai
-
-MY_API_KEY = os.getenv("GOOGLE_API_KEY", "").strip()
-if not MY_API_KEY:
-    raise SystemExit("GOOGLE_API_KEY 환경변수가 필요합니다.")
-
-genai.configure(api_key=MY_API_KEY)
-
-print("--- 사용 가능한 모델 목록 ---")
-try:
-    for m in genai.list_models():
-        if 'generateContent' in m.supported_generation_methods:
-            print(m.name)
-except Exception as e:
-    print(f"에러 발생: {e}")
-print("---------------------------")
+import time
+
+from backends import BACKEND_ENV, DEFAULT_BACKEND, create_backend
+from model_catalog import get_model_catalog
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="사용 가능한 모델 목록 확인")
+    parser.add_argument("--backend", choices=["gemini", "fake"], default=os.getenv(BACKEND_ENV, DEFAULT_BACKEND))
+    parser.add_argument("--refresh", action="store_true", help="캐시를 무시하고 다시 조회")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("GOOGLE_API_KEY", "").strip()
+    backend = create_backend(args.backend, api_key)
+    if backend.requires_api_key and not api_key:
+        raise SystemExit("GOOGLE_API_KEY 환경변수가 필요합니다.")
+
+    catalog = get_model_catalog()
+    if args.refresh:
+        options = catalog.refresh(backend, api_key)
+        if options is None:
+            raise SystemExit("에러 발생: 모델 목록을 조회하지 못했습니다.")
+    else:
+        options = catalog.get(backend, api_key)
+
+    print("--- 사용 가능한 모델 목록 ---")
+    for option in options:
+        print(option)
+    print("---------------------------")
+
+    info = catalog.info(backend, api_key)
+    if info is None:
+        raise SystemExit("에러 발생: 모델 목록을 조회하지 못했습니다.")
+    fetched = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(info["fetched_at"]))
+    print(f"갱신: {fetched} ({'API 조회' if catalog.fetches else '캐시'}, {catalog.path or '메모리'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Gemini Client Pool
+API 키 fingerprint별로 설정된 SDK 클라이언트를 프로세스 전체에서 공유
+
+- 모듈 전역 genai.configure를 쓰지 않으므로 키가 다른 세션이 동시에 실행돼도 서로 간섭하지 않음
+- 같은 키의 세션은 같은 클라이언트(= 같은 gRPC 채널)를 재사용해 연결 설정 비용을 한 번만 지불
+- async 클라이언트는 이벤트 루프에 묶이므로 루프별로 만들어 재사용
+  동기 코드(Streamlit)의 동시 요청은 run_coroutine으로 프로세스 공용 백그라운드 루프 하나에서 실행
+  (호출마다 asyncio.run으로 새 루프를 만들면 턴마다 gRPC aio 채널이 새로 생기고 닫히지 않음)
+- 키 수가 max_keys를 넘으면 가장 오래 쓰지 않은 키의 클라이언트부터 풀에서 제외
+"""
+
+import asyncio
+import threading
+import weakref
+from collections import OrderedDict
+
+from core import fingerprint_key
+
+DEFAULT_MAX_KEYS = 32
+
+
+class GeminiClients:
+    """키 하나에 대한 SDK 클라이언트 묶음 (생성은 처음 쓸 때)"""
+
+    def __init__(self, api_key):
+        self._client_options = {"api_key": api_key}
+        self._lock = threading.Lock()
+        self._generative = None
+        self._model = None
+        self._async_generative = weakref.WeakKeyDictionary()
+
+    def _client_info(self):
+        import google.generativeai as genai
+        from google.api_core import gapic_v1
+
+        return gapic_v1.client_info.ClientInfo(user_agent=f"genai-py/{genai.__version__}")
+
+    @property
+    def generative(self):
+        """GenerativeServiceClient (sync, 스레드 간 공유)"""
+        if self._generative is None:
+            from google.ai import generativelanguage as glm
+
+            with self._lock:
+                if self._generative is None:
+                    self._generative = glm.GenerativeServiceClient(
+                        client_options=self._client_options, client_info=self._client_info()
+                    )
+        return self._generative
+
+    @property
+    def model(self):
+        """ModelServiceClient (list_models용)"""
+        if self._model is None:
+            from google.ai import generativelanguage as glm
+
+            with self._lock:
+                if self._model is None:
+                    self._model = glm.ModelServiceClient(
+                        client_options=self._client_options, client_info=self._client_info()
+                    )
+        return self._model
+
+    def async_generative(self):
+        """현재 실행 중인 이벤트 루프용 GenerativeServiceAsyncClient (루프 밖이면 None)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        from google.ai import generativelanguage as glm
+
+        with self._lock:
+            client = self._async_generative.get(loop)
+            if client is None:
+                client = glm.GenerativeServiceAsyncClient(
+                    client_options=self._client_options, client_info=self._client_info()
+                )
+                self._async_generative[loop] = client
+        return client
+
+
+_model_class = None
+
+
+def pooled_model_class():
+    """GenerativeModel 하위 클래스 - 전역 기본 클라이언트 대신 풀의 클라이언트 사용"""
+    global _model_class
+    if _model_class is None:
+        import google.generativeai as genai
+
+        class PooledGenerativeModel(genai.GenerativeModel):
+            def __init__(self, clients, **kwargs):
+                self._clients = clients
+                super().__init__(**kwargs)
+
+            # SDK는 _client / _async_client가 None이면 전역 기본 클라이언트를 만든다
+            _client = property(lambda self: self._clients.generative, lambda self, value: None)
+            _async_client = property(lambda self: self._clients.async_generative(), lambda self, value: None)
+
+        _model_class = PooledGenerativeModel
+    return _model_class
+
+
+class ClientPool:
+    """fingerprint → GeminiClients (LRU, 스레드 안전)"""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()
+
+    def get(self, api_key):
+        key = fingerprint_key(api_key)
+        with self._lock:
+            clients = self._clients.get(key)
+            if clients is None:
+                clients = GeminiClients(api_key)
+                self._clients[key] = clients
+            self._clients.move_to_end(key)
+            # 정리된 클라이언트는 진행 중인 요청이 끝나고 참조가 사라질 때 채널이 닫힘
+            while len(self._clients) > self.max_keys:
+                self._clients.popitem(last=False)
+        return clients
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_client_pool() -> ClientPool:
+    """프로세스 전체에서 공유하는 클라이언트 풀"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ClientPool()
+    return _pool
+
+
+def get_background_loop():
+    """프로세스 전체에서 공유하는 이벤트 루프 (데몬 스레드에서 계속 실행, 처음 쓸 때 시작)"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="lg-async-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_coroutine(coro, timeout=None):
+    """
+    동기 진입점 - 코루틴을 공용 백그라운드 루프에서 실행하고 결과를 기다림 (예외는 그대로 전파)
+    async 클라이언트가 루프별로 캐시되므로 호출이 달라도 같은 채널을 재사용
+    """
+    loop = get_background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_coroutine은 백그라운드 루프 안에서 호출할 수 없습니다 (await 사용)")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
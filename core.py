@@ -0,0 +1,399 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Core
+Streamlit에 의존하지 않는 설정/프롬프트 조합/응답 파싱 로직
+app.py(UI)와 batch.py(헤드리스) 양쪽에서 공용으로 사용
+"""
+
+import json
+import hashlib
+
+from handoff_schema import (
+    REPAIR_SYSTEM_INSTRUCTION,
+    build_repair_prompt,
+    merge_repair,
+    validate_handoff,
+)
+from rate_limit import get_rate_limiter
+from response_blocks import ParsedResponse, handoff_score, load_block, scan_blocks
+from step3_rules import derive_handoff, derived_fields_line, merge_derived
+
+try:
+    from prompt import LG_SYSTEM_PROMPT, SYSTEM_VERSION, get_system_prompt, get_prompt_hash, get_version
+    PROMPT_AVAILABLE = True
+except ImportError:
+    LG_SYSTEM_PROMPT = "LG Art Director System STEP 2 v5.9.0 System Prompt Placeholder"
+    SYSTEM_VERSION = "5.9.0"
+    PROMPT_AVAILABLE = False
+
+    def get_system_prompt():
+        return LG_SYSTEM_PROMPT
+
+    def get_prompt_hash():
+        return hashlib.sha256(LG_SYSTEM_PROMPT.encode("utf-8")).hexdigest()
+
+    def get_version():
+        return SYSTEM_VERSION
+
+MODEL_OPTIONS = [
+    "gemini-2.0-flash",
+    "gemini-2.0-flash-001",
+    "gemini-2.0-flash-lite",
+    "gemini-2.5-flash",
+    "gemini-2.5-pro",
+    "gemini-flash-latest",
+    "gemini-pro-latest",
+]
+
+# Step 2 전용 옵션들
+HOUSING_TYPE_OPTIONS = ["STUDIO", "APARTMENT", "LOFT", "VILLA", "PENTHOUSE"]
+HOUSING_TYPE_LABELS = {
+    "STUDIO": "스튜디오 (20-35㎡)",
+    "APARTMENT": "아파트 (60-90㎡)",
+    "LOFT": "로프트 (80-120㎡)",
+    "VILLA": "빌라 (150㎡+)",
+    "PENTHOUSE": "펜트하우스 (150㎡+)",
+}
+
+INTERIOR_STYLE_OPTIONS = [
+    "PARIS_STYLE", "LONDON_STYLE", "MILAN_STYLE", "BERLIN_STYLE",
+    "SCANDI_STYLE", "VIENNA_STYLE", "MEDITERRANEAN_EU", "DUTCH_STYLE",
+    "MEXICO_STYLE", "BRAZIL_STYLE", "ARGENTINA_STYLE", "LATAM_MODERN",
+]
+INTERIOR_STYLE_LABELS = {
+    "PARIS_STYLE": "파리 스타일",
+    "LONDON_STYLE": "런던 스타일",
+    "MILAN_STYLE": "밀라노 스타일",
+    "BERLIN_STYLE": "베를린 스타일",
+    "SCANDI_STYLE": "스칸디나비안",
+    "VIENNA_STYLE": "비엔나 스타일",
+    "MEDITERRANEAN_EU": "지중해 스타일",
+    "DUTCH_STYLE": "더치 스타일",
+    "MEXICO_STYLE": "멕시코 스타일",
+    "BRAZIL_STYLE": "브라질 스타일",
+    "ARGENTINA_STYLE": "아르헨티나 스타일",
+    "LATAM_MODERN": "라틴 모던",
+}
+
+ROOM_TYPE_OPTIONS = ["Kitchen", "Living", "Bedroom", "Laundry", "Bathroom", "Study", "Dining"]
+
+ENTROPY_LEVELS = {
+    1: "극미니멀 (1-5개)",
+    2: "극미니멀 (1-5개)",
+    3: "미니멀 (5-10개)",
+    4: "미니멀 (5-10개)",
+    5: "큐레이티드 ⭐기본",
+    6: "큐레이티드 ⭐기본",
+    7: "풍성함 (30-50개)",
+    8: "풍성함 (30-50개)",
+    9: "맥시멀리스트 (60+)",
+    10: "맥시멀리스트 (60+)",
+}
+
+OUTPUT_PRESET_OPTIONS = ["BASIC", "DETAIL_PLUS", "NEGATIVE_PLUS", "COMPOSITE_READY"]
+OUTPUT_PRESET_LABELS = {
+    "BASIC": "기본",
+    "DETAIL_PLUS": "디테일 강화",
+    "NEGATIVE_PLUS": "여백 강화",
+    "COMPOSITE_READY": "합성용",
+}
+
+REGION_OPTIONS = ["EU", "LATAM"]
+REGION_LABELS = {"EU": "EU(유럽)", "LATAM": "LATAM(라틴아메리카)"}
+
+CITY_OPTIONS = {
+    "EU": [
+        "Paris (파리)", "London (런던)", "Rome (로마)", "Barcelona (바르셀로나)",
+        "Amsterdam (암스테르담)", "Berlin (베를린)", "Prague (프라하)", "Vienna (비엔나)",
+        "Madrid (마드리드)", "Florence (피렌체)", "Venice (베네치아)", "Lisbon (리스본)",
+        "Athens (아테네)", "Munich (뮌헨)", "Budapest (부다페스트)", "Brussels (브뤼셀)",
+    ],
+    "LATAM": [
+        "Mexico City (멕시코시티)", "Sao Paulo (상파울루)", "Buenos Aires (부에노스아이레스)",
+        "Rio de Janeiro (리우데자네이루)", "Bogota (보고타)", "Lima (리마)",
+        "Santiago (산티아고)", "Medellin (메데인)", "Cusco (쿠스코)", "Havana (아바나)",
+    ],
+}
+
+ASPECT_RATIO_OPTIONS = ["9:16", "16:9", "4:5", "1:1"]
+ASPECT_RATIO_LABELS = {
+    "9:16": "9:16 (세로)",
+    "16:9": "16:9 (와이드)",
+    "4:5": "4:5 (룩북)",
+    "1:1": "1:1 (정사각)",
+}
+
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+}
+
+# 간결 출력: QA 체크리스트는 앱이 로컬에서 검사하므로 출력하지 않도록 지시
+COMPACT_OUTPUT_LINE = "Output_QA: LOCAL (omit the ✅ STEP 2 QA 체크리스트 section; it is checked locally)"
+
+
+def default_settings():
+    return {
+        "project_id": "LG_AD_2026_STEP2_01",
+        "region": "EU",
+        "city": CITY_OPTIONS["EU"][0],
+        "season": "WINTER",
+        "climate_type": "",
+        "age": 35,
+        "occupation": "Gallery Curator",
+        "fashion_color": "#C19A6B",
+        "fashion_color_name": "Camel",
+        "aspect_ratio": "4:5",
+        # Step 2 전용
+        "housing_type": "APARTMENT",
+        "interior_style": "PARIS_STYLE",
+        "room_types": ["Kitchen", "Living", "Bedroom", "Laundry"],
+        "entropy_level": 5,
+        "output_preset": "BASIC",
+        # True면 §10 QA 체크리스트를 생성하지 않고 로컬 QA(qa_lint)만 사용
+        "compact_output": False,
+        # True면 조회 표로 정해지는 Step 3 필드를 로컬에서 계산해 병합 (모델은 생략)
+        "derive_fields": True,
+    }
+
+
+def parse_step1_json(json_text):
+    """Step 1 JSON 파싱"""
+    if not json_text or not json_text.strip():
+        return None, "JSON이 비어있습니다."
+    
+    try:
+        for block in scan_blocks(json_text):
+            if block.lang == "json" and block.closed:
+                json_text = block.body(json_text)
+                break
+        data = json.loads(json_text.strip())
+        return data, None
+    except json.JSONDecodeError as e:
+        return None, f"JSON 파싱 오류: {e}"
+
+
+def extract_step1_values(step1_json):
+    """Step 1 JSON에서 값 추출"""
+    if not step1_json:
+        return {}
+    
+    extracted = {}
+    extracted["region"] = step1_json.get("region", "EU")
+    extracted["city"] = step1_json.get("city", "Paris")
+    extracted["season"] = step1_json.get("season", "WINTER")
+    extracted["climate_type"] = step1_json.get("climate_type", "")
+    extracted["fashion_color"] = step1_json.get("fashion_color", "#C19A6B")
+    extracted["fashion_color_name"] = step1_json.get("fashion_color_name", "Camel")
+    extracted["aspect_ratio"] = step1_json.get("aspect_ratio", "4:5")
+    extracted["project_id"] = step1_json.get("project_id", "")
+    extracted["biometric_ids"] = step1_json.get("biometric_ids", [])
+    
+    fixed = step1_json.get("fixed", {})
+    extracted["age"] = fixed.get("age", 35)
+    extracted["occupation"] = fixed.get("occupation", "Gallery Curator")
+    
+    return extracted
+
+
+def apply_step1_values(settings, step1_json):
+    """Step 1 추출값을 설정에 반영 (빈 값은 기존 설정 유지)"""
+    for key, value in extract_step1_values(step1_json).items():
+        if key in settings and value:
+            settings[key] = value
+    return settings
+
+
+def estimate_tokens(text):
+    """대략적인 토큰 수 추정 (ASCII 4자당 1토큰, 그 외 문자 2자당 1토큰)"""
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", errors="ignore"))
+    return max(1, ascii_chars // 4 + (len(text) - ascii_chars) // 2)
+
+
+def fingerprint_key(api_key):
+    if not api_key:
+        return ""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def build_chat_history(messages):
+    history = []
+    for msg in messages:
+        role = msg.get("role")
+        content = (msg.get("content") or "").strip()
+        if not content:
+            continue
+        if role == "user":
+            history.append({"role": "user", "parts": [content]})
+        elif role == "assistant":
+            history.append({"role": "model", "parts": [content]})
+    return history
+
+
+def get_chat_session(backend, model_name, history, system_instruction=None, generation_config=None):
+    """backends.ModelBackend로 채팅 세션 생성 (system_instruction 미지정 시 전체 시스템 프롬프트)"""
+    return backend.start_chat(
+        model_name,
+        history,
+        generation_config=dict(generation_config or GENERATION_CONFIG),
+        system_instruction=system_instruction or get_system_prompt(),
+    )
+
+
+def parse_response(text):
+    """응답 → (Step 3 JSON, JSON 블록을 뺀 본문) - 핸드오프 블록은 위치가 아닌 스키마 형태로 선택"""
+    parsed = ParsedResponse(text)
+    return parsed.json_data, parsed.clean_text
+
+
+def derived_handoff(settings, step1_data=None):
+    """derive_fields 설정이면 로컬 계산 Step 3 필드 (step3_rules), 아니면 None"""
+    if not settings.get("derive_fields"):
+        return None
+    return derive_handoff(settings, step1_data, schema_version=get_version())
+
+
+def make_assistant_message(content, derived=None):
+    """
+    응답을 한 번만 파싱/검증해 표시용 구조(json_data, schema_errors, text_content, title)와 함께 저장
+    derived: 로컬 계산 필드 - 응답 JSON에 병합한 뒤 검증 (content는 모델 응답 그대로)
+    """
+    json_data, text_content = parse_response(content)
+    json_data = merge_derived(json_data, derived)
+    schema_errors = validate_handoff(json_data) if json_data is not None else []
+    return build_assistant_message(content, json_data, text_content, schema_errors)
+
+
+def build_assistant_message(content, json_data, text_content, schema_errors):
+    """이미 파싱/검증한 결과로 표시용 메시지 구성 (변형처럼 수신 시점에 파싱해 둔 경우)"""
+    title = next((line.strip() for line in text_content.splitlines() if line.strip()), "")
+    return {
+        "role": "assistant",
+        "content": content,
+        "json_data": json_data,
+        "schema_errors": schema_errors,
+        "text_content": text_content,
+        "title": title[:80],
+    }
+
+
+def repair_handoff(backend, model_name, json_data, schema_errors):
+    """
+    누락/오류 필드만 모델에 다시 요청해 로컬에서 병합
+    전체 재생성 대신 짧은 보완 응답만 받으므로 출력 토큰이 훨씬 적음
+    반환: (병합된 JSON, 병합 후 검증 오류)
+    """
+    chat = backend.start_chat(
+        model_name,
+        [],
+        generation_config=dict(GENERATION_CONFIG),
+        system_instruction=REPAIR_SYSTEM_INSTRUCTION,
+    )
+    prompt = build_repair_prompt(json_data, schema_errors)
+    response = get_rate_limiter().call(
+        lambda: chat.send_message(prompt),
+        input_tokens=estimate_tokens(REPAIR_SYSTEM_INSTRUCTION) + estimate_tokens(prompt),
+    )
+    patch, _ = parse_response(response.text or "")
+    merged = merge_repair(json_data, patch)
+    return merged, validate_handoff(merged)
+
+
+def chunk_text(chunk):
+    """스트리밍 chunk의 텍스트 (텍스트 없는 chunk는 SDK가 ValueError를 던지므로 빈 문자열)"""
+    try:
+        return chunk.text or ""
+    except ValueError:
+        return ""
+
+
+class StreamingHandoffDetector:
+    """
+    스트리밍 응답을 누적하면서 ```json 블록이 닫히는 즉시 Step 3 JSON을 감지
+    - 이미 검사한 구간은 다시 스캔하지 않음
+    - text는 수신한 chunk를 그대로 이어 붙인 값 (비스트리밍 response.text와 동일)
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.json_data = None
+        self._span = None
+        self._scan_from = 0
+
+    def feed(self, chunk):
+        self.text += chunk
+        if self.json_data is None:
+            for block in scan_blocks(self.text, self._scan_from):
+                if not block.closed:
+                    break
+                self._scan_from = block.end
+                # 예시/조각 json 블록은 건너뛰고 핸드오프 형태의 블록만 먼저 표시
+                if block.lang != "json" or not handoff_score(self.text, block):
+                    continue
+                self.json_data = load_block(self.text, block)
+                if self.json_data is not None:
+                    self._span = (block.start, block.end)
+                    break
+        return self.json_data
+
+    def visible_text(self):
+        """표시용 텍스트 - 감지된 JSON 블록 제거, 아직 닫히지 않은 ```json 블록은 숨김"""
+        text = self.text
+        if self._span:
+            text = text[:self._span[0]] + text[self._span[1]:]
+        else:
+            open_at = text.lower().rfind("```json", self._scan_from)
+            if open_at != -1:
+                text = text[:open_at]
+        return text.strip()
+
+
+def build_combined_prompt(settings, step1_data, user_input):
+    """Step 2용 프롬프트 조합"""
+    lines = [
+        "[STEP2_SYSTEM_OVERRIDE_DATA]",
+        f"Project_ID: {settings['project_id']}",
+        "",
+        "[STEP1_INHERITED_DATA]",
+        f"Region: {settings['region']}",
+        f"City: {settings['city']}",
+        f"Season: {settings['season']}",
+        f"Model_Age: {settings['age']}",
+        f"Occupation: {settings['occupation']}",
+        f"Fashion_Color: {settings['fashion_color']}",
+        f"Fashion_Color_Name: {settings['fashion_color_name']}",
+        f"Aspect_Ratio: {settings['aspect_ratio']}",
+    ]
+    
+    if step1_data:
+        lines.append("")
+        lines.append("[STEP1_JSON_BLOCK]")
+        lines.append("```json")
+        lines.append(json.dumps(step1_data, indent=2, ensure_ascii=False))
+        lines.append("```")
+    
+    lines.extend([
+        "",
+        "[STEP2_SETTINGS]",
+        f"Housing_Type: {settings['housing_type']}",
+        f"Interior_Style: {settings['interior_style']}",
+        f"Room_Types: {', '.join(settings['room_types'])}",
+        f"Entropy_Level: {settings['entropy_level']}",
+        f"Output_Preset: {settings['output_preset']}",
+    ])
+    if settings.get("compact_output"):
+        lines.append(COMPACT_OUTPUT_LINE)
+    derived = derived_handoff(settings, step1_data)
+    if derived:
+        lines.append(derived_fields_line(derived))
+
+    lines.extend([
+        "",
+        "[USER_CREATIVE_DIRECTION]",
+        user_input,
+    ])
+    
+    return "\n".join(lines).strip()
@@ -0,0 +1,172 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Fake Responses
+오프라인 Fake 백엔드에 주입하는 표준 Step 2 응답 생성기 (backends.FakeBackend의 responder)
+
+- 조합 프롬프트의 설정값(City, Room_Types, Aspect_Ratio 등)을 반영한 Output Structure 응답
+- 앱 규칙 반영: 간결 출력(Output_QA: LOCAL)이면 QA 생략, Derived_Fields 줄의 필드 생략,
+  fan-out 하위 요청(Task 줄)이면 해당 섹션만 반환
+- 백엔드 자체는 앱 프롬프트 형식을 모르며, 앱 / 배치가 create_backend(responder=...)로 넘김
+"""
+
+import json
+import re
+
+from core import COMPACT_OUTPUT_LINE
+from fanout import QUADRANT_POSITIONS
+from step3_rules import omit_paths, parse_derived_fields_line
+
+PROMPT_FIELD_RE = re.compile(r"^(Project_ID|Region|City|Season|Model_Age|Occupation|Fashion_Color|"
+                             r"Fashion_Color_Name|Aspect_Ratio|Housing_Type|Interior_Style|Room_Types|"
+                             r"Entropy_Level|Output_Preset):\s*(.*)$", re.MULTILINE)
+
+# fanout.build_subrequests가 붙이는 Task 줄
+FANOUT_TASK_RE = re.compile(r"^Task: (EXTERIOR|HANDOFF|QUADRANT)(?: (\S+) - (.+))?$", re.MULTILINE)
+
+
+def render_canned_response(prompt):
+    """조합 프롬프트의 설정값을 반영한 표준 Output Structure 응답 생성"""
+    fields = dict(PROMPT_FIELD_RE.findall(prompt or ""))
+    city = fields.get("City", "Paris").split(" (")[0]
+    housing = fields.get("Housing_Type", "APARTMENT")
+    aspect = fields.get("Aspect_Ratio", "4:5")
+    rooms = [r.strip() for r in fields.get("Room_Types", "Kitchen, Living, Bedroom, Laundry").split(",") if r.strip()]
+    fashion_color = fields.get("Fashion_Color", "#C19A6B")
+
+    quadrants = []
+    for position, room in zip(QUADRANT_POSITIONS, rooms):
+        quadrants.append(
+            f"{position} quadrant - {room.upper()}: Curated {room.lower()} with lived-in materials. "
+            f"Shot with 24mm lens, waist level.\nNegative space in Grid Zone 5+6 for product placement."
+        )
+
+    camera_default = {
+        "eye_level_cm": 120,
+        "lens_mm_range": "24-35mm",
+        "camera_angle": "eye-level to slight down",
+        "vanishing_lines": "two-point",
+        "tilt_correction": "on",
+    }
+    handoff = {
+        "schema_version": "5.9.0",
+        "project_id": fields.get("Project_ID", "LG_AD_2026_STEP2_01"),
+        "step1_data": {
+            "region": fields.get("Region", "EU"),
+            "city": city,
+            "season": fields.get("Season", "WINTER"),
+            "model_age": int(fields.get("Model_Age", "35") or 35),
+            "occupation": fields.get("Occupation", "Gallery Curator"),
+            "fashion_color": fashion_color,
+            "fashion_color_name": fields.get("Fashion_Color_Name", "Camel"),
+            "biometric_ids": ["fake_biometric_id"],
+        },
+        "step2_data": {
+            "housing_type": housing,
+            "interior_style": fields.get("Interior_Style", "PARIS_STYLE"),
+            "room_types": rooms,
+            "light_kelvin": 2700,
+            "light_direction": "Northwest window",
+            "camera_meta": {
+                "default": dict(camera_default),
+                "overrides": {room.lower(): dict(camera_default) for room in rooms},
+            },
+            "dominant_palette": ["Warm oak", "Ivory plaster"],
+            "secondary_color": fashion_color,
+            "accent_colors": ["Brushed brass"],
+            "negative_space_zones": {room.lower(): "GRID_3x3_ZONE_5_6" for room in rooms},
+            "negative_space_description": {room.lower(): "Clear wall area for product placement" for room in rooms},
+            "space_library": {
+                f"{room.lower()}_main": {
+                    "space_type": f"{room.lower()}_main",
+                    "room_type": room.lower(),
+                    "tags": ["wall_space"],
+                    "camera_override_key": "default",
+                    "negative_space_zone": "GRID_3x3_ZONE_5_6",
+                    "negative_space_description": "Clear wall area for product placement",
+                    "prompt_snippet": f"Curated {room.lower()} with lived-in materials",
+                }
+                for room in rooms
+            },
+            "product_space_requirements": {
+                "TV/Display": {
+                    "requires_tags": ["wall_space"],
+                    "preferred_space_types": [f"{rooms[0].lower() if rooms else 'living'}_main"],
+                    "avoid_room_types": [],
+                    "fallback_space_types": [f"{rooms[0].lower() if rooms else 'living'}_main"],
+                },
+            },
+            "single_room_prompt": f"Photorealistic interior photography of a {rooms[0].lower() if rooms else 'living'} in {city}.",
+            "anchor_objects": ["Brass_floor_lamp", "Persian_rug_edge"],
+            "exterior_format": aspect,
+            "interior_format": "1:1",
+        },
+        "room_target": {"room_type": rooms[0].lower() if rooms else "living", "grid_zone": "GRID_3x3_ZONE_5_6"},
+    }
+    # Derived_Fields 줄에 있는 필드는 앱이 로컬에서 병합하므로 생략
+    handoff = omit_paths(handoff, parse_derived_fields_line(prompt))
+
+    exterior = [
+        "2.1 외관 프롬프트(배경) [마크다운]",
+        "```markdown",
+        f"Photorealistic architectural photography of {housing.lower()} exterior in {city}. "
+        f"Empty, no people. Optimistic warmth with inviting quality. Phase One IQ4, 8K. {aspect} format.",
+        "```",
+    ]
+    handoff_tail = [
+        "=== STEP 3용 복사 ===",
+        "```json",
+        json.dumps(handoff, indent=2, ensure_ascii=False),
+        "```",
+        "",
+        "[네거티브 프롬프트 - TARGET_MODEL]",
+        "--no white borders, dividing lines, frames between quadrants, people, text, watermark, logo",
+    ]
+    # 간결 출력(Output_QA: LOCAL)이면 QA 섹션 생략
+    if COMPACT_OUTPUT_LINE not in (prompt or ""):
+        handoff_tail += [
+            "",
+            "✅ STEP 2 QA 체크리스트",
+            "? JSON 블록 정상 출력",
+            "? 네거티브 프롬프트 완전 (경계선 금지 포함)",
+        ]
+
+    # fan-out 하위 요청이면 해당 섹션만 (fanout.build_subrequests의 Task 줄)
+    task = FANOUT_TASK_RE.search(prompt or "")
+    if task:
+        kind = task.group(1)
+        if kind == "EXTERIOR":
+            return "\n".join(exterior[1:])
+        if kind == "HANDOFF":
+            return "\n".join(handoff_tail)
+        position = task.group(2) or ""
+        label = (task.group(3) or "").strip()
+        room = label.lower()
+        fragment = {
+            "negative_space_zones": {room: "GRID_3x3_ZONE_5_6"},
+            "negative_space_description": {room: "Clear wall area for product placement"},
+        }
+        return "\n".join([
+            "```markdown",
+            f"{position} quadrant - {label}: Curated {room} with lived-in materials. "
+            f"Shot with 24mm lens, waist level.\nNegative space in Grid Zone 5+6 for product placement.",
+            "```",
+            "```json",
+            json.dumps(fragment, ensure_ascii=False),
+            "```",
+        ])
+
+    return "\n".join(exterior + [
+        "",
+        "---",
+        "",
+        "2.2 인테리어 4-쿼드런트 프롬프트(인테리어) [마크다운]",
+        "```markdown",
+        f"Photorealistic interior photography. Seamless quad composition showing four rooms of same "
+        f"{housing.lower()} in {city}, edge-to-edge without borders or dividing lines.",
+        "",
+        "\n\n".join(quadrants),
+        "",
+        "Cross-panel anchor: brass floor lamp visible in multiple quadrants.",
+        "Phase One IQ4, 8K. Square 1:1 format.",
+        "```",
+        "",
+    ] + handoff_tail)
@@ -0,0 +1,239 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Fan-out Generator
+외관 / 각 룸 쿼드런트 / 핸드오프(JSON+네거티브+QA)를 동시에 하위 요청으로 보내고
+로컬에서 표준 Output Structure와 병합된 Step 3 JSON으로 조립
+
+- 모든 하위 요청은 같은 시스템 프롬프트 + 같은 조합 프롬프트(상속 설정)를 공유
+- 크로스 패널 앵커(§5.9/§12.4)는 요청 전에 로컬에서 정해 모든 하위 요청에 동일하게 주입
+- 전체 지연 ≈ 가장 긴 하위 요청 하나 (순차 디코딩 합계가 아님)
+- 하위 요청도 각각 공유 요청 제한기(rate_limit)를 거치며 429/5xx는 개별 재시도
+"""
+
+import asyncio
+import json
+import time
+
+from client_pool import run_coroutine
+from core import estimate_tokens, get_chat_session
+from handoff_schema import merge_repair
+from history import history_tokens
+from rate_limit import get_rate_limiter
+from response_blocks import ParsedResponse
+
+FANOUT_TASK_TAG = "[FANOUT_TASK]"
+
+QUADRANT_POSITIONS = ["Upper-left", "Upper-right", "Lower-left", "Lower-right"]
+STUDIO_ANGLES = ["FULL SHOT", "KITCHENETTE FOCUS", "SLEEPING ZONE", "WORKSPACE"]
+
+# §12.4 OCCUPATION-SPECIFIC ANCHOR EXAMPLES (직업 키워드 → [주 앵커, 보조 앵커])
+OCCUPATION_ANCHORS = {
+    "curator": ["Aged brass floor lamp with gallery arm", "Art books stack"],
+    "architect": ["White plaster architectural scale model", "Drafting tools"],
+    "chef": ["Copper cookware collection", "Herb plants on windowsills"],
+}
+DEFAULT_ANCHORS = ["Aged brass floor lamp", "Persian rug edge"]
+
+STEP3_HEADER = "=== STEP 3용 복사 ==="
+
+
+def select_anchor_objects(settings):
+    """직업 기준 크로스 패널 앵커 2개 (§12.4 ANCHOR SELECTION RULE)"""
+    occupation = (settings.get("occupation") or "").lower()
+    for keyword, anchors in OCCUPATION_ANCHORS.items():
+        if keyword in occupation:
+            return list(anchors)
+    return list(DEFAULT_ANCHORS)
+
+
+def quadrant_units(settings):
+    """[(위치, 쿼드런트 라벨, room_type)] - STUDIO는 같은 공간의 4개 앵글(§6.3)"""
+    if settings.get("housing_type") == "STUDIO":
+        return [(position, angle, "studio") for position, angle in zip(QUADRANT_POSITIONS, STUDIO_ANGLES)]
+    rooms = settings.get("room_types") or []
+    return [(position, room.upper(), room.lower()) for position, room in zip(QUADRANT_POSITIONS, rooms)]
+
+
+def anchor_placement(anchors, index):
+    """쿼드런트별 앵커 배치 - 각 앵커가 2개 이상 패널에 전경/배경 번갈아 등장"""
+    primary = anchors[index % len(anchors)]
+    secondary = anchors[(index + 1) % len(anchors)]
+    return f"{primary} in foreground; {secondary} glimpsed in background through doorway or reflection"
+
+
+def _task_prompt(combined_prompt, task_lines):
+    return "\n".join([combined_prompt, "", FANOUT_TASK_TAG, *task_lines])
+
+
+def build_subrequests(settings, combined_prompt, anchors):
+    """[(task_id, prompt)] - 외관, 쿼드런트별, 핸드오프"""
+    anchor_line = f"Shared cross-panel anchor objects (use exactly): {json.dumps(anchors, ensure_ascii=False)}"
+    requests = [(
+        "exterior",
+        _task_prompt(combined_prompt, [
+            "Task: EXTERIOR",
+            "Return ONLY the 2.1 exterior prompt (§6.1 template) as one ```markdown block. No other sections.",
+        ]),
+    )]
+
+    for index, (position, label, room_type) in enumerate(quadrant_units(settings)):
+        requests.append((
+            f"quadrant:{index}",
+            _task_prompt(combined_prompt, [
+                f"Task: QUADRANT {position} - {label}",
+                anchor_line,
+                f"Anchor placement for this quadrant: {anchor_placement(anchors, index)}",
+                f"Return ONLY the '{position} quadrant - {label}:' paragraph of the 2.2 interior prompt "
+                "(§6.2/§6.3 line format) as one ```markdown block,",
+                "then one ```json block with this quadrant's Step 3 fields only:",
+                f'{{"negative_space_zones": {{"{room_type}": ...}}, '
+                f'"negative_space_description": {{"{room_type}": ...}}, '
+                f'"space_library": {{"<space_id>": {{"space_type", "room_type": "{room_type}", "tags", '
+                '"camera_override_key", "negative_space_zone", "negative_space_description", "prompt_snippet"}}}}',
+            ]),
+        ))
+
+    requests.append((
+        "handoff",
+        _task_prompt(combined_prompt, [
+            "Task: HANDOFF",
+            anchor_line,
+            f"Return ONLY the '{STEP3_HEADER}' line with its ```json block (§7, anchor_objects exactly as above),",
+            "then the [네거티브 프롬프트 - TARGET_MODEL] block"
+            + ("." if settings.get("compact_output") else " and the ✅ STEP 2 QA 체크리스트."),
+            "Do not write the 2.1 / 2.2 prompts.",
+        ]),
+    ))
+    return requests
+
+
+def extract_markdown(parsed):
+    """하위 응답(ParsedResponse)의 첫 ```markdown 블록 (없으면 JSON 블록을 뺀 본문)"""
+    body = parsed.first_body("markdown")
+    if body is not None:
+        return body
+    return parsed.clean_text.strip()
+
+
+def _interior_header(settings):
+    housing = (settings.get("housing_type") or "APARTMENT").lower()
+    city = settings.get("city", "").split(" (")[0]
+    if settings.get("housing_type") == "STUDIO":
+        return [
+            "Seamless quad composition showing same studio apartment "
+            "from four different angles, edge-to-edge without borders.",
+        ]
+    return [
+        "Photorealistic interior photography. Seamless quad composition "
+        f"showing four rooms of same {housing} in {city}, "
+        "edge-to-edge without borders or dividing lines.",
+        "",
+        f"All quadrants share: {settings.get('interior_style', '')} architecture, 60-30-10 color with "
+        f"{settings.get('fashion_color_name', '')} ({settings.get('fashion_color', '')}) as 30%.",
+        "Tilt-shift corrected verticals within each room.",
+        "Continuous photographic collage, no white frames.",
+    ]
+
+
+def _interior_footer(settings, anchors):
+    if settings.get("housing_type") == "STUDIO":
+        return [
+            "Same continuous space visible from different angles.",
+            f"Cross-panel anchor: {anchors[0]} visible in multiple quadrants.",
+            "Phase One IQ4, 8K. Square 1:1 format.",
+        ]
+    return [
+        "Empty uninhabited. Optimistic warmth, curated not chaotic.",
+        f"Cross-panel anchor: {' and '.join(anchors)} visible in multiple quadrants.",
+        "Atmospheric perspective with three-layer depth.",
+        "Phase One IQ4, 8K. Square 1:1 format.",
+    ]
+
+
+def merge_handoff(handoff_json, quadrant_jsons, settings, anchors):
+    """핸드오프 JSON + 쿼드런트별 필드 병합 (앵커/룸 타입은 공유 값으로 고정)"""
+    merged = handoff_json if isinstance(handoff_json, dict) else {}
+    for fragment in quadrant_jsons:
+        if isinstance(fragment, dict):
+            merged = merge_repair(merged, {"step2_data": fragment})
+    step2 = merged.setdefault("step2_data", {})
+    step2["anchor_objects"] = list(anchors)
+    if settings.get("housing_type") != "STUDIO":
+        step2["room_types"] = list(settings.get("room_types") or [])
+    return merged
+
+
+def assemble_output(settings, anchors, results):
+    """하위 응답 → 표준 Output Structure 전체 텍스트"""
+    quadrant_texts = []
+    quadrant_jsons = []
+    for index in range(len(quadrant_units(settings))):
+        parsed = ParsedResponse(results.get(f"quadrant:{index}", ""))
+        quadrant_texts.append(extract_markdown(parsed))
+        quadrant_jsons.append(parsed.json_data)
+
+    handoff = ParsedResponse(results.get("handoff", ""))
+    merged = merge_handoff(handoff.json_data, quadrant_jsons, settings, anchors)
+    handoff_rest = handoff.clean_text.replace(STEP3_HEADER, "").strip()
+
+    interior = _interior_header(settings) + [""] + ["\n\n".join(quadrant_texts), ""] \
+        + _interior_footer(settings, anchors)
+    return "\n".join([
+        "2.1 외관 프롬프트(배경) [마크다운]",
+        "```markdown",
+        extract_markdown(ParsedResponse(results.get("exterior", ""))),
+        "```",
+        "",
+        "---",
+        "",
+        "2.2 인테리어 4-쿼드런트 프롬프트(인테리어) [마크다운]",
+        "```markdown",
+        "\n".join(interior),
+        "```",
+        "",
+        STEP3_HEADER,
+        "```json",
+        json.dumps(merged, indent=2, ensure_ascii=False),
+        "```",
+        "",
+        handoff_rest,
+    ]).strip()
+
+
+async def _run_subrequest(backend, model_name, history, system_instruction, task_id, prompt, trace=None):
+    started = time.perf_counter()
+    chat = get_chat_session(backend, model_name, history, system_instruction)
+    response = await get_rate_limiter().call_async(
+        lambda: chat.send_message_async(prompt),
+        input_tokens=estimate_tokens(system_instruction) + history_tokens(history) + estimate_tokens(prompt),
+        trace=trace,
+    )
+    if trace is not None:
+        # 하위 요청은 스트리밍하지 않으므로 TTFT 대신 토큰 수만 합산
+        trace.add_usage(response)
+    return task_id, response.text or "", (time.perf_counter() - started) * 1000
+
+
+async def generate_fanout(backend, model_name, settings, combined_prompt, history=None,
+                          system_instruction=None, anchors=None, trace=None):
+    """
+    하위 요청 동시 실행 후 로컬 조립
+    반환: (full_response, {task_id: elapsed_ms})
+    trace(telemetry.RequestTrace)가 있으면 하위 요청 토큰 수를 합산 (비스트리밍이라 TTFT는 기록하지 않음)
+    재시도 후에도 하위 요청 하나라도 실패하면 예외를 그대로 전파 (부분 결과로 조립하지 않음)
+    """
+    anchors = list(anchors or select_anchor_objects(settings))
+    subrequests = build_subrequests(settings, combined_prompt, anchors)
+    outcomes = await asyncio.gather(*[
+        _run_subrequest(backend, model_name, list(history or []), system_instruction, task_id, prompt, trace)
+        for task_id, prompt in subrequests
+    ])
+    results = {task_id: text for task_id, text, _ in outcomes}
+    timings = {task_id: round(elapsed_ms, 1) for task_id, _, elapsed_ms in outcomes}
+    return assemble_output(settings, anchors, results), timings
+
+
+def run_fanout(backend, model_name, settings, combined_prompt, history=None, system_instruction=None, trace=None):
+    """동기 진입점 (Streamlit 등 이벤트 루프 밖에서 호출)"""
+    return run_coroutine(generate_fanout(
+        backend, model_name, settings, combined_prompt, history, system_instruction, trace=trace
+    ))
@@ -0,0 +1,223 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Step 3 Handoff Schema
+schemas/LG_Step2_Schema_v1_1.json 검증기를 한 번만 컴파일해 재사용하고,
+검증 실패 시 누락/오류 필드만 모델에 다시 요청하는 보완(repair) 프롬프트를 만든다.
+Step 1 입력도 같은 스키마의 step1_data 부분으로 모델 호출 전에 사전 검증한다.
+"""
+
+import copy
+import json
+import os
+import threading
+
+try:
+    from jsonschema import Draft202012Validator
+    SCHEMA_VALIDATION_AVAILABLE = True
+except ImportError:
+    Draft202012Validator = None
+    SCHEMA_VALIDATION_AVAILABLE = False
+
+SCHEMA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "schemas", "LG_Step2_Schema_v1_1.json"
+)
+
+REPAIR_SYSTEM_INSTRUCTION = (
+    "You repair a Step 3 handoff JSON for the LG Art Director STEP 2 system. "
+    "Return ONLY one ```json fenced object that contains exactly the requested fields, "
+    "nested at their original paths. Keep every value consistent with the existing JSON."
+)
+
+# step1_data 필드 → Step 1 JSON에서 찾을 경로 (앞쪽 우선)
+STEP1_FIELD_SOURCES = {
+    "region": ("region",),
+    "city": ("city",),
+    "season": ("season",),
+    "model_age": ("model_age", "fixed.age", "age"),
+    "occupation": ("occupation", "fixed.occupation"),
+    "fashion_color": ("fashion_color",),
+    "fashion_color_name": ("fashion_color_name",),
+    "biometric_ids": ("biometric_ids", "fixed.biometric_ids"),
+}
+
+_validator_lock = threading.Lock()
+_validator_memo = {"mtime": None, "schema": None, "validator": None}
+_step1_memo = {"mtime": None, "schema": None, "validator": None}
+
+
+def get_schema_validator():
+    """컴파일된 검증기 (스키마 파일 mtime이 같으면 재사용)"""
+    if not SCHEMA_VALIDATION_AVAILABLE:
+        return None
+    mtime = os.stat(SCHEMA_PATH).st_mtime_ns
+    with _validator_lock:
+        if _validator_memo["mtime"] != mtime:
+            with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+                schema = json.load(f)
+            Draft202012Validator.check_schema(schema)
+            _validator_memo.update(mtime=mtime, schema=schema, validator=Draft202012Validator(schema))
+        return _validator_memo["validator"]
+
+
+def get_schema():
+    get_schema_validator()
+    return _validator_memo["schema"]
+
+
+def format_path(parts):
+    path = ""
+    for part in parts:
+        path += f"[{part}]" if isinstance(part, int) else (f".{part}" if path else str(part))
+    return path or "(root)"
+
+
+def validate_handoff(data):
+    """
+    Step 3 JSON 검증 → 필드 단위 오류 목록 [{"path", "message", "validator"}]
+    required 오류는 누락된 필드 경로 자체를 path로 보고한다.
+    """
+    validator = get_schema_validator()
+    if validator is None or data is None:
+        return []
+    return _collect_errors(validator, data)
+
+
+def get_step1_schema():
+    """
+    (step1_data 부분 스키마, 검증기) - 스키마 파일 mtime이 같으면 재사용
+    jsonschema가 없으면 검증기는 None (validate_step1은 필수 필드만 검사)
+    """
+    mtime = os.stat(SCHEMA_PATH).st_mtime_ns
+    with _validator_lock:
+        if _step1_memo["mtime"] != mtime:
+            with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+                schema = json.load(f)["properties"]["step1_data"]
+            validator = Draft202012Validator(schema) if SCHEMA_VALIDATION_AVAILABLE else None
+            _step1_memo.update(mtime=mtime, schema=schema, validator=validator)
+        return _step1_memo["schema"], _step1_memo["validator"]
+
+
+def step1_view(step1_json):
+    """Step 1 JSON → step1_data 형태 (STEP1_FIELD_SOURCES 경로 중 처음 찾은 값, 없는 필드는 생략)"""
+    view = {}
+    for name, sources in STEP1_FIELD_SOURCES.items():
+        for source in sources:
+            node = step1_json
+            for key in source.split("."):
+                node = node.get(key) if isinstance(node, dict) else None
+            if node is not None:
+                view[name] = node
+                break
+    return view
+
+
+def validate_step1(step1_json):
+    """
+    Step 1 JSON 사전 검증 (모델 호출 전) → validate_handoff와 같은 형식의 오류 목록
+    기본값으로 채워질 필수 필드 누락 / 형식 오류를 §0.6 입력 게이트보다 먼저 잡는다.
+    """
+    if not isinstance(step1_json, dict):
+        return [{"path": "(root)", "parts": [], "message": "Step 1 JSON은 객체여야 합니다.", "validator": "type"}]
+    view = step1_view(step1_json)
+    schema, validator = get_step1_schema()
+    if validator is None:
+        return [
+            {"path": name, "parts": [name], "message": "필수 필드 누락", "validator": "required"}
+            for name in schema.get("required", []) if name not in view
+        ]
+    return _collect_errors(validator, view)
+
+
+def _collect_errors(validator, data):
+    errors = []
+    reported = set()
+    for error in validator.iter_errors(data):
+        parts = list(error.absolute_path)
+        if error.validator == "required" and isinstance(error.instance, dict):
+            # 누락 필드마다 오류가 하나씩 나오지만 validator_value는 required 전체이므로 경로로 중복 제거
+            for name in error.validator_value:
+                path = format_path(parts + [name])
+                if name not in error.instance and path not in reported:
+                    reported.add(path)
+                    errors.append({
+                        "path": path,
+                        "parts": parts + [name],
+                        "message": "필수 필드 누락",
+                        "validator": "required",
+                    })
+            continue
+        errors.append({
+            "path": format_path(parts),
+            "parts": parts,
+            "message": error.message,
+            "validator": error.validator,
+        })
+    errors.sort(key=lambda e: e["path"])
+    return errors
+
+
+def schema_fragment(parts):
+    """경로에 해당하는 스키마 조각 (보완 프롬프트에 포함)"""
+    node = get_schema() or {}
+    for part in parts:
+        if isinstance(part, int):
+            node = node.get("items", {})
+        elif part in node.get("properties", {}):
+            node = node["properties"][part]
+        elif isinstance(node.get("additionalProperties"), dict):
+            node = node["additionalProperties"]
+        else:
+            return {}
+    return node
+
+
+def repair_targets(errors):
+    """보완 요청 대상 경로 - 배열 내부 오류는 배열 필드 전체로 묶음"""
+    targets = []
+    for error in errors:
+        parts = []
+        for part in error["parts"]:
+            if isinstance(part, int):
+                break
+            parts.append(part)
+        if parts and parts not in targets:
+            targets.append(parts)
+    return targets
+
+
+def build_repair_prompt(data, errors):
+    """누락/오류 필드만 다시 요청하는 프롬프트"""
+    lines = [
+        "[STEP3_HANDOFF_REPAIR]",
+        "The Step 3 handoff JSON below failed schema validation.",
+        "Return ONLY the fields listed under [FIELDS_TO_RETURN], nested at their original paths,",
+        "as a single ```json object. Do not repeat fields that are already valid.",
+        "",
+        "[CURRENT_JSON]",
+        "```json",
+        json.dumps(data, ensure_ascii=False, separators=(",", ":")),
+        "```",
+        "",
+        "[VALIDATION_ERRORS]",
+    ]
+    lines.extend(f"- {e['path']}: {e['message']}" for e in errors)
+    lines.extend(["", "[FIELDS_TO_RETURN]"])
+    for parts in repair_targets(errors):
+        fragment = json.dumps(schema_fragment(parts), ensure_ascii=False, separators=(",", ":"))
+        lines.append(f"- {format_path(parts)}: {fragment}")
+    return "\n".join(lines)
+
+
+def merge_repair(data, patch):
+    """보완 응답을 기존 JSON에 재귀 병합 (dict는 병합, 그 외 값은 교체)"""
+    merged = copy.deepcopy(data)
+
+    def merge(target, source):
+        for key, value in source.items():
+            if isinstance(value, dict) and isinstance(target.get(key), dict):
+                merge(target[key], value)
+            else:
+                target[key] = copy.deepcopy(value)
+
+    if isinstance(patch, dict):
+        merge(merged, patch)
+    return merged
@@ -0,0 +1,266 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Step 3 Handoff Store
+스키마 검증을 통과한 Step 3 핸드오프를 내용 주소(content-addressed) 방식으로 저장하는 SQLite 저장소
+
+- 키 = sha256(정규화 JSON: 키 정렬 + 공백 없는 구분자) → 같은 핸드오프를 다시 생성해도 한 행 (seen 증가)
+- 보조 인덱스: project_id / step1_data.city / step2_data.interior_style / room_target.room_type
+  (조회는 인덱스 컬럼만 읽고, 본문 JSON은 get / 내보내기 때만 읽음)
+- 본문은 정규화 JSON 그대로 저장 → NDJSON 내보내기는 재직렬화 없이 행 단위로 스트리밍
+
+사용 예:
+    python handoff_store.py stats
+    python handoff_store.py find --project-id LG_AD_2026_STEP2_01 --room-type kitchen
+    python handoff_store.py export -o handoffs.ndjson --city Paris
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "handoffs.sqlite3")
+# 조회 필터 이름 → 컬럼 (핸드오프 JSON 경로는 index_fields 참고)
+INDEX_COLUMNS = ("project_id", "city", "interior_style", "room_type")
+EXPORT_BATCH = 500
+
+
+def canonical_json(data):
+    """정규화 JSON 문자열 (키 정렬, 공백 없음, 비 ASCII 그대로)"""
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def handoff_hash(data):
+    return hashlib.sha256(canonical_json(data).encode("utf-8")).hexdigest()
+
+
+def _text(value):
+    return str(value) if value not in (None, "") else None
+
+
+def index_fields(data):
+    """핸드오프 → 보조 인덱스 값 (room_type은 대소문자 구분 없이 조회하도록 소문자)"""
+    step1 = data.get("step1_data") if isinstance(data.get("step1_data"), dict) else {}
+    step2 = data.get("step2_data") if isinstance(data.get("step2_data"), dict) else {}
+    room_target = data.get("room_target") if isinstance(data.get("room_target"), dict) else {}
+    room_type = _text(room_target.get("room_type"))
+    return {
+        "project_id": _text(data.get("project_id")),
+        "city": _text(step1.get("city")),
+        "interior_style": _text(step2.get("interior_style")),
+        "room_type": room_type.lower() if room_type else None,
+    }
+
+
+def _where(filters):
+    """필터 dict → (WHERE 절, 파라미터) - 값이 없는 필터는 무시"""
+    clauses = []
+    params = []
+    for column in INDEX_COLUMNS:
+        value = filters.get(column)
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value.lower() if column == "room_type" else value)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class HandoffStore:
+    """SQLite 기반 핸드오프 저장소 (프로세스 내 스레드 간 공유)"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS handoffs ("
+            " hash TEXT NOT NULL UNIQUE,"
+            " project_id TEXT,"
+            " city TEXT,"
+            " interior_style TEXT,"
+            " room_type TEXT,"
+            " created_at REAL NOT NULL,"
+            " seen INTEGER NOT NULL DEFAULT 1,"
+            " data TEXT NOT NULL)"
+        )
+        for column in INDEX_COLUMNS:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_handoffs_{column} ON handoffs({column})")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls):
+        """LG_HANDOFF_STORE_PATH (빈 값이면 None - 저장 안 함)"""
+        path = os.getenv("LG_HANDOFF_STORE_PATH", DEFAULT_STORE_PATH)
+        return cls(path=path) if path else None
+
+    def _insert(self, data, now):
+        text = canonical_json(data)
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        fields = index_fields(data)
+        self._conn.execute(
+            "INSERT INTO handoffs (hash, project_id, city, interior_style, room_type, created_at, data)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(hash) DO UPDATE SET seen = seen + 1",
+            (key, fields["project_id"], fields["city"], fields["interior_style"], fields["room_type"], now, text),
+        )
+        return key
+
+    def put(self, json_data, schema_errors=None):
+        """검증을 통과한 핸드오프 저장 → hash (JSON이 아니거나 스키마 오류가 있으면 저장하지 않고 None)"""
+        if not isinstance(json_data, dict) or schema_errors:
+            return None
+        with self._lock:
+            key = self._insert(json_data, time.time())
+            self._conn.commit()
+        return key
+
+    def put_many(self, handoffs):
+        """여러 핸드오프를 한 트랜잭션으로 저장 → 저장된 hash 목록 (dict가 아닌 항목은 건너뜀)"""
+        now = time.time()
+        keys = []
+        with self._lock:
+            for data in handoffs:
+                if isinstance(data, dict):
+                    keys.append(self._insert(data, now))
+            self._conn.commit()
+        return keys
+
+    def get(self, key):
+        """hash → 핸드오프 dict (없으면 None)"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM handoffs WHERE hash = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, limit=None, **filters):
+        """
+        필터(project_id / city / interior_style / room_type)에 맞는 항목 메타 (최근 저장 순)
+        [{"hash", "project_id", "city", "interior_style", "room_type", "created_at", "seen"}]
+        """
+        where, params = _where(filters)
+        query = f"SELECT hash, project_id, city, interior_style, room_type, created_at, seen FROM handoffs{where}" \
+                " ORDER BY rowid DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {
+                "hash": row[0], "project_id": row[1], "city": row[2], "interior_style": row[3],
+                "room_type": row[4], "created_at": row[5], "seen": row[6],
+            }
+            for row in rows
+        ]
+
+    def count(self, **filters):
+        where, params = _where(filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM handoffs{where}", params).fetchone()[0]
+
+    def iter_json(self, batch=EXPORT_BATCH, **filters):
+        """
+        필터에 맞는 정규화 JSON 문자열을 저장 순으로 스트리밍
+        rowid 기준으로 batch개씩 끊어 읽어 잠금을 짧게 유지 (내보내는 중에도 저장 가능)
+        """
+        where, params = _where(filters)
+        where = f"{where} AND rowid > ?" if where else " WHERE rowid > ?"
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT rowid, data FROM handoffs{where} ORDER BY rowid LIMIT ?",
+                    params + [last_rowid, batch],
+                ).fetchall()
+            if not rows:
+                return
+            for _, data in rows:
+                yield data
+            last_rowid = rows[-1][0]
+
+    def export_ndjson(self, out, **filters):
+        """NDJSON으로 내보내기 → 기록한 줄 수"""
+        written = 0
+        for data in self.iter_json(**filters):
+            out.write(data + "\n")
+            written += 1
+        return written
+
+    def facets(self, column):
+        """인덱스 컬럼별 [(값, 개수)] (개수 내림차순)"""
+        if column not in INDEX_COLUMNS:
+            raise ValueError(f"unknown column: {column}")
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT {column}, COUNT(*) FROM handoffs GROUP BY {column} ORDER BY COUNT(*) DESC"
+            ).fetchall()
+
+    def stats(self):
+        with self._lock:
+            entries, seen = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(seen), 0) FROM handoffs"
+            ).fetchone()
+        return {"entries": entries, "duplicates": seen - entries}
+
+
+_store = None
+_store_lock = threading.Lock()
+_store_loaded = False
+
+
+def get_handoff_store():
+    """프로세스 전체에서 공유하는 핸드오프 저장소 (LG_HANDOFF_STORE_PATH가 빈 값이면 None)"""
+    global _store, _store_loaded
+    if not _store_loaded:
+        with _store_lock:
+            if not _store_loaded:
+                _store = HandoffStore.from_env()
+                _store_loaded = True
+    return _store
+
+
+def _filters(args):
+    return {column: getattr(args, column) for column in INDEX_COLUMNS}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LG Art Director STEP 2 핸드오프 저장소")
+    parser.add_argument("command", choices=["stats", "find", "export"])
+    parser.add_argument("--path", default=os.getenv("LG_HANDOFF_STORE_PATH", DEFAULT_STORE_PATH))
+    parser.add_argument("-o", "--output", default="-", help="export 결과 NDJSON 경로 (기본: stdout)")
+    parser.add_argument("--limit", type=int, default=50, help="find 최대 항목 수")
+    parser.add_argument("--project-id", dest="project_id")
+    parser.add_argument("--city")
+    parser.add_argument("--interior-style", dest="interior_style")
+    parser.add_argument("--room-type", dest="room_type")
+    args = parser.parse_args(argv)
+
+    store = HandoffStore(args.path)
+    if args.command == "stats":
+        stats = store.stats()
+        print(f"핸드오프 {stats['entries']}건 (중복 생성 {stats['duplicates']}건)")
+        for column in INDEX_COLUMNS:
+            top = ", ".join(f"{value or '-'} {count}" for value, count in store.facets(column)[:5])
+            print(f"  {column}: {top}")
+    elif args.command == "find":
+        for row in store.find(limit=args.limit, **_filters(args)):
+            print(f"{row['hash'][:16]}  {row['project_id'] or '-'}  {row['city'] or '-'}  "
+                  f"{row['interior_style'] or '-'}  {row['room_type'] or '-'}  ×{row['seen']}")
+    else:
+        out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+        try:
+            written = store.export_ndjson(out, **_filters(args))
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"내보내기: {written}건", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
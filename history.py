@@ -0,0 +1,189 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - History Manager
+토큰 예산 안에서 model_messages를 채팅 히스토리로 변환
+
+- 최근 keep_recent_turns 턴의 응답은 원문 유지
+- 동일한 [STEP1_JSON_BLOCK]은 처음 한 번만 남기고 이후에는 생략 표시로 대체
+- 그 이전 응답은 섹션 제목 + (가장 최근 요약 턴만) Step 3 JSON으로 압축
+- 그래도 예산을 넘으면 가장 오래된 턴부터 제외
+"""
+
+import json
+import re
+
+from core import estimate_tokens
+from response_blocks import ParsedResponse, outside_text, scan_blocks
+
+DEFAULT_HISTORY_TOKEN_BUDGET = 24000
+DEFAULT_KEEP_RECENT_TURNS = 2
+
+STEP1_BLOCK_START = "[STEP1_JSON_BLOCK]\n```json\n"
+STEP1_BLOCK_END = "\n```"
+STEP1_BLOCK_OMITTED = "[STEP1_JSON_BLOCK]\n(이전 턴과 동일 - 생략)"
+
+SECTION_HEADING_RE = re.compile(
+    r"^(#{1,6} .+|\d+\.\d+ .+|=== .+ ===|\[[^\]\n]+\]|✅ .+)$",
+    re.MULTILINE,
+)
+
+
+def pair_turns(messages):
+    """model_messages → [(user_content, assistant_content)] (빈 내용은 건너뜀)"""
+    turns = []
+    pending_user = None
+    for msg in messages:
+        content = (msg.get("content") or "").strip()
+        if not content:
+            continue
+        if msg.get("role") == "user":
+            if pending_user is not None:
+                turns.append((pending_user, ""))
+            pending_user = content
+        elif msg.get("role") == "assistant":
+            turns.append((pending_user or "", content))
+            pending_user = None
+    if pending_user is not None:
+        turns.append((pending_user, ""))
+    return turns
+
+
+def section_headings(text, blocks=None):
+    """응답에서 섹션 제목 줄만 추출 (코드 블록 내부 제외, blocks: 이미 스캔한 블록 목록)"""
+    outside = outside_text(text, scan_blocks(text) if blocks is None else blocks)
+    return list(dict.fromkeys(m.group(0).strip() for m in SECTION_HEADING_RE.finditer(outside)))
+
+
+def summarize_assistant(text, include_json=True):
+    """이전 응답 압축본 - 섹션 제목 + Step 3 JSON(한 줄)"""
+    lines = ["[COMPACTED_PREVIOUS_OUTPUT]"]
+    parsed = ParsedResponse(text)
+    headings = section_headings(text, parsed.blocks)
+    if headings:
+        lines.append("Sections: " + " / ".join(headings))
+    if include_json:
+        json_data = parsed.json_data
+        if json_data is not None:
+            lines.append("Step3_JSON:")
+            lines.append("```json")
+            lines.append(json.dumps(json_data, ensure_ascii=False, separators=(",", ":")))
+            lines.append("```")
+    return "\n".join(lines)
+
+
+def split_step1_blocks(text):
+    """텍스트 → [(조각, [STEP1_JSON_BLOCK] 여부)]
+    블록이 수십 KB일 수 있어 정규식 대신 문자열 탐색으로 처리"""
+    pieces = []
+    position = 0
+    while True:
+        start = text.find(STEP1_BLOCK_START, position)
+        if start < 0:
+            break
+        end = text.find(STEP1_BLOCK_END, start + len(STEP1_BLOCK_START))
+        if end < 0:
+            break
+        end += len(STEP1_BLOCK_END)
+        pieces.append((text[position:start], False))
+        pieces.append((text[start:end], True))
+        position = end
+    pieces.append((text[position:], False))
+    return pieces
+
+
+def _omitted_flags(pieces, seen_blocks):
+    """블록 조각마다 이미 보낸 블록인지 (seen_blocks 갱신)"""
+    flags = []
+    for piece, is_block in pieces:
+        if is_block:
+            flags.append(piece in seen_blocks)
+            seen_blocks.add(piece)
+    return tuple(flags)
+
+
+def _join_pieces(pieces, flags):
+    flags = iter(flags)
+    return "".join(STEP1_BLOCK_OMITTED if is_block and next(flags) else piece for piece, is_block in pieces)
+
+
+def dedupe_step1_blocks(text, seen_blocks):
+    """이미 보낸 [STEP1_JSON_BLOCK]은 생략 표시로 대체 (seen_blocks 갱신)"""
+    pieces = split_step1_blocks(text)
+    flags = _omitted_flags(pieces, seen_blocks)
+    return _join_pieces(pieces, flags) if any(flags) else text
+
+
+def _render(turns, keep_recent_turns, memo=None):
+    """
+    memo: 한 번의 build_compact_history 안에서 공유하는 메모 - 예산 탐색의 반복 렌더링에서
+    같은 입력을 다시 나누거나 같은 응답을 다시 압축하지 않고, 같은 문자열 객체를 돌려줘 토큰 수도 재사용
+    """
+    memo = {} if memo is None else memo
+    history = []
+    seen_step1_blocks = set()
+    n_recent_from = len(turns) - keep_recent_turns
+    last_summarized = n_recent_from - 1
+
+    for index, (user_content, assistant_content) in enumerate(turns):
+        if user_content:
+            pieces = memo.get(("step1", user_content))
+            if pieces is None:
+                # 같은 내용의 블록은 한 객체로 맞춰 이후 seen 비교가 동일성 검사로 끝나게 함
+                pieces = memo[("step1", user_content)] = [
+                    (memo.setdefault(("block", piece), piece) if is_block else piece, is_block)
+                    for piece, is_block in split_step1_blocks(user_content)
+                ]
+            flags = _omitted_flags(pieces, seen_step1_blocks)
+            content = user_content
+            if any(flags):
+                key = ("user", user_content, flags)
+                content = memo.get(key)
+                if content is None:
+                    content = memo[key] = _join_pieces(pieces, flags)
+            history.append({"role": "user", "parts": [content]})
+
+        if assistant_content:
+            if index >= n_recent_from:
+                content = assistant_content
+            else:
+                key = ("summary", assistant_content, index == last_summarized)
+                content = memo.get(key)
+                if content is None:
+                    content = memo[key] = summarize_assistant(assistant_content, include_json=key[2])
+            history.append({"role": "model", "parts": [content]})
+    return history
+
+
+def history_tokens(history, memo=None):
+    """히스토리 토큰 수 (memo: 같은 문자열의 추정값 재사용)"""
+    if memo is None:
+        return sum(estimate_tokens(part) for turn in history for part in turn["parts"])
+    total = 0
+    for turn in history:
+        for part in turn["parts"]:
+            tokens = memo.get(("tokens", part))
+            if tokens is None:
+                tokens = memo[("tokens", part)] = estimate_tokens(part)
+            total += tokens
+    return total
+
+
+def build_compact_history(messages, token_budget=DEFAULT_HISTORY_TOKEN_BUDGET,
+                          keep_recent_turns=DEFAULT_KEEP_RECENT_TURNS):
+    """토큰 예산을 지키는 채팅 히스토리 (core.build_chat_history와 같은 형식)"""
+    turns = pair_turns(messages)
+    keep_recent_turns = max(0, int(keep_recent_turns))
+    memo = {}
+    history = _render(turns, keep_recent_turns, memo)
+    if len(turns) <= keep_recent_turns or history_tokens(history, memo) <= token_budget:
+        return history
+
+    # 예산 안에 드는 가장 이른 시작 턴을 이분 탐색 (오래된 턴을 뺄수록 토큰 수는 줄어듦)
+    # 최근 keep_recent_turns 턴만 남아도 예산을 넘으면 그대로 반환
+    low, high = 1, len(turns) - keep_recent_turns
+    while low < high:
+        middle = (low + high) // 2
+        if history_tokens(_render(turns[middle:], keep_recent_turns, memo), memo) <= token_budget:
+            high = middle
+        else:
+            low = middle + 1
+    return _render(turns[low:], keep_recent_turns, memo)
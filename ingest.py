@@ -0,0 +1,217 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Step 1 Ingestion
+대량의 Step 1 출력을 모델 호출 전에 스트리밍으로 읽어 사전 검증 / 중복 제거하고
+깨끗한 작업 큐(NDJSON)와 거절 리포트(NDJSON)를 만든다.
+
+- 입력: 디렉터리(*.json / *.ndjson / *.jsonl, 하위 폴더 포함), NDJSON 파일, JSON 파일(단일 객체 / 배열 / 연속 객체)
+  - 파일 전체를 메모리에 올리지 않음: NDJSON은 줄 단위, JSON 파일은 청크 단위 증분 디코딩
+- 검증: schemas/LG_Step2_Schema_v1_1.json의 step1_data 부분 (handoff_schema.validate_step1)
+  - extract_step1_values가 기본값(Paris / 35 / Gallery Curator 등)으로 조용히 채우기 전에 거절
+- 중복 제거: 정규화 JSON 내용 hash, project_id (먼저 나온 항목만 큐에 넣음)
+- 큐의 각 줄은 정규화된 Step 1 JSON → python batch.py queue.ndjson 으로 그대로 처리
+
+사용 예:
+    python ingest.py step1_outputs/ -o queue.ndjson --rejects rejects.ndjson
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from handoff_schema import validate_step1
+from handoff_store import canonical_json
+
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+JSON_SUFFIXES = (".json",) + NDJSON_SUFFIXES
+CHUNK_SIZE = 1 << 16
+WHITESPACE = " \t\r\n"
+
+# 거절 사유
+INVALID_JSON = "invalid_json"
+INVALID_STEP1 = "invalid_step1"
+DUPLICATE_CONTENT = "duplicate_content"
+DUPLICATE_PROJECT = "duplicate_project_id"
+
+
+def iter_json_values(f, chunk_size=CHUNK_SIZE):
+    """
+    텍스트 스트림의 JSON 값을 차례로 생성 (단일 값 / 최상위 배열의 원소 / 공백·쉼표로 이어진 연속 값)
+    청크 단위로 읽어 raw_decode하며, 디코딩이 끝난 앞부분은 버퍼에서 버림
+    값이 버퍼 끝에서 잘리면 버퍼 크기만큼 더 읽어 다시 디코딩 (큰 값도 재시도 횟수는 로그 수준)
+    깨진 JSON을 만나면 json.JSONDecodeError를 전파 (같은 파일의 나머지는 복구하지 않음)
+    """
+    decoder = json.JSONDecoder()
+    state = {"buffer": "", "position": 0, "eof": False}
+
+    def read_more():
+        buffer = state["buffer"][state["position"]:]
+        chunk = f.read(max(chunk_size, len(buffer)))
+        state.update(buffer=buffer + chunk, position=0, eof=not chunk)
+
+    in_array = None
+    while True:
+        buffer, position = state["buffer"], state["position"]
+        # 구분자(공백 / 쉼표 / 배열 괄호) 건너뛰기
+        while position < len(buffer) and (buffer[position] in WHITESPACE or buffer[position] == ","):
+            position += 1
+        state["position"] = position
+        if position >= len(buffer):
+            if state["eof"]:
+                return
+            read_more()
+            continue
+        if in_array is None:
+            in_array = buffer[position] == "["
+            if in_array:
+                state["position"] = position + 1
+                continue
+        if in_array and buffer[position] == "]":
+            state["position"] = position + 1
+            continue
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if state["eof"]:
+                raise
+            read_more()
+            continue
+        # 청크 끝에서 잘렸을 수 있는 숫자 / 리터럴은 더 읽고 다시 디코딩
+        if end == len(buffer) and not state["eof"] and not isinstance(value, (dict, list, str)):
+            read_more()
+            continue
+        state["position"] = end
+        yield value
+
+
+def iter_step1_documents(path):
+    """
+    입력 경로 → (source, 파싱된 값, 오류 메시지) 순차 생성
+    source: 파일 경로 (NDJSON은 경로:줄 번호, JSON 배열은 경로#순번)
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(JSON_SUFFIXES):
+                    yield from iter_step1_documents(os.path.join(root, name))
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(NDJSON_SUFFIXES):
+            for lineno, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield f"{path}:{lineno}", json.loads(line), None
+                except json.JSONDecodeError as e:
+                    yield f"{path}:{lineno}", None, f"JSON 파싱 오류: {e}"
+            return
+
+        index = 0
+        try:
+            for value in iter_json_values(f):
+                yield f"{path}#{index}", value, None
+                index += 1
+        except json.JSONDecodeError as e:
+            yield f"{path}#{index}", None, f"JSON 파싱 오류: {e}"
+
+
+class Step1Ingestor:
+    """검증 + 중복 제거 상태 (내용 hash / project_id 집합만 유지)"""
+
+    def __init__(self, dedupe_project_id=True):
+        self.dedupe_project_id = dedupe_project_id
+        self._hashes = {}
+        self._projects = {}
+        self.counts = {
+            "accepted": 0,
+            INVALID_JSON: 0,
+            INVALID_STEP1: 0,
+            DUPLICATE_CONTENT: 0,
+            DUPLICATE_PROJECT: 0,
+        }
+
+    def check(self, source, value, error=None):
+        """
+        문서 하나 판정 → (큐에 넣을 정규화 JSON 줄 또는 None, 거절 레코드 또는 None)
+        거절 레코드: {"source", "project_id", "reason", "errors", "duplicate_of"}
+        """
+        if error is not None:
+            return None, self._reject(source, None, INVALID_JSON, [error])
+
+        errors = validate_step1(value)
+        project_id = str(value.get("project_id") or "") if isinstance(value, dict) else ""
+        if errors:
+            return None, self._reject(
+                source, project_id, INVALID_STEP1, [f"{e['path']}: {e['message']}" for e in errors]
+            )
+
+        line = canonical_json(value)
+        digest = hashlib.sha256(line.encode("utf-8")).hexdigest()
+        if digest in self._hashes:
+            return None, self._reject(source, project_id, DUPLICATE_CONTENT, [], self._hashes[digest])
+        self._hashes[digest] = source
+        if self.dedupe_project_id and project_id:
+            if project_id in self._projects:
+                return None, self._reject(source, project_id, DUPLICATE_PROJECT, [], self._projects[project_id])
+            self._projects[project_id] = source
+
+        self.counts["accepted"] += 1
+        return line, None
+
+    def _reject(self, source, project_id, reason, errors, duplicate_of=None):
+        self.counts[reason] += 1
+        return {
+            "source": source,
+            "project_id": project_id or "",
+            "reason": reason,
+            "errors": errors,
+            "duplicate_of": duplicate_of,
+        }
+
+
+def ingest(path, queue_out, rejects_out=None, dedupe_project_id=True):
+    """입력 경로를 스트리밍 처리해 큐 / 거절 리포트를 한 줄씩 기록 → 사유별 건수"""
+    ingestor = Step1Ingestor(dedupe_project_id=dedupe_project_id)
+    for source, value, error in iter_step1_documents(path):
+        line, rejection = ingestor.check(source, value, error)
+        if line is not None:
+            queue_out.write(line + "\n")
+        elif rejects_out is not None:
+            rejects_out.write(json.dumps(rejection, ensure_ascii=False) + "\n")
+    return ingestor.counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LG Art Director STEP 2 Step 1 일괄 수집 / 사전 검증")
+    parser.add_argument("input", help="Step 1 JSON 디렉터리, NDJSON(.ndjson/.jsonl) 또는 JSON 파일(객체 / 배열)")
+    parser.add_argument("-o", "--output", default="-", help="작업 큐 NDJSON 경로 (기본: stdout)")
+    parser.add_argument("--rejects", help="거절 리포트 NDJSON 경로 (기본: 기록 안 함, 건수만 출력)")
+    parser.add_argument("--allow-duplicate-project-id", action="store_true",
+                        help="내용이 다르면 같은 project_id도 큐에 넣음 (기본: 먼저 나온 항목만)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    rejects = open(args.rejects, "w", encoding="utf-8") if args.rejects else None
+    try:
+        counts = ingest(args.input, out, rejects, dedupe_project_id=not args.allow_duplicate_project_id)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if rejects is not None:
+            rejects.close()
+
+    rejected = sum(count for reason, count in counts.items() if reason != "accepted")
+    print(
+        f"큐 {counts['accepted']}건 / 거절 {rejected}건 ("
+        + ", ".join(f"{reason}={count}" for reason, count in counts.items() if reason != "accepted")
+        + ")",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Model Catalogue
+백엔드 + API 키 fingerprint별 모델 목록을 프로세스 전체에서 공유하는 캐시
+
+- 메모리 + 디스크(JSON) 캐시, TTL 경과 시 오래된 목록을 즉시 반환하고 백그라운드에서 갱신
+- 목록이 전혀 없을 때만 동기 조회하며, 같은 키의 동시 조회는 한 번만 수행 (single-flight)
+- 조회 실패 시 fallback 목록을 반환하고 ERROR_RETRY_S 동안 재조회하지 않음
+- 디스크에는 API 키 원문이 아닌 fingerprint만 저장
+- 디스크 저장 실패(쓰기 불가 경로, 디스크 부족 등)는 로그만 남기고 메모리 목록은 그대로 사용
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from core import fingerprint_key
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "model_catalog.json")
+DEFAULT_TTL_S = 6 * 3600
+ERROR_RETRY_S = 60
+
+logger = logging.getLogger(__name__)
+
+
+def backend_fingerprint(backend, api_key):
+    """백엔드 이름 + API 키 해시 (카탈로그/세션 캐시 키)"""
+    return f"{backend.name}:{fingerprint_key(api_key)}"
+
+
+class ModelCatalog:
+    """fingerprint → {"options", "fetched_at"} (스레드 안전)"""
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH, ttl_s=DEFAULT_TTL_S):
+        self.path = path
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self._inflight = {}
+        self._failed_at = {}
+        self.fetches = 0
+        self.save_errors = 0
+
+    @classmethod
+    def from_env(cls):
+        """LG_MODEL_CATALOG_PATH(빈 값이면 디스크 저장 안 함) / LG_MODEL_CATALOG_TTL_S"""
+        return cls(
+            path=os.getenv("LG_MODEL_CATALOG_PATH", DEFAULT_CATALOG_PATH) or None,
+            ttl_s=float(os.getenv("LG_MODEL_CATALOG_TTL_S", DEFAULT_TTL_S)),
+        )
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        return {
+            key: entry for key, entry in data.items()
+            if isinstance(entry, dict) and entry.get("options")
+        }
+
+    def _save(self):
+        """디스크 저장 - 실패하면 로그만 남김 (메모리 목록은 유효)"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.save_errors += 1
+            logger.warning("모델 카탈로그 저장 실패 (%s): %s", self.path, e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl_s
+
+    def _fetch(self, backend, key):
+        """목록 조회 후 저장 - 실패하면 None (실패 시각 기록)"""
+        try:
+            options = backend.list_models()
+        except Exception:
+            options = None
+        try:
+            with self._lock:
+                self.fetches += 1
+                if options:
+                    self._entries[key] = {"options": list(options), "fetched_at": time.time()}
+                    self._failed_at.pop(key, None)
+                    self._save()
+                else:
+                    self._failed_at[key] = time.time()
+        finally:
+            # 기록 중 예외가 나도 대기 중인 조회를 깨우고 다음 갱신을 막지 않음
+            with self._lock:
+                event = self._inflight.pop(key, None)
+            if event is not None:
+                event.set()
+        return options
+
+    def _start_fetch(self, key):
+        """이미 조회 중이면 (event, False), 새로 맡으면 (event, True) - 락 안에서 호출"""
+        event = self._inflight.get(key)
+        if event is not None:
+            return event, False
+        event = threading.Event()
+        self._inflight[key] = event
+        return event, True
+
+    def get(self, backend, api_key, fallback=()):
+        """
+        모델 목록
+        - 신선한 캐시: 즉시 반환
+        - 만료된 캐시: 즉시 반환 + 백그라운드 갱신
+        - 캐시 없음: 동기 조회 (실패 시 fallback)
+        """
+        if backend.requires_api_key and not api_key:
+            return list(fallback)
+
+        key = backend_fingerprint(backend, api_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            recently_failed = time.time() - self._failed_at.get(key, 0) < ERROR_RETRY_S
+            if entry is not None:
+                if not self._is_fresh(entry) and not recently_failed:
+                    _, owner = self._start_fetch(key)
+                    if owner:
+                        threading.Thread(target=self._fetch, args=(backend, key), daemon=True).start()
+                return list(entry["options"])
+            if recently_failed:
+                return list(fallback)
+            event, owner = self._start_fetch(key)
+
+        if owner:
+            options = self._fetch(backend, key)
+        else:
+            event.wait()
+            with self._lock:
+                entry = self._entries.get(key)
+            options = entry["options"] if entry else None
+        return list(options) if options else list(fallback)
+
+    def refresh(self, backend, api_key):
+        """강제 동기 갱신 - 갱신된 목록 (실패하면 None)"""
+        key = backend_fingerprint(backend, api_key)
+        with self._lock:
+            event, owner = self._start_fetch(key)
+        if owner:
+            return self._fetch(backend, key)
+        event.wait()
+        with self._lock:
+            entry = self._entries.get(key)
+        return list(entry["options"]) if entry else None
+
+    def info(self, backend, api_key):
+        """표시용 상태 {"fetched_at", "age_s", "stale", "refreshing"} (캐시 없으면 None)"""
+        key = backend_fingerprint(backend, api_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            age_s = time.time() - entry["fetched_at"]
+            return {
+                "fetched_at": entry["fetched_at"],
+                "age_s": age_s,
+                "stale": age_s >= self.ttl_s,
+                "refreshing": key in self._inflight,
+            }
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_model_catalog() -> ModelCatalog:
+    """프로세스 전체에서 공유하는 모델 카탈로그"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = ModelCatalog.from_env()
+    return _catalog
@@ -1,10 +1,19 @@
 """
 LG Art Director System STEP 2 v5.9.0 - Prompt Loader
 md 파일들을 읽어서 LG_SYSTEM_PROMPT로 조합
+
+PromptRegistry가 컴파일 결과를 프로세스 전체에서 캐시하고,
+파일의 mtime/size가 바뀐 모듈만 다시 읽어 재조합한다 (재시작 없이 md 교체 반영).
+prompts/compiled/에 원본 hash가 일치하는 컴파일본(prompt_compiler.py)이 있으면 그것을 읽고,
+원본이 컴파일 이후 바뀌었으면 원본으로 폴백한다 (LG_PROMPT_COMPILED=0이면 항상 원본).
 """
 
+import hashlib
+import json
 import os
 import re
+import threading
+import time
 
 # 프롬프트 파일 로드 순서 (INDEX_STEP2.md 기준)
 PROMPT_FILES = [
@@ -16,51 +25,211 @@ PROMPT_FILES = [
 # 현재 파일 기준 prompts 폴더 경로
 PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
 
+# 빌드 시점 최소화 결과 (python prompt_compiler.py)
+COMPILED_DIR = os.path.join(PROMPTS_DIR, "compiled")
+COMPILED_MANIFEST = "manifest.json"
+
 # HTML 코멘트 제거 패턴
 HTML_COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)
 
+# 버전 표기 패턴 (예: "# LG Art Director System - STEP 2 v5.9.0 [FINAL]")
+VERSION_PATTERN = re.compile(r"STEP 2 v(\d+(?:\.\d+)+)")
+
+# 파일 변경 확인 최소 간격 (초) - 호출마다 stat 하지 않도록
+CHECK_INTERVAL_S = 1.0
+
+FALLBACK_VERSION = "0.0.0"
+PROMPT_NOT_FOUND = "LG Art Director System STEP 2 - Prompt files not found"
+
+
+def clean_prompt_text(content: str) -> str:
+    """HTML 코멘트 제거 + 앞뒤 공백 정리"""
+    content = HTML_COMMENT_PATTERN.sub("", content)
+    return content.strip()
+
 
 def load_prompt_file(filename: str) -> str:
     """단일 프롬프트 파일 로드 및 정리"""
     filepath = os.path.join(PROMPTS_DIR, filename)
-    
+
     if not os.path.exists(filepath):
         return ""
-    
+
     with open(filepath, "r", encoding="utf-8") as f:
         content = f.read()
-    
-    # HTML 코멘트 제거
-    content = HTML_COMMENT_PATTERN.sub("", content)
-    
-    # 앞뒤 공백 정리
-    content = content.strip()
-    
-    return content
+
+    return clean_prompt_text(content)
+
+
+class PromptRegistry:
+    """
+    프롬프트 모듈 컴파일 결과 캐시
+    - 모듈별 (mtime_ns, size) 서명으로 변경 감지, 바뀐 모듈만 다시 읽음
+    - prompt_hash: 조합된 시스템 프롬프트의 sha256 (하위 캐시/세션 키로 사용)
+    """
+
+    def __init__(self, prompts_dir=PROMPTS_DIR, files=None, check_interval_s=CHECK_INTERVAL_S, compiled_dir=None):
+        self.prompts_dir = prompts_dir
+        if compiled_dir is None and os.getenv("LG_PROMPT_COMPILED", "1") != "0":
+            compiled_dir = os.path.join(prompts_dir, "compiled")
+        self.compiled_dir = compiled_dir
+        self._manifest = (None, {})
+        self.compiled_modules = set()
+        self.files = list(files or PROMPT_FILES)
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._modules = {}
+        self._last_check = 0.0
+        self.system_prompt = ""
+        self.prompt_hash = ""
+        self.version = FALLBACK_VERSION
+        self.revision = 0
+        self.refresh(force=True)
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _signature(self, filename):
+        source = self._stat(os.path.join(self.prompts_dir, filename))
+        if source is None or not self.compiled_dir:
+            return source
+        # 컴파일본 / manifest가 바뀌어도 다시 읽음
+        return (
+            source,
+            self._stat(os.path.join(self.compiled_dir, filename)),
+            self._stat(os.path.join(self.compiled_dir, COMPILED_MANIFEST)),
+        )
+
+    def _compiled_entry(self, filename):
+        """manifest의 모듈 항목 (manifest 파일이 바뀐 경우에만 다시 파싱)"""
+        path = os.path.join(self.compiled_dir, COMPILED_MANIFEST)
+        signature = self._stat(path)
+        if signature != self._manifest[0]:
+            modules = {}
+            if signature is not None:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        modules = json.load(f).get("modules", {})
+                except (OSError, ValueError, AttributeError):
+                    modules = {}
+            self._manifest = (signature, modules)
+        return self._manifest[1].get(filename)
+
+    def _read_module(self, filename):
+        filepath = os.path.join(self.prompts_dir, filename)
+        with open(filepath, "r", encoding="utf-8") as f:
+            raw = f.read()
+
+        self.compiled_modules.discard(filename)
+        entry = self._compiled_entry(filename) if self.compiled_dir else None
+        if entry and entry.get("source_sha256") == hashlib.sha256(raw.encode("utf-8")).hexdigest():
+            try:
+                with open(os.path.join(self.compiled_dir, filename), "r", encoding="utf-8") as f:
+                    compiled = f.read().strip()
+            except OSError:
+                compiled = ""
+            if compiled:
+                self.compiled_modules.add(filename)
+                return compiled
+        return clean_prompt_text(raw)
+
+    def refresh(self, force=False):
+        """변경된 모듈이 있으면 다시 컴파일 - 변경 여부 반환"""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_check < self.check_interval_s:
+                return False
+            self._last_check = now
+
+            changed = False
+            for filename in self.files:
+                signature = self._signature(filename)
+                cached = self._modules.get(filename)
+                if cached is not None and cached[0] == signature:
+                    continue
+                content = self._read_module(filename) if signature is not None else ""
+                if signature is None:
+                    self.compiled_modules.discard(filename)
+                self._modules[filename] = (signature, content)
+                changed = True
+
+            if changed or force:
+                self._compile()
+            return changed
+
+    def _compile(self):
+        parts = [self._modules[f][1] for f in self.files if self._modules[f][1]]
+        if parts:
+            # 구분자로 연결
+            self.system_prompt = "\n\n---\n\n".join(parts)
+        else:
+            self.system_prompt = PROMPT_NOT_FOUND
+        self.prompt_hash = hashlib.sha256(self.system_prompt.encode("utf-8")).hexdigest()
+        match = VERSION_PATTERN.search(self.system_prompt)
+        self.version = match.group(1) if match else FALLBACK_VERSION
+        self.revision += 1
+
+    def modules(self):
+        """[(파일명, 정리된 내용)] - PROMPT_FILES 순서, 내용 없는 모듈 제외"""
+        self.refresh()
+        with self._lock:
+            return [(f, self._modules[f][1]) for f in self.files if self._modules[f][1]]
+
+    def module_hashes(self):
+        """모듈별 내용 해시 (변경 추적/디버깅용)"""
+        with self._lock:
+            return {
+                filename: hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+                for filename, (_, content) in self._modules.items()
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> PromptRegistry:
+    """프로세스 전체에서 공유하는 레지스트리"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PromptRegistry()
+    return _registry
+
+
+def get_system_prompt() -> str:
+    """현재 시스템 프롬프트 (변경된 md 파일 자동 반영)"""
+    registry = get_registry()
+    registry.refresh()
+    return registry.system_prompt
+
+
+def get_prompt_hash() -> str:
+    """현재 시스템 프롬프트 내용 해시"""
+    registry = get_registry()
+    registry.refresh()
+    return registry.prompt_hash
 
 
 def load_system_prompt() -> str:
     """모든 프롬프트 파일을 순서대로 로드하여 조합"""
-    parts = []
-    
-    for filename in PROMPT_FILES:
-        content = load_prompt_file(filename)
-        if content:
-            parts.append(content)
-    
-    if not parts:
-        return "LG Art Director System STEP 2 v5.9.0 - Prompt files not found"
-    
-    # 구분자로 연결
-    return "\n\n---\n\n".join(parts)
+    return get_system_prompt()
 
 
 def get_version() -> str:
-    """시스템 버전 반환"""
-    return "5.9.0"
+    """시스템 버전 반환 (프롬프트 헤더의 'STEP 2 vX.Y.Z' 표기 기준)"""
+    registry = get_registry()
+    registry.refresh()
+    return registry.version
 
 
-# 메인 export - app.py에서 import할 변수
+# 메인 export - import 시점 스냅샷 (최신 값은 get_system_prompt / get_version 사용)
 LG_SYSTEM_PROMPT = load_system_prompt()
 SYSTEM_VERSION = get_version()
 
@@ -69,6 +238,9 @@ if __name__ == "__main__":
     # 테스트용
     print(f"=== LG Art Director System STEP 2 v{SYSTEM_VERSION} ===")
     print(f"Loaded prompt length: {len(LG_SYSTEM_PROMPT)} chars")
+    print(f"Prompt hash: {get_prompt_hash()[:12]}")
     print(f"Prompt files: {PROMPT_FILES}")
+    print(f"Module hashes: {get_registry().module_hashes()}")
+    print(f"Compiled modules: {sorted(get_registry().compiled_modules)}")
     print("\n--- First 500 chars ---")
     print(LG_SYSTEM_PROMPT[:500])
@@ -0,0 +1,317 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Prompt Compiler
+PROMPT_FILES를 빌드 시점에 한 번 최소화해 prompts/compiled/에 기록하고,
+prompt.PromptRegistry는 원본과 hash가 맞는 컴파일본이 있으면 그것을 읽는다.
+
+- 장식 제거: ━━━ / ═══ / ─── 구분선, 섹션 배너 괘선 축약(# ----------), 줄 끝 공백 / 연속 빈 줄
+- 박스 표(┌─┬─┐ … └─┴─┘) → "셀 | 셀" 행 (여러 줄로 감긴 셀은 한 셀로 합침), 트리 가지(├── / └──) → "- "
+- 버전 히스토리 배너 블록 제거 (prompt_sections도 항상 제외하는 섹션)
+- 같은 섹션(또는 항상 유지되는 core 모듈) 안에서 반복되는 표는 첫 표 참조로 대체
+  (prompt_sections가 섹션 단위로 빼도 참조 대상이 함께 빠지지 않도록 범위를 제한)
+- 검증: §규칙 / 필드명 / enum 값 / 섹션 구조가 컴파일본에 모두 남았는지 확인하고, 하나라도 빠지면 기록하지 않음
+
+사용 예:
+    python prompt_compiler.py            # 컴파일 + 파일별 bytes / 토큰 절감 리포트
+    python prompt_compiler.py --check    # 컴파일본이 최신 원본과 일치하는지만 확인 (CI용, 불일치 시 종료 코드 1)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+from core import estimate_tokens
+from handoff_schema import SCHEMA_PATH
+from prompt import (
+    COMPILED_DIR,
+    COMPILED_MANIFEST,
+    PROMPT_FILES,
+    PROMPTS_DIR,
+    clean_prompt_text,
+)
+from prompt_sections import (
+    BANNER_RULE_RE,
+    CORE_MODULE,
+    HISTORY_BANNER,
+    split_chunks,
+)
+
+COMPILER_VERSION = 1
+
+# 줄 전체가 장식 괘선 (마크다운 구분선 "---"은 유지)
+DECORATION_LINE_RE = re.compile(r"^\s*(?:[━═─]{3,}|-{10,})\s*$")
+BANNER_RULE = "# ----------"
+TREE_BRANCH_RE = re.compile(r"^(\s*)[├└]── ")
+TABLE_TOP_RE = re.compile(r"^(\s*)┌[─┬]+┐\s*$")
+TABLE_SEPARATOR_RE = re.compile(r"^\s*├[─┼]+┤\s*$")
+TABLE_BOTTOM_RE = re.compile(r"^\s*└[─┴]+┘\s*$")
+BLANK_RUN_RE = re.compile(r"\n{3,}")
+
+# 보존 검증 대상
+SECTION_REF_RE = re.compile(r"§\d+(?:\.\d+)*")
+SNAKE_FIELD_RE = re.compile(r"\b[a-z][a-z0-9]*(?:_[a-z0-9]+)+\b")
+UPPER_ENUM_RE = re.compile(r"\b[A-Z][A-Z0-9]*(?:_[A-Z0-9]+)+\b")
+WORD_RE = re.compile(r"\w+")
+
+
+def source_hash(raw):
+    """원본 md 내용 hash (prompt.PromptRegistry가 컴파일본 최신 여부 판단에 사용)"""
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def compact_table(lines):
+    """
+    박스 표 줄 목록(┌ … └) → "셀 | 셀" 행 목록 (표 모양이 아니면 None)
+    셀은 │ 기준으로 나눔 (한글은 폭이 2라 ┬ 위치로 자르면 어긋남)
+    행 구분선이 본문에도 있으면 구분선 사이를 한 행으로 합치고,
+    헤더 구분선만 있으면 첫 열이 빈 줄만 윗 행에 이어 붙인다.
+    """
+    columns = lines[0].count("┬") + 1
+    groups = [[]]
+    for line in lines[1:-1]:
+        if TABLE_SEPARATOR_RE.match(line):
+            groups.append([])
+            continue
+        body = line.strip()
+        if not (body.startswith("│") and body.endswith("│")):
+            return None
+        cells = [cell.strip() for cell in body[1:-1].split("│")]
+        if len(cells) != columns:
+            return None
+        groups[-1].append(cells)
+    groups = [group for group in groups if group]
+
+    rows = []
+    for index, group in enumerate(groups):
+        if len(groups) > 2 or index == 0:
+            merged = [group]
+        else:
+            merged = []
+            for cells in group:
+                if merged and not cells[0]:
+                    merged[-1].append(cells)
+                else:
+                    merged.append([cells])
+        for row_lines in merged:
+            cells = [" ".join(filter(None, column)) for column in zip(*row_lines)]
+            if len(cells) == 1:
+                # 단일 열 박스는 틀만 벗기고 줄 구성 유지
+                rows.extend(cell for (cell,) in row_lines if cell)
+            else:
+                rows.append(" | ".join(cells))
+    return rows
+
+
+def minify_chunk(text, seen_tables, scope):
+    """
+    섹션 하나 최소화
+    seen_tables: 표 내용 → (scope, 첫 행) - 같은 scope이거나 core 모듈에서 본 표만 참조로 대체
+    """
+    lines = text.split("\n")
+    out = []
+    i = 0
+    while i < len(lines):
+        line = lines[i].rstrip()
+        top = TABLE_TOP_RE.match(line)
+        if top:
+            end = i + 1
+            while end < len(lines) and lines[end].lstrip()[:1] in ("│", "├"):
+                end += 1
+            rows = None
+            if end < len(lines) and TABLE_BOTTOM_RE.match(lines[end]):
+                rows = compact_table([lines[j].rstrip() for j in range(i, end + 1)])
+            if rows is not None:
+                indent = top.group(1)
+                key = "\n".join(rows)
+                first = seen_tables.get(key)
+                if first and first[0] in (scope, CORE_MODULE):
+                    out.append(f"{indent}(표 동일: {first[1]})")
+                else:
+                    seen_tables.setdefault(key, (scope, rows[0] if rows else ""))
+                    out.extend(indent + row for row in rows)
+                i = end + 1
+                continue
+        if BANNER_RULE_RE.match(line):
+            out.append(BANNER_RULE)
+        elif DECORATION_LINE_RE.match(line):
+            pass
+        else:
+            out.append(TREE_BRANCH_RE.sub(r"\1- ", line))
+        i += 1
+    return "\n".join(out)
+
+
+def minify_module(filename, content, seen_tables=None):
+    """정리된 모듈 내용 → 최소화 내용 (섹션 구조는 prompt_sections.split_chunks 기준으로 유지)"""
+    if seen_tables is None:
+        seen_tables = {}
+    parts = []
+    for chunk_id, text in split_chunks(content):
+        if chunk_id == "banner:" + HISTORY_BANNER:
+            continue
+        scope = CORE_MODULE if filename == CORE_MODULE else f"{filename}:{chunk_id}"
+        parts.append(minify_chunk(text, seen_tables, scope))
+    text = BLANK_RUN_RE.sub("\n\n", "\n".join(parts)).strip()
+    # 히스토리 배너 앞에 남은 구분선 정리
+    while text.endswith("\n---"):
+        text = text[:-4].rstrip()
+    return text
+
+
+def _schema_terms():
+    """스키마 속성 이름 + 문자열 enum 값"""
+    try:
+        with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    terms = set()
+    stack = [schema]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            properties = node.get("properties")
+            if isinstance(properties, dict):
+                terms.update(properties)
+            for value in node.get("enum", []) if isinstance(node.get("enum"), list) else []:
+                if isinstance(value, str) and value:
+                    terms.add(value)
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return terms
+
+
+def protected_terms(text, schema_terms=()):
+    """보존해야 할 용어: §규칙 참조, snake_case 필드명, UPPER_SNAKE enum 값, 본문에 나오는 스키마 필드 / enum"""
+    terms = set(SECTION_REF_RE.findall(text))
+    terms.update(SNAKE_FIELD_RE.findall(text))
+    terms.update(UPPER_ENUM_RE.findall(text))
+    terms.update(term for term in schema_terms if term in text)
+    return terms
+
+
+def verify_module(filename, content, compiled, schema_terms=()):
+    """
+    원본(히스토리 제외) 대비 컴파일본 검증 → 문제 목록 (빈 목록이면 통과)
+    - 보존 용어 누락
+    - 단어 누락 (표 셀 병합 / 장식 제거가 본문을 자르지 않았는지)
+    - 섹션(§ 제목 / 배너) 순서 변경
+    """
+    kept = "\n".join(
+        text for chunk_id, text in split_chunks(content) if chunk_id != "banner:" + HISTORY_BANNER
+    )
+    problems = []
+    compiled_terms = protected_terms(compiled, schema_terms)
+    missing = sorted(term for term in protected_terms(kept, schema_terms) if term not in compiled_terms)
+    if missing:
+        problems.append(f"{filename}: 누락된 용어 {len(missing)}개 - {', '.join(missing[:20])}")
+    lost_words = sorted(set(WORD_RE.findall(kept)) - set(WORD_RE.findall(compiled)))
+    if lost_words:
+        problems.append(f"{filename}: 누락된 단어 {len(lost_words)}개 - {', '.join(lost_words[:20])}")
+    source_ids = [chunk_id for chunk_id, _ in split_chunks(kept)]
+    compiled_ids = [chunk_id for chunk_id, _ in split_chunks(compiled)]
+    if source_ids != compiled_ids:
+        problems.append(f"{filename}: 섹션 구조 불일치 ({len(source_ids)} → {len(compiled_ids)})")
+    return problems
+
+
+def compile_prompts(prompts_dir=PROMPTS_DIR, files=None):
+    """
+    원본 모듈 전체 컴파일 → (결과 목록, 문제 목록)
+    결과: [{"filename", "source_sha256", "compiled", "source_bytes", "compiled_bytes", "source_tokens", "compiled_tokens"}]
+    """
+    schema_terms = _schema_terms()
+    seen_tables = {}
+    results = []
+    problems = []
+    for filename in files or PROMPT_FILES:
+        path = os.path.join(prompts_dir, filename)
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            raw = f.read()
+        content = clean_prompt_text(raw)
+        compiled = minify_module(filename, content, seen_tables)
+        problems.extend(verify_module(filename, content, compiled, schema_terms))
+        results.append({
+            "filename": filename,
+            "source_sha256": source_hash(raw),
+            "compiled": compiled,
+            "source_bytes": len(content.encode("utf-8")),
+            "compiled_bytes": len(compiled.encode("utf-8")),
+            "source_tokens": estimate_tokens(content),
+            "compiled_tokens": estimate_tokens(compiled),
+        })
+    return results, problems
+
+
+def write_compiled(results, compiled_dir=COMPILED_DIR):
+    """컴파일본 + manifest 기록 (manifest를 마지막에 써서 도중 실패 시 이전 manifest 기준 유지)"""
+    os.makedirs(compiled_dir, exist_ok=True)
+    modules = {}
+    for result in results:
+        with open(os.path.join(compiled_dir, result["filename"]), "w", encoding="utf-8") as f:
+            f.write(result["compiled"] + "\n")
+        modules[result["filename"]] = {key: value for key, value in result.items() if key not in ("filename", "compiled")}
+    manifest = {"compiler_version": COMPILER_VERSION, "modules": modules}
+    tmp_path = os.path.join(compiled_dir, COMPILED_MANIFEST + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, os.path.join(compiled_dir, COMPILED_MANIFEST))
+
+
+def check_compiled(results, compiled_dir=COMPILED_DIR):
+    """기록된 컴파일본이 지금 컴파일 결과와 같은지 → 문제 목록"""
+    problems = []
+    for result in results:
+        path = os.path.join(compiled_dir, result["filename"])
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                current = f.read().strip()
+        except OSError:
+            problems.append(f"{result['filename']}: 컴파일본 없음")
+            continue
+        if current != result["compiled"]:
+            problems.append(f"{result['filename']}: 컴파일본이 원본과 다름 (python prompt_compiler.py 다시 실행)")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LG Art Director STEP 2 프롬프트 컴파일러")
+    parser.add_argument("--check", action="store_true", help="기록하지 않고 컴파일본 최신 여부만 확인")
+    parser.add_argument("--output-dir", default=COMPILED_DIR)
+    args = parser.parse_args(argv)
+
+    results, problems = compile_prompts()
+    print(f"{'FILE':<32} {'BYTES':>14} {'SAVED':>7} {'TOKENS':>12} {'SAVED':>7}")
+    for result in results:
+        saved_bytes = result["source_bytes"] - result["compiled_bytes"]
+        saved_tokens = result["source_tokens"] - result["compiled_tokens"]
+        print(
+            f"{result['filename']:<32} {result['source_bytes']:>6}→{result['compiled_bytes']:<7} "
+            f"{saved_bytes / max(result['source_bytes'], 1):>6.1%} "
+            f"{result['source_tokens']:>5}→{result['compiled_tokens']:<6} "
+            f"{saved_tokens / max(result['source_tokens'], 1):>6.1%}"
+        )
+    source_tokens = sum(result["source_tokens"] for result in results)
+    compiled_tokens = sum(result["compiled_tokens"] for result in results)
+    print(f"\n합계: {source_tokens} → {compiled_tokens} tokens (-{source_tokens - compiled_tokens})")
+
+    if args.check:
+        problems.extend(check_compiled(results, args.output_dir))
+    for problem in problems:
+        print(f"⚠️ {problem}", file=sys.stderr)
+    if problems:
+        return 1
+    if not args.check:
+        write_compiled(results, args.output_dir)
+        print(f"기록: {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Selective Prompt Assembler
+프롬프트 모듈을 §x.y / 섹션 배너 단위로 한 번만 인덱싱하고,
+현재 설정(housing_type, region, entropy_level, output_preset)에 필요한 섹션만 조합
+
+- 00_step2_core_rules.md는 항상 전체 유지
+- §4.1/§4.2: region이 EU/LATAM인 쪽만
+- §6.2 / §6.3: STUDIO면 §6.3만, 그 외에는 §6.2만 (§6.3 "§6.2 무시" 규칙)
+- 섹션 11(4-쿼드런트 완성 예시): STUDIO면 제외
+- §12.3: entropy_level에 해당하는 [LEVEL a-b] 블록만 (매핑/매트릭스 표는 유지)
+- 섹션 10(QA 체크리스트): compact_output이면 제외 (qa_lint가 로컬에서 검사)
+- 버전 히스토리 섹션은 항상 제외
+
+사용 예:
+    python prompt_sections.py          # 설정 조합별 토큰 절감 리포트
+"""
+
+import re
+import threading
+
+from core import estimate_tokens
+from prompt import get_registry
+
+CORE_MODULE = "00_step2_core_rules.md"
+MODULE_SEPARATOR = "\n\n---\n\n"
+
+SECTION_HEADING_RE = re.compile(r"^## (§\d+(?:\.\d+)*)")
+BANNER_RULE_RE = re.compile(r"^# [═\-]{10,}\s*$")
+BANNER_TITLE_RE = re.compile(r"^# (.+?)\s*$")
+ENTROPY_LEVEL_RE = re.compile(r"^\[LEVEL (\d+)-(\d+):")
+
+REGION_SECTIONS = {"EU": "§4.1", "LATAM": "§4.2"}
+STUDIO_SECTION = "§6.3"
+QUAD_SECTION = "§6.2"
+ENTROPY_SECTION = "§12.3"
+HISTORY_BANNER = "버전 히스토리"
+QUAD_EXAMPLE_BANNER = "섹션 11: 완성 프롬프트 예시 고정"
+QA_BANNER = "섹션 10: QA 체크리스트 업데이트"
+
+
+def split_chunks(content):
+    """
+    모듈 → [(chunk_id, text)]
+    chunk_id: "§x.y" / "banner:<제목>" / "preamble"
+    """
+    lines = content.split("\n")
+    chunks = []
+    current_id = "preamble"
+    current = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        heading = SECTION_HEADING_RE.match(line)
+        is_banner = (
+            BANNER_RULE_RE.match(line)
+            and i + 2 < len(lines)
+            and BANNER_TITLE_RE.match(lines[i + 1])
+            and BANNER_RULE_RE.match(lines[i + 2])
+        )
+        if heading or is_banner:
+            if current:
+                chunks.append((current_id, "\n".join(current)))
+            if heading:
+                current_id = heading.group(1)
+                current = [line]
+            else:
+                current_id = "banner:" + BANNER_TITLE_RE.match(lines[i + 1]).group(1)
+                current = lines[i:i + 3]
+                i += 3
+                continue
+        else:
+            current.append(line)
+        i += 1
+    if current:
+        chunks.append((current_id, "\n".join(current)))
+    return chunks
+
+
+def filter_entropy_levels(text, entropy_level):
+    """§12.3 본문에서 entropy_level에 해당하지 않는 [LEVEL a-b] 블록 제거"""
+    out = []
+    skipping = False
+    for line in text.split("\n"):
+        level = ENTROPY_LEVEL_RE.match(line)
+        if level:
+            low, high = int(level.group(1)), int(level.group(2))
+            skipping = not (low <= entropy_level <= high)
+        elif skipping and line.startswith("["):
+            skipping = False
+        if not skipping:
+            out.append(line)
+    return "\n".join(out)
+
+
+class PromptIndex:
+    """프롬프트 해시별로 한 번만 만드는 섹션 인덱스"""
+
+    def __init__(self, modules, prompt_hash):
+        self.prompt_hash = prompt_hash
+        self.modules = [(filename, split_chunks(content)) for filename, content in modules]
+        self.full_text = MODULE_SEPARATOR.join(content for _, content in modules)
+        self.full_tokens = estimate_tokens(self.full_text)
+
+    def section_ids(self):
+        return [chunk_id for _, chunks in self.modules for chunk_id, _ in chunks]
+
+    def assemble(self, settings):
+        """설정에 맞는 섹션만 조합 → (system_prompt, 제외된 chunk_id 목록)"""
+        housing_type = settings.get("housing_type", "APARTMENT")
+        region = settings.get("region", "EU")
+        entropy_level = int(settings.get("entropy_level", 5))
+
+        excluded = set()
+        for other_region, section_id in REGION_SECTIONS.items():
+            if other_region != region and region in REGION_SECTIONS:
+                excluded.add(section_id)
+        if housing_type == "STUDIO":
+            excluded.update([QUAD_SECTION, "banner:" + QUAD_EXAMPLE_BANNER])
+        else:
+            excluded.add(STUDIO_SECTION)
+        excluded.add("banner:" + HISTORY_BANNER)
+        if settings.get("compact_output"):
+            excluded.add("banner:" + QA_BANNER)
+
+        parts = []
+        dropped = []
+        for filename, chunks in self.modules:
+            if filename == CORE_MODULE:
+                parts.append("\n".join(text for _, text in chunks))
+                continue
+            kept = []
+            for chunk_id, text in chunks:
+                if chunk_id in excluded:
+                    dropped.append(chunk_id)
+                    continue
+                if chunk_id == ENTROPY_SECTION:
+                    text = filter_entropy_levels(text, entropy_level)
+                kept.append(text)
+            module_text = "\n".join(kept).strip()
+            if module_text:
+                parts.append(module_text)
+        return MODULE_SEPARATOR.join(parts), dropped
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_prompt_index():
+    """현재 프롬프트 해시 기준 인덱스 (md 변경 시 재생성)"""
+    global _index
+    registry = get_registry()
+    modules = registry.modules()
+    prompt_hash = registry.prompt_hash
+    with _index_lock:
+        if _index is None or _index.prompt_hash != prompt_hash:
+            _index = PromptIndex(modules, prompt_hash)
+        return _index
+
+
+def assemble_system_prompt(settings):
+    """설정별 시스템 프롬프트 + 토큰 절감 리포트"""
+    index = get_prompt_index()
+    text, dropped = index.assemble(settings)
+    tokens = estimate_tokens(text)
+    report = {
+        "full_tokens": index.full_tokens,
+        "assembled_tokens": tokens,
+        "saved_tokens": index.full_tokens - tokens,
+        "saved_ratio": (index.full_tokens - tokens) / index.full_tokens if index.full_tokens else 0.0,
+        "dropped_sections": dropped,
+    }
+    return text, report
+
+
+def savings_table(housing_types, regions, entropy_levels, output_presets):
+    """설정 조합별 절감량 [(settings, report)]"""
+    rows = []
+    for housing_type in housing_types:
+        for region in regions:
+            for entropy_level in entropy_levels:
+                for output_preset in output_presets:
+                    settings = {
+                        "housing_type": housing_type,
+                        "region": region,
+                        "entropy_level": entropy_level,
+                        "output_preset": output_preset,
+                    }
+                    rows.append((settings, assemble_system_prompt(settings)[1]))
+    return rows
+
+
+if __name__ == "__main__":
+    from core import HOUSING_TYPE_OPTIONS, OUTPUT_PRESET_OPTIONS, REGION_OPTIONS
+
+    # 출력 프리셋은 항상 유지되는 core 모듈에만 있으므로 대표값 하나로 리포트
+    rows = savings_table(HOUSING_TYPE_OPTIONS, REGION_OPTIONS, [1, 3, 5, 7, 9], OUTPUT_PRESET_OPTIONS[:1])
+    print(f"{'HOUSING':<10} {'REGION':<6} {'ENTROPY':>7} {'TOKENS':>8} {'SAVED':>8} {'RATIO':>6}")
+    for settings, report in rows:
+        print(
+            f"{settings['housing_type']:<10} {settings['region']:<6} {settings['entropy_level']:>7} "
+            f"{report['assembled_tokens']:>8} {report['saved_tokens']:>8} {report['saved_ratio']:>6.1%}"
+        )
+    print(f"\nFull prompt: {rows[0][1]['full_tokens']} tokens")
@@ -0,0 +1,277 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Local QA Linter
+§10 QA 체크리스트 중 규칙으로 판정할 수 있는 항목을 모델 호출 없이 로컬에서 검사
+
+- 모델이 직접 출력하는 QA 섹션(출력 토큰 소모 + 자기 검증이라 신뢰도 낮음) 대신 응답마다 수 ms 안에 판정
+- 검사: 비율 상속, fashion_color HEX, room_types별 쿼드런트, 경계선 금지 키워드, 네거티브 프롬프트,
+  camera_meta default/overrides, season / climate_type 상충(§0.6 CONFLICT LINT)
+- 간결 출력(compact_output) 설정이면 생성 단계에서 QA 섹션을 아예 빼고 이 결과만 표시
+
+- CLI는 앱 / 배치와 같이 로컬 계산 Step 3 필드(step3_rules)를 응답 JSON에 병합한 뒤 검사
+  (모델이 생략한 Derived_Fields 값 기준 - --no-derive-fields면 응답 JSON 그대로)
+
+사용 예:
+    python qa_lint.py response.md --aspect-ratio 4:5 --room-types Kitchen,Living,Bedroom,Laundry
+    python qa_lint.py response.md --step1 step1.json
+"""
+
+import argparse
+import re
+import sys
+
+from response_blocks import ParsedResponse
+
+HEX_COLOR_RE = re.compile(r"^#[0-9A-Fa-f]{6}$")
+INTERIOR_FORMAT = "1:1"
+SEAMLESS_KEYWORD = "seamless quad composition"
+# §10 [금지 키워드 체크] - 외관/인테리어 프롬프트 본문에 쓰면 안 되는 표현 (네거티브 프롬프트는 제외)
+FORBIDDEN_KEYWORDS = ("split-screen", "2x2 grid", ":: PANEL BREAK ::", "white borders", "separate panels")
+# §8 네거티브 프롬프트의 경계선 금지 표현 (둘 중 하나 이상)
+BORDER_NEGATIVES = ("borders", "dividing lines")
+# §0.6 [OUTPUT REQUIRED FOR STEP 3] camera_meta 필드
+CAMERA_KEYS = ("eye_level_cm", "lens_mm_range", "camera_angle", "vanishing_lines", "tilt_correction")
+
+# §3.2 SEASON-TO-EXTERIOR 계절 단서 (climate_type이 Tropical이면 TROPICAL)
+SEASON_CUES = {
+    "WINTER": ("winter", "leafless", "snow"),
+    "SPRING": ("spring", "blossom"),
+    "SUMMER": ("summer", "lush green"),
+    "AUTUMN": ("autumn", "golden-orange", "fall foliage"),
+    "TROPICAL": ("tropical", "palm", "monstera"),
+}
+TROPICAL_CLIMATES = ("TROPICAL",)
+TROPICAL_SEASONS = ("SUMMER", "TROPICAL")
+
+ERROR = "error"
+WARNING = "warning"
+
+
+def _finding(check_id, label, problems, severity=ERROR, ok_detail="통과"):
+    return {
+        "id": check_id,
+        "label": label,
+        "ok": not problems,
+        "severity": severity,
+        "detail": ok_detail if not problems else " / ".join(problems),
+    }
+
+
+def _expected_season(settings):
+    climate = str(settings.get("climate_type") or "").upper()
+    if climate in TROPICAL_CLIMATES:
+        return "TROPICAL"
+    return str(settings.get("season") or "").upper()
+
+
+def check_aspect_ratio(settings, step2, sections):
+    """§0.6 RATIO INHERITANCE - 외관은 Step 1 비율, 인테리어 4분할은 1:1 고정"""
+    expected = settings.get("aspect_ratio")
+    problems = []
+    if step2.get("exterior_format") != expected:
+        problems.append(f"exterior_format {step2.get('exterior_format') or '-'} ≠ {expected}")
+    if step2.get("interior_format") not in (None, INTERIOR_FORMAT):
+        problems.append(f"interior_format {step2['interior_format']} ≠ {INTERIOR_FORMAT}")
+    if sections["exterior"] and f"{expected} format" not in sections["exterior"]:
+        problems.append(f"외관 프롬프트에 '{expected} format' 없음")
+    return _finding("aspect_ratio", "비율 상속", problems, ok_detail=f"외관 {expected} / 인테리어 {INTERIOR_FORMAT}")
+
+
+def check_fashion_color(settings, step1, step2):
+    """fashion_color HEX 형식 + Step 3 step1_data 그대로 전달 + 30% 색상(secondary_color) 매핑"""
+    expected = str(settings.get("fashion_color") or "")
+    problems = []
+    if not HEX_COLOR_RE.match(expected):
+        problems.append(f"상속값 {expected or '-'}이(가) HEX(#RRGGBB)가 아님")
+    handed = str(step1.get("fashion_color") or "")
+    if handed.lower() != expected.lower():
+        problems.append(f"step1_data.fashion_color {handed or '-'} ≠ {expected}")
+    secondary = str(step2.get("secondary_color") or "")
+    if secondary and secondary.lower() != expected.lower():
+        problems.append(f"secondary_color {secondary} ≠ {expected}")
+    return _finding("fashion_color", "패션 컬러", problems, ok_detail=expected)
+
+
+def check_quadrants(settings, step2, sections):
+    """선택한 room_types가 모두 쿼드런트와 JSON에 있는지 (STUDIO는 같은 공간 4앵글)"""
+    quadrants = sections["quadrants"]
+    if settings.get("housing_type") == "STUDIO":
+        problems = [] if len(quadrants) >= 4 else [f"쿼드런트 {len(quadrants)}/4개"]
+        return _finding("quadrants", "쿼드런트", problems, ok_detail="STUDIO 4앵글")
+
+    expected = list(settings.get("room_types") or [])
+    labels = {label.lower() for _, label, _ in quadrants}
+    json_rooms = {str(room).lower() for room in step2.get("room_types") or []}
+    problems = []
+    missing_quadrants = [room for room in expected if room.lower() not in labels]
+    if missing_quadrants:
+        problems.append(f"쿼드런트 누락: {', '.join(missing_quadrants)}")
+    missing_json = [room for room in expected if room.lower() not in json_rooms]
+    if missing_json:
+        problems.append(f"JSON room_types 누락: {', '.join(missing_json)}")
+    return _finding("quadrants", "쿼드런트", problems, ok_detail=", ".join(expected))
+
+
+def check_seamless(settings, sections):
+    """§2.5 / §10 - seamless quad 키워드 포함, 금지 키워드 미사용"""
+    body = f"{sections['exterior']}\n{sections['interior']}".lower()
+    problems = [f"금지 키워드 '{keyword}'" for keyword in FORBIDDEN_KEYWORDS if keyword.lower() in body]
+    if settings.get("housing_type") != "STUDIO" and sections["interior"] \
+            and SEAMLESS_KEYWORD not in sections["interior"].lower():
+        problems.append(f"'{SEAMLESS_KEYWORD}' 없음")
+    return _finding("seamless", "경계선 없음", problems)
+
+
+def check_negative(sections):
+    """§8 네거티브 프롬프트 존재 + 경계선 금지 포함"""
+    negative = sections["negative"].lower()
+    if not negative:
+        return _finding("negative", "네거티브 프롬프트", ["섹션 없음"])
+    problems = [] if any(word in negative for word in BORDER_NEGATIVES) else ["경계선 금지(borders / dividing lines) 없음"]
+    return _finding("negative", "네거티브 프롬프트", problems)
+
+
+def check_camera_meta(settings, step2):
+    """camera_meta.default 필수 필드 + overrides 객체 (override가 없는 룸은 default 사용)"""
+    camera_meta = step2.get("camera_meta")
+    if not isinstance(camera_meta, dict):
+        return _finding("camera_meta", "camera_meta", ["camera_meta 없음"])
+    problems = []
+    default = camera_meta.get("default")
+    if not isinstance(default, dict):
+        problems.append("default 없음")
+    else:
+        missing = [key for key in CAMERA_KEYS if key not in default]
+        if missing:
+            problems.append(f"default 누락: {', '.join(missing)}")
+    overrides = camera_meta.get("overrides")
+    if not isinstance(overrides, dict):
+        problems.append("overrides 없음")
+        overrides = {}
+    else:
+        for room, override in overrides.items():
+            if not isinstance(override, dict):
+                problems.append(f"overrides.{room}이(가) 객체가 아님")
+    rooms = [room for room in settings.get("room_types") or [] if room.lower() not in {k.lower() for k in overrides}]
+    ok_detail = "default" + (f" (default 사용: {', '.join(rooms)})" if rooms else " + 룸별 overrides")
+    return _finding("camera_meta", "camera_meta", problems, ok_detail=ok_detail)
+
+
+def check_season(settings, step1, sections):
+    """§0.6 CONFLICT LINT - season vs climate_type, 전달 season, 외관의 다른 계절 단서"""
+    season = str(settings.get("season") or "").upper()
+    expected = _expected_season(settings)
+    problems = []
+    if expected == "TROPICAL" and season not in TROPICAL_SEASONS:
+        problems.append(f"climate_type {settings.get('climate_type')} ↔ season {season} (연중 여름으로 처리)")
+    handed = str(step1.get("season") or "").upper()
+    if handed and handed != season:
+        problems.append(f"step1_data.season {handed} ≠ {season}")
+    exterior = sections["exterior"].lower()
+    # Tropical은 연중 여름이므로 여름 단서도 허용
+    allowed = TROPICAL_SEASONS if expected == "TROPICAL" else (expected,)
+    others = []
+    if not any(cue in exterior for season_name in allowed for cue in SEASON_CUES.get(season_name, ())):
+        others = [other for other, cues in SEASON_CUES.items() if any(cue in exterior for cue in cues)]
+    if others:
+        problems.append(f"외관에 {'/'.join(others)} 단서 (기대: {expected})")
+    return _finding("season", "계절 / 기후", problems, severity=WARNING, ok_detail=expected or "-")
+
+
+def lint_response(text, settings, json_data=None, parsed=None):
+    """
+    응답 하나의 로컬 QA → [{"id", "label", "ok", "severity", "detail"}]
+    json_data: 보완 병합 등으로 응답 본문과 달라진 핸드오프 JSON (없으면 응답에서 파싱)
+    """
+    parsed = parsed or ParsedResponse(text)
+    if json_data is None:
+        json_data = parsed.json_data
+    sections = parsed.sections
+    handoff = json_data if isinstance(json_data, dict) else {}
+    step1 = handoff.get("step1_data") if isinstance(handoff.get("step1_data"), dict) else {}
+    step2 = handoff.get("step2_data") if isinstance(handoff.get("step2_data"), dict) else {}
+
+    findings = [_finding("handoff", "Step 3 JSON", [] if handoff else ["JSON 블록 없음"])]
+    findings += [
+        check_aspect_ratio(settings, step2, sections),
+        check_fashion_color(settings, step1, step2),
+        check_quadrants(settings, step2, sections),
+        check_seamless(settings, sections),
+        check_negative(sections),
+        check_camera_meta(settings, step2),
+        check_season(settings, step1, sections),
+    ]
+    return findings
+
+
+def qa_summary(findings):
+    """{"passed", "total", "errors", "warnings"} (errors/warnings: 실패 항목 수)"""
+    failed = [finding for finding in findings if not finding["ok"]]
+    return {
+        "passed": len(findings) - len(failed),
+        "total": len(findings),
+        "errors": sum(1 for finding in failed if finding["severity"] == ERROR),
+        "warnings": sum(1 for finding in failed if finding["severity"] == WARNING),
+    }
+
+
+def format_findings(findings):
+    """CLI / 로그용 텍스트"""
+    return "\n".join(
+        f"{'✅' if finding['ok'] else '❌' if finding['severity'] == ERROR else '⚠️'} "
+        f"{finding['label']}: {finding['detail']}"
+        for finding in findings
+    )
+
+
+def main(argv=None):
+    from core import apply_step1_values, default_settings, derived_handoff, parse_step1_json
+    from step3_rules import merge_derived
+
+    parser = argparse.ArgumentParser(description="LG Art Director STEP 2 응답 로컬 QA")
+    parser.add_argument("response", help="응답 텍스트 파일 (- 이면 stdin)")
+    parser.add_argument("--step1", help="Step 1 JSON 파일 (설정값 / 로컬 계산 필드의 기준)")
+    parser.add_argument("--aspect-ratio")
+    parser.add_argument("--fashion-color")
+    parser.add_argument("--season")
+    parser.add_argument("--climate-type")
+    parser.add_argument("--housing-type")
+    parser.add_argument("--room-types", help="쉼표 구분 룸 타입")
+    parser.add_argument("--no-derive-fields", action="store_true",
+                        help="로컬 계산 Step 3 필드를 병합하지 않고 응답 JSON 그대로 검사")
+    args = parser.parse_args(argv)
+
+    settings = default_settings()
+    step1_data = None
+    if args.step1:
+        with open(args.step1, "r", encoding="utf-8") as f:
+            step1_data, error = parse_step1_json(f.read())
+        if error:
+            parser.error(f"--step1: {error}")
+        if not isinstance(step1_data, dict):
+            parser.error("--step1: Step 1 JSON은 객체여야 합니다.")
+        settings = apply_step1_values(settings, step1_data)
+    for key in ("aspect_ratio", "fashion_color", "season", "climate_type", "housing_type"):
+        if getattr(args, key):
+            settings[key] = getattr(args, key)
+    if args.room_types:
+        settings["room_types"] = [room.strip() for room in args.room_types.split(",") if room.strip()]
+    if args.no_derive_fields:
+        settings["derive_fields"] = False
+
+    if args.response == "-":
+        text = sys.stdin.read()
+    else:
+        with open(args.response, "r", encoding="utf-8") as f:
+            text = f.read()
+    # 앱 / 배치와 같이 모델이 생략한 로컬 계산 필드를 채운 핸드오프로 검사
+    parsed = ParsedResponse(text)
+    json_data = merge_derived(parsed.json_data, derived_handoff(settings, step1_data))
+    findings = lint_response(text, settings, json_data=json_data, parsed=parsed)
+    summary = qa_summary(findings)
+    print(format_findings(findings))
+    print(f"\n{summary['passed']}/{summary['total']} 통과")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Rate Limiter
+모든 모델 호출 앞에 두는 프로세스 전체 공유 요청/토큰 제한 + 재시도
+
+- 분당 요청 수(RPM) / 분당 토큰 수(TPM) 두 개의 token bucket (0이면 제한 없음)
+- 대기 요청은 도착 순서(FIFO)대로만 통과 - 큰 요청이 뒤에 온 작은 요청에 계속 추월당하지 않음
+- 토큰은 입력 추정치 + 출력 추정치로 먼저 차감하고, 응답의 usage_metadata로 차액 정산
+- 429 / 5xx / 연결 오류는 지터를 섞은 지수 백오프로 재시도하며, 재시도도 다시 대기열을 거침
+- 대기열 길이 / 최근 대기 시간 / 재시도 수는 stats()로 조회 (사이드바 표시)
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from telemetry import percentile, usage_counts
+
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_DELAY_S = 1.0
+DEFAULT_MAX_DELAY_S = 30.0
+DEFAULT_OUTPUT_TOKENS = 2048
+DEFAULT_WINDOW = 200
+POLL_S = 0.5
+
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+# grpc.StatusCode 이름 → HTTP 상태 코드 (SDK가 api_core 예외로 감싸지 않은 경우)
+GRPC_STATUS_CODES = {
+    "RESOURCE_EXHAUSTED": 429,
+    "UNAVAILABLE": 503,
+    "DEADLINE_EXCEEDED": 504,
+    "INTERNAL": 500,
+}
+
+
+def error_code(exc):
+    """예외의 HTTP 상태 코드 (api_core 예외/BackendError는 .code, grpc 오류는 .code()) - 모르면 None"""
+    code = getattr(exc, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            return None
+    if isinstance(code, int):
+        return code
+    return GRPC_STATUS_CODES.get(getattr(code, "name", None))
+
+
+def is_retryable(exc):
+    if isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    return error_code(exc) in RETRYABLE_CODES
+
+
+class TokenBucket:
+    """분당 rate만큼 채워지는 bucket (용량 = 1분치, 정산으로 음수가 될 수 있음)"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """amount를 꺼낼 수 있을 때까지 남은 초 (용량보다 큰 요청은 가득 찼을 때 통과)"""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= amount
+
+
+class RateLimiter:
+    """프로세스 전체 요청 제한기 (스레드 안전, sync/async 공용)"""
+
+    def __init__(self, rpm=0, tpm=0, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay_s=DEFAULT_BASE_DELAY_S,
+                 max_delay_s=DEFAULT_MAX_DELAY_S, output_tokens=DEFAULT_OUTPUT_TOKENS, window=DEFAULT_WINDOW):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self.output_tokens = output_tokens
+        self._requests = TokenBucket(rpm) if rpm > 0 else None
+        self._tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._waits = deque(maxlen=window)
+        self._rng = random.Random()
+        self.retries = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls):
+        """LG_RATE_LIMIT_RPM / LG_RATE_LIMIT_TPM (0 또는 미설정이면 제한 없음) / LG_RATE_LIMIT_MAX_ATTEMPTS"""
+        return cls(
+            rpm=float(os.getenv("LG_RATE_LIMIT_RPM", "0") or 0),
+            tpm=float(os.getenv("LG_RATE_LIMIT_TPM", "0") or 0),
+            max_attempts=int(os.getenv("LG_RATE_LIMIT_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)),
+            base_delay_s=float(os.getenv("LG_RATE_LIMIT_BASE_DELAY_S", DEFAULT_BASE_DELAY_S)),
+            max_delay_s=float(os.getenv("LG_RATE_LIMIT_MAX_DELAY_S", DEFAULT_MAX_DELAY_S)),
+            output_tokens=int(os.getenv("LG_RATE_LIMIT_OUTPUT_TOKENS", DEFAULT_OUTPUT_TOKENS)),
+        )
+
+    # ── 대기열 ───────────────────────────────────────────────
+
+    def _delay(self, tokens, now):
+        delay = 0.0
+        if self._requests is not None:
+            delay = max(delay, self._requests.delay(1, now))
+        if self._tokens is not None:
+            delay = max(delay, self._tokens.delay(tokens, now))
+        return delay
+
+    def _take(self, tokens, now):
+        if self._requests is not None:
+            self._requests.take(1, now)
+        if self._tokens is not None:
+            self._tokens.take(tokens, now)
+
+    def acquire(self, tokens=0, on_wait=None):
+        """
+        차례가 오고 bucket에 여유가 생길 때까지 대기 후 차감 - 대기한 초 반환
+        on_wait(ahead, waited_s): 대기 중 POLL_S마다 호출 (ahead = 앞선 대기 요청 수, 호출 스레드에서 실행)
+        """
+        started = time.monotonic()
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    ahead = self._queue.index(ticket)
+                    if ahead == 0:
+                        delay = self._delay(tokens, now)
+                        if delay <= 0:
+                            self._take(tokens, now)
+                            break
+                        timeout = min(delay, POLL_S)
+                    else:
+                        timeout = POLL_S
+                    self._cond.wait(timeout)
+                if on_wait is not None:
+                    on_wait(ahead, time.monotonic() - started)
+        finally:
+            # 통과했든 중단됐든(rerun/취소) 대기열에서 빠져 다음 요청이 진행되게 함
+            with self._cond:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+        waited = time.monotonic() - started
+        with self._cond:
+            self._waits.append(waited)
+        return waited
+
+    def settle(self, reserved, actual):
+        """선차감한 토큰 추정치와 실제 사용량의 차액 반영 (초과분은 이후 요청을 늦춤)"""
+        if self._tokens is None or actual is None:
+            return
+        with self._cond:
+            now = time.monotonic()
+            self._tokens.take(actual - reserved, now)
+            self._tokens.level = min(self._tokens.level, self._tokens.capacity)
+            self._cond.notify_all()
+
+    # ── 재시도 ───────────────────────────────────────────────
+
+    def backoff_delay(self, attempt):
+        """attempt번째 실패 후 대기 초 - 지수 증가 상한의 절반 + 나머지 절반 범위 무작위 지터"""
+        ceiling = min(self.max_delay_s, self.base_delay_s * (2 ** (attempt - 1)))
+        return ceiling / 2 + self._rng.uniform(0, ceiling / 2)
+
+    def _reserve(self, input_tokens):
+        return input_tokens + self.output_tokens if self._tokens is not None else 0
+
+    def _settle_response(self, reserved, response):
+        counts = usage_counts(response)
+        if counts is not None:
+            self.settle(reserved, counts[2])
+
+    def _on_failure(self, exc, attempt, max_attempts, trace):
+        """재시도할 경우 대기 초, 아니면 None"""
+        if attempt >= max_attempts or not is_retryable(exc):
+            with self._cond:
+                self.failures += 1
+            return None
+        with self._cond:
+            self.retries += 1
+        if trace is not None:
+            trace.update(retries=(trace.record.get("retries") or 0) + 1)
+        return self.backoff_delay(attempt)
+
+    @staticmethod
+    def _add_wait(trace, waited):
+        if trace is not None:
+            trace.update(queue_wait_ms=round((trace.record.get("queue_wait_ms") or 0) + waited * 1000, 1))
+
+    def call(self, func, input_tokens=0, trace=None, on_wait=None, on_retry=None, max_attempts=None):
+        """
+        대기열 통과 후 func() 실행, 재시도 가능한 오류면 백오프 후 처음부터 다시
+        on_retry(attempt, delay_s, exc): 백오프 대기 직전 호출
+        max_attempts: 이번 호출의 시도 횟수 (기본: 설정값, 다른 route로 넘길 수 있으면 1)
+        마지막 시도까지 실패하면 마지막 예외를 그대로 전파
+        """
+        reserved = self._reserve(input_tokens)
+        max_attempts = max_attempts or self.max_attempts
+        for attempt in range(1, max_attempts + 1):
+            self._add_wait(trace, self.acquire(reserved, on_wait))
+            try:
+                response = func()
+            except Exception as e:
+                delay = self._on_failure(e, attempt, max_attempts, trace)
+                if delay is None:
+                    raise
+                if on_retry is not None:
+                    on_retry(attempt, delay, e)
+                time.sleep(delay)
+                continue
+            self._settle_response(reserved, response)
+            return response
+
+    async def call_async(self, func, input_tokens=0, trace=None, max_attempts=None):
+        """call의 async 버전 - func는 awaitable을 반환하는 함수 (대기는 스레드에서 수행)"""
+        reserved = self._reserve(input_tokens)
+        max_attempts = max_attempts or self.max_attempts
+        for attempt in range(1, max_attempts + 1):
+            self._add_wait(trace, await asyncio.to_thread(self.acquire, reserved))
+            try:
+                response = await func()
+            except Exception as e:
+                delay = self._on_failure(e, attempt, max_attempts, trace)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._settle_response(reserved, response)
+            return response
+
+    # ── 상태 ─────────────────────────────────────────────────
+
+    def stats(self):
+        """{"queue_depth", "wait_p50_s", "wait_p95_s", "waits", "retries", "failures", "rpm", "tpm"}"""
+        with self._cond:
+            waits = list(self._waits)
+            return {
+                "queue_depth": len(self._queue),
+                "wait_p50_s": percentile(waits, 0.5),
+                "wait_p95_s": percentile(waits, 0.95),
+                "waits": len(waits),
+                "retries": self.retries,
+                "failures": self.failures,
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """프로세스 전체에서 공유하는 요청 제한기"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter.from_env()
+    return _limiter
@@ -0,0 +1,217 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Response Block Scanner
+응답의 ``` fenced 블록을 한 번의 선형 스캔으로 모두 색인하고 표준 Output Structure 섹션으로 분해
+
+- 블록마다 언어 태그와 오프셋만 기록 (본문 문자열은 필요할 때만 잘라 냄)
+- Step 3 핸드오프는 위치가 아니라 스키마 형태(최상위 필수 키 수)로 고름
+  → 앞쪽의 초안/깨진 json 블록이나 다른 예시 json 블록에 가려지지 않음
+- 섹션(외관 / 인테리어 / 쿼드런트 / 네거티브 / QA)은 블록 오프셋과 마커 위치로 계산
+"""
+
+import json
+import re
+
+FENCE = "```"
+LANG_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_+-.")
+WHITESPACE = " \t\r\n"
+
+# Step 3 핸드오프 최상위 필수 키 (schemas/LG_Step2_Schema_v1_1.json required)
+HANDOFF_KEYS = ("schema_version", "project_id", "step1_data", "step2_data", "room_target")
+
+NEGATIVE_MARKER = "[네거티브 프롬프트"
+QA_MARKER = "✅ STEP 2 QA"
+QUADRANT_RE = re.compile(r"^(Upper|Lower)-(left|right) quadrant\s*-\s*([^:\n]+):", re.MULTILINE | re.IGNORECASE)
+
+
+class FencedBlock:
+    """fenced 블록 하나의 위치 정보 (start/end: 펜스 포함, body_start/body_end: 앞뒤 공백 제외 본문)"""
+
+    __slots__ = ("lang", "start", "end", "body_start", "body_end", "closed")
+
+    def __init__(self, lang, start, end, body_start, body_end, closed):
+        self.lang = lang
+        self.start = start
+        self.end = end
+        self.body_start = body_start
+        self.body_end = body_end
+        self.closed = closed
+
+    def body(self, text):
+        return text[self.body_start:self.body_end]
+
+    def __repr__(self):
+        return f"FencedBlock({self.lang!r}, {self.start}:{self.end})"
+
+
+def scan_blocks(text, start=0):
+    """
+    start 이후의 fenced 블록 목록 (한 번의 선형 스캔)
+    여는 펜스 바로 뒤의 단어가 언어 태그, 다음 ``` 가 닫는 펜스 (기존 정규식과 같은 짝짓기)
+    닫히지 않은 마지막 블록은 closed=False로 포함
+    """
+    blocks = []
+    length = len(text)
+    position = text.find(FENCE, start)
+    while position != -1:
+        cursor = position + 3
+        lang_end = cursor
+        while lang_end < length and text[lang_end] in LANG_CHARS:
+            lang_end += 1
+        body_start = lang_end
+        while body_start < length and text[body_start] in WHITESPACE:
+            body_start += 1
+        close = text.find(FENCE, lang_end)
+        if close == -1:
+            blocks.append(FencedBlock(text[cursor:lang_end].lower(), position, length, body_start, length, False))
+            break
+        body_end = close
+        while body_end > body_start and text[body_end - 1] in WHITESPACE:
+            body_end -= 1
+        blocks.append(FencedBlock(text[cursor:lang_end].lower(), position, close + 3, body_start, body_end, True))
+        position = text.find(FENCE, close + 3)
+    return blocks
+
+
+def handoff_score(text, block):
+    """json 블록이 핸드오프처럼 보이는 정도 - 본문에 있는 최상위 필수 키 수 (파싱 없이 부분 문자열로 판단)"""
+    body = text[block.body_start:block.body_end]
+    return sum(1 for key in HANDOFF_KEYS if f'"{key}"' in body)
+
+
+def load_block(text, block):
+    """블록 본문을 JSON으로 파싱 (실패하면 None)"""
+    try:
+        return json.loads(text[block.body_start:block.body_end])
+    except json.JSONDecodeError:
+        return None
+
+
+def select_handoff(text, blocks):
+    """
+    (블록, 파싱된 JSON) - 닫힌 json 블록 중 핸드오프 키가 많은 순서로 파싱해 처음 성공한 것
+    핸드오프 형태인 블록이 없으면 처음 파싱되는 json 블록 (보완 패치 / 쿼드런트 조각 등)
+    """
+    candidates = [block for block in blocks if block.lang == "json" and block.closed]
+    ranked = sorted(candidates, key=lambda block: -handoff_score(text, block)) if len(candidates) > 1 else candidates
+    for block in ranked:
+        data = load_block(text, block)
+        if data is not None:
+            return block, data
+    return None, None
+
+
+def outside_text(text, blocks):
+    """블록을 모두 제외한 본문"""
+    parts = []
+    position = 0
+    for block in blocks:
+        parts.append(text[position:block.start])
+        position = block.end
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def _heading_before(text, offset, lookback=400):
+    """offset 바로 앞의 비어 있지 않은 줄 (블록 제목)"""
+    head = text[max(0, offset - lookback):offset].rstrip()
+    return head[head.rfind("\n") + 1:].strip()
+
+
+class ParsedResponse:
+    """모델 응답 하나의 블록 색인 + 섹션 접근 (핸드오프 JSON / 섹션은 처음 접근할 때 계산)"""
+
+    def __init__(self, text):
+        self.text = text or ""
+        self.blocks = scan_blocks(self.text)
+        self._handoff = None
+        self._sections = None
+
+    def _select_handoff(self):
+        if self._handoff is None:
+            self._handoff = select_handoff(self.text, self.blocks)
+        return self._handoff
+
+    @property
+    def handoff_block(self):
+        return self._select_handoff()[0]
+
+    @property
+    def json_data(self):
+        return self._select_handoff()[1]
+
+    @property
+    def clean_text(self):
+        """핸드오프 블록을 뺀 본문 (핸드오프가 없으면 원문)"""
+        block = self.handoff_block
+        if block is None:
+            return self.text
+        return (self.text[:block.start] + self.text[block.end:]).strip()
+
+    def blocks_of(self, lang):
+        return [block for block in self.blocks if block.lang == lang]
+
+    def first_body(self, lang):
+        for block in self.blocks:
+            if block.lang == lang:
+                return block.body(self.text)
+        return None
+
+    @property
+    def sections(self):
+        """{"exterior", "interior", "quadrants": [(위치, 라벨, 문단)], "negative", "qa"} (없는 섹션은 "")"""
+        if self._sections is None:
+            self._sections = self._split_sections()
+        return self._sections
+
+    def _split_sections(self):
+        text = self.text
+        exterior = interior = None
+        markdown_blocks = self.blocks_of("markdown")
+        for block in markdown_blocks:
+            heading = _heading_before(text, block.start)
+            if exterior is None and (heading.startswith("2.1") or "외관" in heading):
+                exterior = block
+            elif interior is None and (heading.startswith("2.2") or "인테리어" in heading):
+                interior = block
+        unassigned = [block for block in markdown_blocks if block is not exterior and block is not interior]
+        if exterior is None and unassigned:
+            exterior = unassigned.pop(0)
+        if interior is None and unassigned:
+            interior = unassigned.pop(0)
+
+        interior_text = interior.body(text) if interior else ""
+        return {
+            "exterior": exterior.body(text) if exterior else "",
+            "interior": interior_text,
+            "quadrants": self._quadrants(interior_text),
+            "negative": self._marked_section(NEGATIVE_MARKER, QA_MARKER),
+            "qa": self._marked_section(QA_MARKER, None),
+        }
+
+    @staticmethod
+    def _quadrants(interior_text):
+        matches = list(QUADRANT_RE.finditer(interior_text))
+        quadrants = []
+        for index, match in enumerate(matches):
+            end = matches[index + 1].start() if index + 1 < len(matches) else len(interior_text)
+            paragraph_end = interior_text.find("\n\n", match.start(), end)
+            paragraph = interior_text[match.start():paragraph_end if paragraph_end != -1 else end]
+            position = f"{match.group(1).capitalize()}-{match.group(2).lower()}"
+            quadrants.append((position, match.group(3).strip(), paragraph.strip()))
+        return quadrants
+
+    def _marked_section(self, marker, next_marker):
+        """marker 줄 다음부터 next_marker(또는 끝)까지 - 그 안의 fenced 블록은 본문만"""
+        text = self.text
+        start = text.find(marker)
+        if start == -1:
+            return ""
+        body_start = text.find("\n", start)
+        if body_start == -1:
+            return ""
+        end = text.find(next_marker, body_start) if next_marker else -1
+        end = len(text) if end == -1 else end
+        inner = [block for block in self.blocks if body_start <= block.start < end]
+        if inner:
+            return "\n".join(block.body(text) for block in inner)
+        return text[body_start:end].strip()
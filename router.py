@@ -0,0 +1,244 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Model Router
+여러 API 키 × 여러 모델(route) 중에서 턴 유형과 상태에 따라 요청을 보낼 route를 고름
+
+- 턴 유형: initial(첫 생성 / 설정 변경 후 전체 재생성) → 강한 모델 우선,
+  refine(짧은 수정 지시) → 빠르고 저렴한 모델(flash-lite 등) 우선
+- route별 최근 지연(p50, 턴 유형별)과 오류율을 추적해 같은 등급 안에서는 빠른 route부터,
+  오류율이 높거나 느린 route는 뒤로 보냄
+- 429 / 5xx / 키·모델 오류가 나면 해당 route를 잠시 쉬게(cooldown) 하고 다음 route로 넘어감
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from core import MODEL_OPTIONS, fingerprint_key
+from rate_limit import error_code, is_retryable
+from telemetry import percentile
+
+TURN_INITIAL = "initial"
+TURN_REFINE = "refine"
+
+# 턴 유형별 모델 등급 선호 순서
+TIER_ORDER = {
+    TURN_INITIAL: ("strong", "standard", "fast"),
+    TURN_REFINE: ("fast", "standard", "strong"),
+}
+# 재시도 대상 오류 외에 다른 route로 넘기면 해결될 수 있는 오류 (키 권한 / 모델 없음)
+FAILOVER_CODES = {401, 403, 404}
+
+DEFAULT_WINDOW = 20
+DEFAULT_MAX_ERROR_RATE = 0.5
+MIN_SAMPLES = 3
+DEFAULT_SLOW_MS = {TURN_INITIAL: 120000, TURN_REFINE: 30000}
+BASE_COOLDOWN_S = 15.0
+MAX_COOLDOWN_S = 300.0
+
+
+def model_tier(model_name):
+    """모델 이름 → 등급 (strong / standard / fast)"""
+    name = model_name.lower()
+    if "lite" in name or "fast" in name:
+        return "fast"
+    if "pro" in name:
+        return "strong"
+    return "standard"
+
+
+def route_models(options):
+    """카탈로그 모델 중 라우팅 후보 (LG_ROUTE_MODELS 쉼표 목록, 기본 MODEL_OPTIONS) - 겹치는 게 없으면 전체"""
+    allowed = [m.strip() for m in os.getenv("LG_ROUTE_MODELS", "").split(",") if m.strip()] or MODEL_OPTIONS
+    return [model for model in options if model in allowed] or list(options)
+
+
+def parse_api_keys(*values):
+    """API 키 값들(문자열 / 쉼표·줄바꿈 구분 문자열 / 목록) → 순서 유지 중복 제거 목록"""
+    keys = []
+    for value in values:
+        items = value if isinstance(value, (list, tuple)) else str(value or "").replace("\n", ",").split(",")
+        for item in items:
+            key = str(item).strip()
+            if key and key not in keys:
+                keys.append(key)
+    return keys
+
+
+def classify_turn(model_messages, settings_changed=False):
+    """이전 응답이 없거나 설정이 바뀌었으면 initial, 아니면 refine"""
+    has_reply = any(msg.get("role") == "assistant" for msg in model_messages)
+    return TURN_INITIAL if settings_changed or not has_reply else TURN_REFINE
+
+
+def should_fail_over(exc):
+    return is_retryable(exc) or error_code(exc) in FAILOVER_CODES
+
+
+class Route:
+    """API 키 하나(backend) + 모델 하나 - 상태는 키 순서가 아닌 키 fingerprint 기준으로 추적"""
+
+    def __init__(self, backend, model, key_index=0, api_key=""):
+        self.backend = backend
+        self.model = model
+        self.key_index = key_index
+        self.health_key = f"{backend.name}:{fingerprint_key(api_key)}:{model}"
+
+    @property
+    def name(self):
+        return f"{self.model}@key{self.key_index + 1}"
+
+    @property
+    def tier(self):
+        return model_tier(self.model)
+
+    def describe(self, turn_type=None):
+        """메시지/텔레메트리 기록용"""
+        return {"name": self.name, "model": self.model, "key": self.key_index + 1, "turn_type": turn_type}
+
+    def __repr__(self):
+        return f"Route({self.name})"
+
+
+def build_routes(key_models):
+    """[(backend, api_key, [model, ...])] (키 순서대로) → [Route]"""
+    return [
+        Route(backend, model, key_index, api_key)
+        for key_index, (backend, api_key, models) in enumerate(key_models)
+        for model in models
+    ]
+
+
+class _RouteHealth:
+    def __init__(self, window):
+        self.latencies = {turn_type: deque(maxlen=window) for turn_type in TIER_ORDER}
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_error = None
+
+    def error_rate(self):
+        if len(self.outcomes) < MIN_SAMPLES:
+            return 0.0
+        return sum(1 for ok in self.outcomes if not ok) / len(self.outcomes)
+
+
+class ModelRouter:
+    """route 상태 추적 + 순위 결정 (프로세스 전체 공유, 스레드 안전)"""
+
+    def __init__(self, window=DEFAULT_WINDOW, max_error_rate=DEFAULT_MAX_ERROR_RATE, slow_ms=None,
+                 base_cooldown_s=BASE_COOLDOWN_S, max_cooldown_s=MAX_COOLDOWN_S):
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.slow_ms = dict(DEFAULT_SLOW_MS, **(slow_ms or {}))
+        self.base_cooldown_s = base_cooldown_s
+        self.max_cooldown_s = max_cooldown_s
+        self._lock = threading.Lock()
+        self._health = {}
+
+    @classmethod
+    def from_env(cls):
+        """LG_ROUTE_WINDOW / LG_ROUTE_MAX_ERROR_RATE / LG_ROUTE_SLOW_MS_INITIAL / LG_ROUTE_SLOW_MS_REFINE"""
+        return cls(
+            window=int(os.getenv("LG_ROUTE_WINDOW", DEFAULT_WINDOW)),
+            max_error_rate=float(os.getenv("LG_ROUTE_MAX_ERROR_RATE", DEFAULT_MAX_ERROR_RATE)),
+            slow_ms={
+                TURN_INITIAL: float(os.getenv("LG_ROUTE_SLOW_MS_INITIAL", DEFAULT_SLOW_MS[TURN_INITIAL])),
+                TURN_REFINE: float(os.getenv("LG_ROUTE_SLOW_MS_REFINE", DEFAULT_SLOW_MS[TURN_REFINE])),
+            },
+        )
+
+    def _get(self, route):
+        health = self._health.get(route.health_key)
+        if health is None:
+            health = self._health[route.health_key] = _RouteHealth(self.window)
+        return health
+
+    def rank(self, routes, turn_type):
+        """
+        시도 순서: (cooldown 중 여부, 성능 저하 여부, 턴 유형별 등급 순위, 최근 p50 지연)
+        측정 기록이 없는 route는 지연 0으로 취급해 같은 등급에서 먼저 시도 (탐색)
+        """
+        tiers = TIER_ORDER.get(turn_type, TIER_ORDER[TURN_INITIAL])
+        now = time.monotonic()
+        with self._lock:
+            keyed = []
+            for index, route in enumerate(routes):
+                health = self._get(route)
+                p50 = percentile(health.latencies[turn_type], 0.5) or 0.0
+                degraded = health.error_rate() > self.max_error_rate or p50 > self.slow_ms[turn_type]
+                keyed.append(((health.cooldown_until > now, degraded, tiers.index(route.tier), p50, index), route))
+        return [route for _, route in sorted(keyed, key=lambda item: item[0])]
+
+    def record(self, route, turn_type, latency_ms=None, error=None):
+        """성공(latency_ms) 또는 실패(error) 기록 - 실패가 이어질수록 cooldown이 지수적으로 길어짐"""
+        with self._lock:
+            health = self._get(route)
+            health.outcomes.append(error is None)
+            if error is None:
+                health.consecutive_failures = 0
+                health.cooldown_until = 0.0
+                if latency_ms is not None:
+                    health.latencies[turn_type].append(latency_ms)
+                return
+            health.consecutive_failures += 1
+            health.last_error = f"{type(error).__name__}: {error}"
+            cooldown = min(self.max_cooldown_s, self.base_cooldown_s * 2 ** (health.consecutive_failures - 1))
+            health.cooldown_until = time.monotonic() + cooldown
+
+    def call(self, routes, turn_type, send, on_fallback=None):
+        """
+        순위대로 send(route, has_fallback) 시도 → (처리한 route, 응답)
+        - has_fallback: 뒤에 시도할 route가 남았는지 (호출 측은 같은 route 재시도를 줄이는 데 사용)
+        - 다른 route로 넘기면 해결될 수 있는 오류만 다음 route로, 그 외 오류와 마지막 route의 오류는 전파
+        - on_fallback(failed_route, next_route, exc): 다음 route로 넘어가기 직전 호출
+        """
+        ranked = self.rank(routes, turn_type)
+        for index, route in enumerate(ranked):
+            has_fallback = index + 1 < len(ranked)
+            started = time.perf_counter()
+            try:
+                response = send(route, has_fallback)
+            except Exception as e:
+                self.record(route, turn_type, error=e)
+                if not has_fallback or not should_fail_over(e):
+                    raise
+                if on_fallback is not None:
+                    on_fallback(route, ranked[index + 1], e)
+                continue
+            self.record(route, turn_type, latency_ms=(time.perf_counter() - started) * 1000)
+            return route, response
+        raise ValueError("route가 없습니다.")
+
+    def stats(self, routes):
+        """표시용 [{"name", "tier", "p50_ms": {turn_type: ...}, "error_rate", "cooling_s", "last_error"}]"""
+        now = time.monotonic()
+        with self._lock:
+            rows = []
+            for route in routes:
+                health = self._get(route)
+                rows.append({
+                    "name": route.name,
+                    "tier": route.tier,
+                    "p50_ms": {
+                        turn_type: percentile(latencies, 0.5) for turn_type, latencies in health.latencies.items()
+                    },
+                    "error_rate": health.error_rate(),
+                    "cooling_s": max(0.0, health.cooldown_until - now),
+                    "last_error": health.last_error,
+                })
+        return rows
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """프로세스 전체에서 공유하는 모델 라우터"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter.from_env()
+    return _router
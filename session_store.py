@@ -0,0 +1,305 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Session Store
+대화 기록을 SQLite에 추가 전용(append-only)으로 저장하고, 메모리에는 최근 턴만 유지
+
+- 턴마다 한 행 (사용자 입력, 조합 프롬프트, 모델 응답, 로컬 계산 필드, 표시용 메타) - 본문은 zlib 압축
+- 변형 교체 / 핸드오프 보완 같은 수정도 기존 행을 고치지 않고 revision 행을 추가 (읽을 때 순서대로 병합)
+- 앱은 최근 memory_turns 턴만 session_state에 두고, 그 이전 턴은 표시/히스토리 재구성 때만 디스크에서 읽음
+- 세션에는 project_id / 설정 / Step 1 JSON을 함께 저장해 재시작 후에도 project_id로 이어서 작업
+- 목록 조회는 project_id가 필수이고 owner(로그인 사용자)가 같은 세션만 반환
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+from core import make_assistant_message
+from history import build_compact_history, pair_turns
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sessions.sqlite3")
+# 앱이 펼쳐 렌더링하는 최근 턴 수와 같게 - 그 이전 턴은 필요할 때 디스크에서 읽음
+DEFAULT_MEMORY_TURNS = 3
+DEFAULT_PAGE_TURNS = 10
+# 메시지 dict 중 디스크에 메타로 남길 표시용 필드 (나머지는 응답에서 다시 파싱)
+MESSAGE_META_KEYS = ("title", "route", "variants", "selected_variant", "qa")
+# 보완 병합 결과 - repaired가 True인 revision이 마지막일 때만 응답 파싱 결과 대신 사용
+REPAIR_META_KEYS = ("json_data", "schema_errors")
+
+
+def _pack(value):
+    if value is None:
+        return None
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def _unpack(blob):
+    if blob is None:
+        return None
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def message_meta(msg):
+    """어시스턴트 메시지 중 저장할 표시용 메타"""
+    return {key: msg[key] for key in MESSAGE_META_KEYS if key in msg}
+
+
+def turn_messages(turn):
+    """
+    저장된 턴 → (표시용 [user, assistant], 모델용 [user, assistant])
+    어시스턴트 메시지는 응답을 다시 파싱한 뒤 저장된 메타(보완 병합 JSON 등)를 덮어씀
+    """
+    meta = dict(turn["meta"])
+    if not meta.get("repaired"):
+        for key in REPAIR_META_KEYS:
+            meta.pop(key, None)
+    assistant = make_assistant_message(turn["response"], turn["derived"])
+    assistant.update(meta)
+    assistant["turn"] = turn["turn_no"]
+    if turn["derived"]:
+        assistant["derived"] = turn["derived"]
+    display = [{"role": "user", "content": turn["user_input"], "turn": turn["turn_no"]}, assistant]
+    model = [{"role": "user", "content": turn["prompt"]}, {"role": "assistant", "content": turn["response"]}]
+    return display, model
+
+
+def build_session_history(store, session_id, window_messages, offset, token_budget, keep_recent_turns,
+                          page_turns=DEFAULT_PAGE_TURNS):
+    """
+    메모리 창(model_messages) + 디스크의 이전 offset개 턴으로 압축 히스토리 구성
+    이전 턴은 최근 쪽부터 페이지 단위로 읽고, 토큰 예산 때문에 빠지는 턴이 생기면 더 읽지 않음
+    """
+    messages = list(window_messages)
+    history = build_compact_history(messages, token_budget, keep_recent_turns)
+    end = offset if store is not None and session_id else 0
+    while end > 0 and sum(1 for turn in history if turn["role"] == "model") >= len(pair_turns(messages)):
+        start = max(0, end - page_turns)
+        messages = store.model_messages(session_id, start, end) + messages
+        history = build_compact_history(messages, token_budget, keep_recent_turns)
+        end = start
+    return history
+
+
+class SessionStore:
+    """SQLite 기반 세션 저장소 (프로세스 내 스레드 간 공유)"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH, memory_turns=DEFAULT_MEMORY_TURNS):
+        self.path = path
+        self.memory_turns = max(1, int(memory_turns))
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " project_id TEXT NOT NULL,"
+            " settings BLOB,"
+            " step1_data BLOB,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " turns INTEGER NOT NULL DEFAULT 0,"
+            " owner TEXT)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "owner" not in columns:
+            # owner 컬럼 이전에 만든 저장소
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN owner TEXT")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            " session_id TEXT NOT NULL,"
+            " turn_no INTEGER NOT NULL,"
+            " revision INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " user_input TEXT,"
+            " prompt BLOB,"
+            " response BLOB,"
+            " derived BLOB,"
+            " meta BLOB,"
+            " PRIMARY KEY (session_id, turn_no, revision))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_project ON sessions(project_id, updated_at)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls):
+        """LG_SESSION_STORE_PATH (빈 값이면 None - 저장 안 함) / LG_SESSION_MEMORY_TURNS"""
+        path = os.getenv("LG_SESSION_STORE_PATH", DEFAULT_STORE_PATH)
+        if not path:
+            return None
+        return cls(path=path, memory_turns=int(os.getenv("LG_SESSION_MEMORY_TURNS", DEFAULT_MEMORY_TURNS)))
+
+    # ── 세션 ─────────────────────────────────────────────────
+
+    def create_session(self, project_id, settings=None, step1_data=None, owner=None):
+        """owner: 로그인 사용자 식별자 (없으면 None - 같은 owner 없음끼리만 목록에 보임)"""
+        session_id = uuid.uuid4().hex[:16]
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, project_id, settings, step1_data, created_at, updated_at, owner)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, project_id or "", _pack(settings), _pack(step1_data), now, now, owner),
+            )
+            self._conn.commit()
+        return session_id
+
+    def get_session(self, session_id):
+        """{"session_id", "project_id", "settings", "step1_data", "created_at", "updated_at", "turns", "owner"} 또는 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT session_id, project_id, settings, step1_data, created_at, updated_at, turns, owner"
+                " FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "session_id": row[0],
+            "project_id": row[1],
+            "settings": _unpack(row[2]),
+            "step1_data": _unpack(row[3]),
+            "created_at": row[4],
+            "updated_at": row[5],
+            "turns": row[6],
+            "owner": row[7],
+        }
+
+    def list_sessions(self, project_id, owner=None, limit=20):
+        """
+        project_id + owner가 같은 세션 최근 갱신 순 [{"session_id", "project_id", "updated_at", "turns"}]
+        project_id가 비어 있으면 [] (다른 프로젝트 / 다른 사용자의 대화를 나열하지 않음)
+        """
+        if not project_id:
+            return []
+        query = (
+            "SELECT session_id, project_id, updated_at, turns FROM sessions"
+            " WHERE turns > 0 AND project_id = ? AND owner IS ? ORDER BY updated_at DESC LIMIT ?"
+        )
+        params = [project_id, owner, limit]
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {"session_id": row[0], "project_id": row[1], "updated_at": row[2], "turns": row[3]}
+            for row in rows
+        ]
+
+    # ── 턴 (추가 전용) ───────────────────────────────────────
+
+    def append_turn(self, session_id, user_input, prompt, response, derived=None, meta=None,
+                    settings=None, step1_data=None):
+        """새 턴 추가 → turn_no (세션의 최신 설정 / Step 1 JSON도 함께 갱신)"""
+        now = time.time()
+        with self._lock:
+            turn_no = self._conn.execute(
+                "SELECT turns FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO turns (session_id, turn_no, revision, created_at, user_input, prompt, response, derived, meta)"
+                " VALUES (?, ?, 0, ?, ?, ?, ?, ?, ?)",
+                (session_id, turn_no, now, user_input, _pack(prompt), _pack(response), _pack(derived), _pack(meta or {})),
+            )
+            self._conn.execute(
+                "UPDATE sessions SET turns = ?, updated_at = ?,"
+                " project_id = COALESCE(?, project_id),"
+                " settings = COALESCE(?, settings), step1_data = COALESCE(?, step1_data)"
+                " WHERE session_id = ?",
+                (
+                    turn_no + 1, now, (settings or {}).get("project_id") or None,
+                    _pack(settings), _pack(step1_data), session_id,
+                ),
+            )
+            self._conn.commit()
+        return turn_no
+
+    def revise_turn(self, session_id, turn_no, response=None, meta=None):
+        """턴 수정을 revision 행으로 추가 (response: 교체 응답, meta: 덮어쓸 메타 키)"""
+        now = time.time()
+        with self._lock:
+            revision = self._conn.execute(
+                "SELECT MAX(revision) FROM turns WHERE session_id = ? AND turn_no = ?",
+                (session_id, turn_no),
+            ).fetchone()[0]
+            if revision is None:
+                return
+            self._conn.execute(
+                "INSERT INTO turns (session_id, turn_no, revision, created_at, response, meta)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, turn_no, revision + 1, now, _pack(response), _pack(meta or {})),
+            )
+            self._conn.execute("UPDATE sessions SET updated_at = ? WHERE session_id = ?", (now, session_id))
+            self._conn.commit()
+
+    def load_turns(self, session_id, start=0, end=None):
+        """
+        [start, end) 턴 (revision을 순서대로 병합한 최종 상태)
+        [{"turn_no", "user_input", "prompt", "response", "derived", "meta", "created_at"}]
+        """
+        query = (
+            "SELECT turn_no, revision, created_at, user_input, prompt, response, derived, meta"
+            " FROM turns WHERE session_id = ? AND turn_no >= ?"
+        )
+        params = [session_id, max(0, start)]
+        if end is not None:
+            query += " AND turn_no < ?"
+            params.append(end)
+        query += " ORDER BY turn_no, revision"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        turns = []
+        for turn_no, revision, created_at, user_input, prompt, response, derived, meta in rows:
+            if revision == 0:
+                turns.append({
+                    "turn_no": turn_no,
+                    "created_at": created_at,
+                    "user_input": user_input or "",
+                    "prompt": _unpack(prompt) or "",
+                    "response": _unpack(response) or "",
+                    "derived": _unpack(derived),
+                    "meta": _unpack(meta) or {},
+                })
+                continue
+            if not turns or turns[-1]["turn_no"] != turn_no:
+                continue
+            if response is not None:
+                turns[-1]["response"] = _unpack(response)
+            turns[-1]["meta"].update(_unpack(meta) or {})
+        return turns
+
+    def model_messages(self, session_id, start=0, end=None):
+        """히스토리 재구성용 model_messages 형식 [user(조합 프롬프트), assistant(응답), ...]"""
+        messages = []
+        for turn in self.load_turns(session_id, start, end):
+            messages.append({"role": "user", "content": turn["prompt"]})
+            messages.append({"role": "assistant", "content": turn["response"]})
+        return messages
+
+    def stats(self):
+        with self._lock:
+            sessions, turns = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(turns), 0) FROM sessions WHERE turns > 0"
+            ).fetchone()
+        return {"sessions": sessions, "turns": turns}
+
+
+_store = None
+_store_lock = threading.Lock()
+_store_loaded = False
+
+
+def get_session_store():
+    """프로세스 전체에서 공유하는 세션 저장소 (LG_SESSION_STORE_PATH가 빈 값이면 None)"""
+    global _store, _store_loaded
+    if not _store_loaded:
+        with _store_lock:
+            if not _store_loaded:
+                _store = SessionStore.from_env()
+                _store_loaded = True
+    return _store
@@ -0,0 +1,220 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Step 3 Derived Fields
+프롬프트 모듈의 표 / 상속 규칙만으로 결정되는 Step 3 핸드오프 필드를 설정값(applied_settings)에서 로컬로 계산
+
+- 표는 rules/step3_rules_v1.json (rules_version으로 버전 관리, 파일 mtime이 같으면 재사용, 표마다 출처 § 기록)
+- exterior_format / interior_format: §0.6 RATIO INHERITANCE [FORMAT MAPPING]
+- step1_data: §0.1 STEP 1 DATA INHERITANCE (Step 1 값 그대로)
+- secondary_color: §1.3 COLOR HARMONY (30% SECONDARY = Step 1 fashion_color)
+- housing_type / interior_style / room_types: Step 2 설정값 그대로
+- camera_meta: §2.2 DYNAMIC LENS LOGIC (주택 규모별 lens_mm_range, 룸별 eye_level_cm / camera_angle)
+  + §2.3 TILT-SHIFT (tilt_correction) - 표에 있는 키만, vanishing_lines와 default 높이/앵글은 모델이 생성
+light_kelvin 등 프롬프트에 완결된 조회 표가 없는 필드는 모델이 생성한다.
+모델에게는 이 필드를 생략하라고 지시하고(Derived_Fields 줄), 응답 JSON에서 빠진 값만 채워 최종 핸드오프를 만든다.
+"""
+
+import copy
+import itertools
+import json
+import os
+import re
+import threading
+
+from handoff_schema import merge_repair
+
+RULES_PATH = os.getenv(
+    "LG_STEP3_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules", "step3_rules_v1.json"),
+)
+DERIVED_FIELDS_PREFIX = "Derived_Fields: LOCAL"
+DERIVED_FIELDS_RE = re.compile(r"^Derived_Fields: LOCAL \(omit from the Step 3 JSON: (.+?); merged locally\)$", re.MULTILINE)
+
+_rules_lock = threading.Lock()
+_rules_memo = {"mtime": None, "rules": None}
+
+
+def get_rules():
+    """조회 표 (파일 mtime이 같으면 재사용)"""
+    mtime = os.stat(RULES_PATH).st_mtime_ns
+    with _rules_lock:
+        if _rules_memo["mtime"] != mtime:
+            with open(RULES_PATH, "r", encoding="utf-8") as f:
+                _rules_memo.update(mtime=mtime, rules=json.load(f))
+        return _rules_memo["rules"]
+
+
+def rules_version():
+    return get_rules()["rules_version"]
+
+
+def derive_formats(settings, rules=None):
+    """§0.6 FORMAT MAPPING → {"exterior_format", "interior_format"} (표에 없는 ratio는 exterior를 모델에 맡김)"""
+    mapping = (rules or get_rules())["format_mapping"]
+    formats = {}
+    ratio = str(settings.get("aspect_ratio") or "DEFAULT")
+    if ratio in mapping["exterior"]:
+        formats["exterior_format"] = mapping["exterior"][ratio]
+    formats["interior_format"] = mapping["interior"]
+    return formats
+
+
+def derive_camera(settings, rules=None):
+    """
+    §2.2 / §2.3 → 부분 camera_meta {"default": {...}, "overrides": {room: {...}}}
+    overrides는 높이 규칙이 있는 선택 룸만 (STUDIO는 같은 공간 4앵글이라 모델에 맡김)
+    """
+    table = (rules or get_rules())["camera"]
+    lens = table["lens_mm_range"].get(str(settings.get("housing_type") or ""))
+    base = {"lens_mm_range": lens} if lens else {}
+    base["tilt_correction"] = table["tilt_correction"]
+
+    camera = {"default": dict(base)}
+    if settings.get("housing_type") != "STUDIO":
+        overrides = {
+            room.lower(): {**table["room_height"][room], **base}
+            for room in settings.get("room_types") or []
+            if room in table["room_height"]
+        }
+        if overrides:
+            camera["overrides"] = overrides
+    return camera
+
+
+def _biometric_ids(step1_data):
+    if not isinstance(step1_data, dict):
+        return []
+    ids = step1_data.get("biometric_ids") or (step1_data.get("fixed") or {}).get("biometric_ids") or []
+    return [str(item) for item in ids if str(item).strip()]
+
+
+def derive_handoff(settings, step1_data=None, schema_version=None):
+    """
+    설정값에서 결정되는 핸드오프 필드 (Step 3 JSON과 같은 중첩 구조)
+    biometric_ids는 Step 1 JSON에 있을 때만 포함 (없으면 모델이 채움)
+    """
+    rules = get_rules()
+    inherited = {
+        "region": settings.get("region"),
+        "city": str(settings.get("city") or "").split(" (")[0],
+        "season": settings.get("season"),
+        "model_age": int(settings.get("age") or 0),
+        "occupation": settings.get("occupation"),
+        "fashion_color": settings.get("fashion_color"),
+        "fashion_color_name": settings.get("fashion_color_name"),
+    }
+    biometric_ids = _biometric_ids(step1_data)
+    if biometric_ids:
+        inherited["biometric_ids"] = biometric_ids
+
+    step2 = {
+        "housing_type": settings.get("housing_type"),
+        "interior_style": settings.get("interior_style"),
+        "secondary_color": settings.get("fashion_color"),
+        **derive_formats(settings, rules),
+    }
+    if settings.get("housing_type") != "STUDIO":
+        step2["room_types"] = list(settings.get("room_types") or [])
+    step2["camera_meta"] = derive_camera(settings, rules)
+
+    derived = {"project_id": settings.get("project_id"), "step1_data": inherited, "step2_data": step2}
+    if schema_version:
+        derived = {"schema_version": schema_version, **derived}
+    return derived
+
+
+def derived_paths(derived, prefix=""):
+    """["schema_version", "step1_data.region", "step2_data.camera_meta.default.tilt_correction", ...] - 모델이 생략할 필드 경로"""
+    paths = []
+    for key, value in derived.items():
+        if isinstance(value, dict):
+            paths.extend(derived_paths(value, f"{prefix}{key}."))
+        else:
+            paths.append(f"{prefix}{key}")
+    return paths
+
+
+def _field_parts(node):
+    """중첩 dict → 경로 조각 목록 - 연속된 말단 키, 같은 하위 구조의 형제 키를 {a, b}로 묶음"""
+    runs = []
+    for key, value in node.items():
+        signature = tuple(_field_parts(value)) if isinstance(value, dict) else None
+        if runs and runs[-1][0] == signature:
+            runs[-1][1].append(key)
+        else:
+            runs.append((signature, [key]))
+    parts = []
+    for signature, keys in runs:
+        head = keys[0] if len(keys) == 1 else f"{{{', '.join(keys)}}}"
+        if signature is None:
+            parts.append(head)
+        else:
+            parts.extend(f"{head}.{child}" for child in signature)
+    return parts
+
+
+def derived_fields_line(derived):
+    """
+    조합 프롬프트에 넣는 생략 지시 한 줄 (대화 기록에 턴마다 남으므로 짧게)
+    예: step2_data.camera_meta.overrides.{kitchen, living}.{eye_level_cm, camera_angle}
+    """
+    parts = []
+    for part in _field_parts(derived):
+        # 최상위 말단 키는 묶지 않고 그대로 나열
+        if part.startswith("{") and "." not in part:
+            parts.extend(key.strip() for key in part[1:-1].split(","))
+        else:
+            parts.append(part)
+    return f"{DERIVED_FIELDS_PREFIX} (omit from the Step 3 JSON: {', '.join(parts)}; merged locally)"
+
+
+def parse_derived_fields_line(prompt):
+    """조합 프롬프트의 Derived_Fields 줄 → 필드 경로 목록 (없으면 [], {a, b} 조각은 모든 조합으로 펼침)"""
+    match = DERIVED_FIELDS_RE.search(prompt or "")
+    if not match:
+        return []
+    paths = []
+    for part in re.findall(r"(?:\w+|\{[^}]*\})(?:\.(?:\w+|\{[^}]*\}))*", match.group(1)):
+        segments = [
+            [key.strip() for key in segment[1:-1].split(",") if key.strip()] if segment.startswith("{") else [segment]
+            for segment in re.findall(r"\{[^}]*\}|\w+", part)
+        ]
+        paths.extend(".".join(keys) for keys in itertools.product(*segments))
+    return paths
+
+
+def fill_missing(data, defaults):
+    """defaults 중 data에 없는(또는 None인) 값만 재귀로 채운 사본 - 이미 있는 값은 유지"""
+    filled = copy.deepcopy(data)
+
+    def fill(target, source):
+        for key, value in source.items():
+            if isinstance(value, dict) and isinstance(target.get(key), dict):
+                fill(target[key], value)
+            elif target.get(key) is None:
+                target[key] = copy.deepcopy(value)
+
+    fill(filled, defaults)
+    return filled
+
+
+def merge_derived(json_data, derived, override=False):
+    """
+    모델 JSON에 계산값 병합 (모델 JSON이 없으면 만들지 않음)
+    기본은 모델이 생략한 필드만 채움 - override=True면 계산값으로 덮어씀
+    """
+    if not isinstance(json_data, dict) or not derived:
+        return json_data
+    return merge_repair(json_data, derived) if override else fill_missing(json_data, derived)
+
+
+def omit_paths(json_data, paths):
+    """JSON에서 경로 목록의 필드 제거 (사본 반환, 중첩 경로 지원) - 절감량 측정 / Fake 백엔드용"""
+    trimmed = copy.deepcopy(json_data)
+    for path in paths:
+        *parents, key = path.split(".")
+        target = trimmed
+        for parent in parents:
+            target = target.get(parent) if isinstance(target, dict) else None
+        if isinstance(target, dict):
+            target.pop(key, None)
+    return trimmed
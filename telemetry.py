@@ -0,0 +1,311 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Telemetry
+요청 단위 지연/토큰/캐시 계측
+
+- 단계(session / generate / parse / render)별 wall time, TTFT, usage_metadata 토큰 수,
+  요청 제한 대기 시간/재시도 수, 히스토리 크기, 핸드오프 파싱 결과, 모델명, 프롬프트 버전/해시를 요청마다 한 레코드로 기록
+- 완료된 레코드는 JSONL 로그에 한 줄씩 추가하고 Prometheus 텍스트 스냅샷 파일을 갱신
+  (node_exporter textfile collector 등으로 수집)
+- 현재 프로세스의 최근 요청으로 p50/p95 계산 (사이드바 패널)
+
+사용 예:
+    python telemetry.py                              # 기본 JSONL 로그 → Prometheus 텍스트
+    python telemetry.py .cache/telemetry.jsonl
+"""
+
+import json
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+DEFAULT_LOG_PATH = os.path.join(CACHE_DIR, "telemetry.jsonl")
+DEFAULT_PROM_PATH = os.path.join(CACHE_DIR, "metrics.prom")
+DEFAULT_WINDOW = 500
+
+METRIC_PREFIX = "lg_step2"
+QUANTILES = (0.5, 0.95)
+STAGES = ("session", "generate", "parse", "render")
+
+
+def percentile(values, q):
+    """nearest-rank 백분위 (값이 없으면 None)"""
+    ordered = sorted(v for v in values if v is not None)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(q * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def usage_counts(response):
+    """SDK 응답의 usage_metadata → (prompt, output, total) 토큰 수 (없으면 None)"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    total_tokens = getattr(usage, "total_token_count", 0) or prompt_tokens + output_tokens
+    return prompt_tokens, output_tokens, total_tokens
+
+
+class RequestTrace:
+    """요청 하나의 계측 레코드 (finish 시 Telemetry에 기록)"""
+
+    def __init__(self, telemetry, **fields):
+        self.telemetry = telemetry
+        self._started = time.perf_counter()
+        self._finished = False
+        self.record = {
+            "ts": round(time.time(), 3),
+            "request_id": uuid.uuid4().hex[:12],
+            **fields,
+            "status": "ok",
+            "cached": False,
+            "total_ms": None,
+            "ttft_ms": None,
+            "queue_wait_ms": None,
+            "retries": 0,
+            "stages_ms": {},
+            "prompt_tokens": None,
+            "output_tokens": None,
+            "total_tokens": None,
+            "parse_ok": None,
+            "schema_errors": None,
+            "qa_failures": None,
+            "error": None,
+        }
+
+    @contextmanager
+    def stage(self, name):
+        """단계 wall time 측정 (같은 단계가 반복되면 누적)"""
+        started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            stages = self.record["stages_ms"]
+            stages[name] = round(stages.get(name, 0.0) + elapsed, 1)
+
+    def first_token(self):
+        """첫 토큰 수신 시점 기록 (최초 호출만 반영, 스트리밍 응답에서만 호출)"""
+        if self.record["ttft_ms"] is None:
+            self.record["ttft_ms"] = round((time.perf_counter() - self._started) * 1000, 1)
+
+    def add_usage(self, response):
+        """응답의 usage_metadata 토큰 수 누적 (fan-out 하위 요청은 합산)"""
+        counts = usage_counts(response)
+        if counts is None:
+            return
+        for key, value in zip(("prompt_tokens", "output_tokens", "total_tokens"), counts):
+            self.record[key] = (self.record[key] or 0) + value
+
+    def update(self, **fields):
+        self.record.update(fields)
+
+    def finish(self, status=None, error=None):
+        if self._finished:
+            return self.record
+        self._finished = True
+        self.record["total_ms"] = round((time.perf_counter() - self._started) * 1000, 1)
+        if error is not None:
+            self.record["status"] = "error"
+            self.record["error"] = f"{type(error).__name__}: {error}" if isinstance(error, Exception) else str(error)
+        elif status:
+            self.record["status"] = status
+        if self.telemetry is not None:
+            self.telemetry.record(self.record)
+        return self.record
+
+
+class Telemetry:
+    """프로세스 전체 계측 집계 (스레드 안전)"""
+
+    def __init__(self, log_path=DEFAULT_LOG_PATH, prom_path=DEFAULT_PROM_PATH, window=DEFAULT_WINDOW):
+        self.log_path = log_path
+        self.prom_path = prom_path
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self._requests = Counter()
+        self._tokens = Counter()
+        self._parse_failures = 0
+        self._cache_hits = 0
+        self._latency_sum = 0.0
+        self._retries = 0
+        self._info = {}
+        self._last_history_tokens = 0
+
+    @classmethod
+    def from_env(cls):
+        """LG_TELEMETRY_* 환경변수로 설정 (LG_TELEMETRY_LOG_PATH / PROM_PATH를 비우면 파일 기록 안 함)"""
+        return cls(
+            log_path=os.getenv("LG_TELEMETRY_LOG_PATH", DEFAULT_LOG_PATH) or None,
+            prom_path=os.getenv("LG_TELEMETRY_PROM_PATH", DEFAULT_PROM_PATH) or None,
+            window=int(os.getenv("LG_TELEMETRY_WINDOW", DEFAULT_WINDOW)),
+        )
+
+    def start(self, **fields):
+        return RequestTrace(self, **fields)
+
+    def record(self, record, write=True):
+        with self._lock:
+            self._aggregate(record)
+            if write and self.log_path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if write and self.prom_path:
+                self._write_prometheus()
+
+    def _aggregate(self, record):
+        self._recent.append(record)
+        model = record.get("model", "")
+        self._requests[(model, record.get("mode", ""), record.get("status", ""))] += 1
+        for key in ("prompt_tokens", "output_tokens"):
+            self._tokens[(model, key)] += record.get(key) or 0
+        if record.get("parse_ok") is False:
+            self._parse_failures += 1
+        if record.get("cached"):
+            self._cache_hits += 1
+        self._latency_sum += record.get("total_ms") or 0.0
+        self._retries += record.get("retries") or 0
+        if record.get("history_tokens") is not None:
+            self._last_history_tokens = record["history_tokens"]
+        if record.get("prompt_version"):
+            self._info = {"prompt_version": record["prompt_version"], "prompt_hash": record.get("prompt_hash", "")}
+
+    def _write_prometheus(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.prom_path)), exist_ok=True)
+        tmp_path = self.prom_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self._prometheus_text())
+        os.replace(tmp_path, self.prom_path)
+
+    def summary(self):
+        """최근 요청(window) 기준 p50/p95 요약"""
+        with self._lock:
+            recent = list(self._recent)
+        live = [r for r in recent if not r.get("cached")]
+        parsed = [r for r in recent if r.get("parse_ok") is not None]
+        return {
+            "requests": len(recent),
+            "latency_p50_ms": percentile([r.get("total_ms") for r in live], 0.5),
+            "latency_p95_ms": percentile([r.get("total_ms") for r in live], 0.95),
+            "ttft_p50_ms": percentile([r.get("ttft_ms") for r in live], 0.5),
+            "ttft_p95_ms": percentile([r.get("ttft_ms") for r in live], 0.95),
+            "queue_wait_p95_ms": percentile([r.get("queue_wait_ms") for r in live], 0.95),
+            "output_tokens_p50": percentile([r.get("output_tokens") for r in live], 0.5),
+            "parse_failure_rate": (
+                sum(1 for r in parsed if not r["parse_ok"]) / len(parsed) if parsed else 0.0
+            ),
+            "cache_hits": sum(1 for r in recent if r.get("cached")),
+            "errors": sum(1 for r in recent if r.get("status") == "error"),
+        }
+
+    def prometheus_text(self):
+        with self._lock:
+            return self._prometheus_text()
+
+    def _prometheus_text(self):
+        p = METRIC_PREFIX
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+
+        def labels(**kv):
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in kv.items()) + "}"
+
+        if self._info:
+            header("prompt_info", "gauge", "Active prompt set version and hash.")
+            lines.append(f"{p}_prompt_info{labels(**self._info)} 1")
+
+        header("requests_total", "counter", "Generation requests by model, mode and status.")
+        for (model, mode, status), count in sorted(self._requests.items()):
+            lines.append(f"{p}_requests_total{labels(model=model, mode=mode, status=status)} {count}")
+
+        header("tokens_total", "counter", "Tokens reported by usage_metadata.")
+        for (model, kind), count in sorted(self._tokens.items()):
+            lines.append(f"{p}_tokens_total{labels(model=model, kind=kind.replace('_tokens', ''))} {count}")
+
+        header("handoff_parse_failures_total", "counter", "Responses without a parseable Step 3 JSON block.")
+        lines.append(f"{p}_handoff_parse_failures_total {self._parse_failures}")
+
+        header("cache_hits_total", "counter", "Requests answered from the response cache.")
+        lines.append(f"{p}_cache_hits_total {self._cache_hits}")
+
+        header("history_tokens", "gauge", "Estimated chat history tokens sent with the last request.")
+        lines.append(f"{p}_history_tokens {self._last_history_tokens}")
+
+        recent = list(self._recent)
+        live = [r for r in recent if not r.get("cached")]
+        header("request_latency_ms", "summary", "End-to-end request wall time (recent window quantiles).")
+        for q in QUANTILES:
+            value = percentile([r.get("total_ms") for r in live], q)
+            lines.append(f"{p}_request_latency_ms{labels(quantile=q)} {_number(value)}")
+        lines.append(f"{p}_request_latency_ms_sum {round(self._latency_sum, 1)}")
+        lines.append(f"{p}_request_latency_ms_count {sum(self._requests.values())}")
+
+        header("ttft_ms", "summary", "Time to first token (recent window quantiles).")
+        for q in QUANTILES:
+            value = percentile([r.get("ttft_ms") for r in live], q)
+            lines.append(f"{p}_ttft_ms{labels(quantile=q)} {_number(value)}")
+
+        header("queue_wait_ms", "summary", "Time spent waiting in the shared rate limiter queue (recent window quantiles).")
+        for q in QUANTILES:
+            value = percentile([r.get("queue_wait_ms") for r in live], q)
+            lines.append(f"{p}_queue_wait_ms{labels(quantile=q)} {_number(value)}")
+
+        header("retries_total", "counter", "Model calls retried after a retryable error.")
+        lines.append(f"{p}_retries_total {self._retries}")
+
+        header("stage_latency_ms", "summary", "Per-stage wall time (recent window quantiles).")
+        for stage in STAGES:
+            for q in QUANTILES:
+                value = percentile([r.get("stages_ms", {}).get(stage) for r in recent], q)
+                lines.append(f"{p}_stage_latency_ms{labels(stage=stage, quantile=q)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return "NaN" if value is None else value
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    """프로세스 전체에서 공유하는 계측 인스턴스"""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = Telemetry.from_env()
+    return _telemetry
+
+
+def load_log(path):
+    """JSONL 로그 → 집계된 Telemetry (파일 기록 없음, window 제한 없음)"""
+    telemetry = Telemetry(log_path=None, prom_path=None, window=None)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                telemetry.record(json.loads(line), write=False)
+    return telemetry
+
+
+if __name__ == "__main__":
+    log_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_LOG_PATH
+    if not os.path.exists(log_path):
+        raise SystemExit(f"텔레메트리 로그가 없습니다: {log_path}")
+    sys.stdout.write(load_log(log_path).prometheus_text())
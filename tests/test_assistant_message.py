@@ -0,0 +1,40 @@
+"""core.make_assistant_message - 응답을 한 번 파싱해 표시용 필드를 함께 저장"""
+
+from core import default_settings, derived_handoff, make_assistant_message
+from fake_responses import render_canned_response
+
+
+def test_canned_response_parsed_once_into_display_fields():
+    content = render_canned_response("")
+    msg = make_assistant_message(content)
+
+    assert msg["role"] == "assistant"
+    assert msg["content"] == content
+    assert msg["json_data"]["project_id"] == "LG_AD_2026_STEP2_01"
+    assert msg["schema_errors"] == []
+    # 핸드오프 블록은 본문에서 빠지고 나머지 섹션은 남음
+    assert '"step2_data"' not in msg["text_content"]
+    assert "2.2 인테리어 4-쿼드런트" in msg["text_content"]
+    assert msg["title"] == "2.1 외관 프롬프트(배경) [마크다운]"
+
+
+def test_response_without_json_keeps_text():
+    msg = make_assistant_message("수정 사항을 확인했습니다.\n\n다음 턴에 반영합니다.")
+
+    assert msg["json_data"] is None
+    assert msg["schema_errors"] == []
+    assert msg["text_content"].startswith("수정 사항을 확인했습니다.")
+    assert msg["title"] == "수정 사항을 확인했습니다."
+
+
+def test_derived_fields_fill_omitted_values():
+    settings = dict(default_settings(), derive_fields=True, aspect_ratio="9:16")
+    derived = derived_handoff(settings)
+    content = render_canned_response("")
+    # 모델이 exterior_format을 생략한 응답
+    content = content.replace('"exterior_format": "4:5",', "")
+
+    msg = make_assistant_message(content, derived)
+
+    assert msg["json_data"]["step2_data"]["exterior_format"] == "9:16"
+    assert msg["content"] == content
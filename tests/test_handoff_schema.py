@@ -0,0 +1,70 @@
+"""handoff_schema - 필드 단위 검증과 부분 보완 병합"""
+
+import copy
+
+import pytest
+
+from core import make_assistant_message
+from fake_responses import render_canned_response
+from handoff_schema import build_repair_prompt, merge_repair, repair_targets, validate_handoff
+
+
+@pytest.fixture
+def handoff():
+    return make_assistant_message(render_canned_response(""))["json_data"]
+
+
+@pytest.fixture
+def broken(handoff):
+    data = copy.deepcopy(handoff)
+    del data["step2_data"]["light_kelvin"]
+    data["step2_data"]["camera_meta"]["default"]["eye_level_cm"] = "high"
+    return data
+
+
+def test_errors_report_field_paths(broken):
+    errors = {error["path"]: error["validator"] for error in validate_handoff(broken)}
+
+    assert errors == {
+        "step2_data.light_kelvin": "required",
+        "step2_data.camera_meta.default.eye_level_cm": "type",
+    }
+
+
+def test_repair_prompt_requests_only_invalid_fields(broken):
+    prompt = build_repair_prompt(broken, validate_handoff(broken))
+    fields = prompt.split("[FIELDS_TO_RETURN]", 1)[1]
+
+    assert "step2_data.light_kelvin" in fields
+    assert "step2_data.camera_meta.default.eye_level_cm" in fields
+    assert "step2_data.room_types" not in fields
+
+
+def test_array_errors_target_whole_array():
+    errors = [{"path": "step2_data.room_types[1]", "parts": ["step2_data", "room_types", 1]}]
+
+    assert repair_targets(errors) == [["step2_data", "room_types"]]
+
+
+def test_partial_repairs_merge_until_valid(handoff, broken):
+    first = merge_repair(broken, {"step2_data": {"light_kelvin": 2700}})
+    assert [error["path"] for error in validate_handoff(first)] == ["step2_data.camera_meta.default.eye_level_cm"]
+    # 다른 형제 필드는 그대로
+    assert first["step2_data"]["camera_meta"]["default"]["lens_mm_range"] == "24-35mm"
+
+    second = merge_repair(first, {"step2_data": {"camera_meta": {"default": {"eye_level_cm": 120}}}})
+    assert validate_handoff(second) == []
+    assert second == handoff
+
+
+def test_merge_repair_does_not_mutate_input(broken):
+    before = copy.deepcopy(broken)
+
+    merge_repair(broken, {"step2_data": {"light_kelvin": 2700}})
+
+    assert broken == before
+
+
+def test_merge_repair_ignores_non_object_patch(broken):
+    assert merge_repair(broken, ["not", "a", "patch"]) == broken
+    assert merge_repair(broken, None) == broken
@@ -0,0 +1,74 @@
+"""handoff_store - 내용 주소 기반 저장, 중복 집계, 인덱스 조회"""
+
+import io
+import json
+
+import pytest
+
+from handoff_store import HandoffStore, handoff_hash
+
+
+def make_handoff(project_id, city="Paris", style="PARIS_STYLE", room="Kitchen"):
+    return {
+        "project_id": project_id,
+        "step1_data": {"city": city},
+        "step2_data": {"interior_style": style},
+        "room_target": {"room_type": room},
+    }
+
+
+@pytest.fixture
+def store():
+    return HandoffStore(":memory:")
+
+
+def test_same_content_is_stored_once(store):
+    first = make_handoff("P1")
+    # 키 순서가 달라도 정규화 JSON이 같으면 같은 hash
+    reordered = {key: first[key] for key in reversed(list(first))}
+
+    keys = [store.put(first), store.put(reordered), store.put(make_handoff("P2"))]
+
+    assert keys[0] == keys[1] == handoff_hash(first)
+    assert store.stats() == {"entries": 2, "duplicates": 1}
+    assert store.get(keys[0]) == first
+    assert {row["project_id"]: row["seen"] for row in store.find()} == {"P1": 2, "P2": 1}
+
+
+def test_put_many_counts_duplicates_in_one_batch(store):
+    handoffs = [make_handoff("P1"), make_handoff("P1"), "not a dict", make_handoff("P2"), make_handoff("P1")]
+
+    keys = store.put_many(handoffs)
+
+    assert len(keys) == 4
+    assert store.stats() == {"entries": 2, "duplicates": 2}
+
+
+def test_invalid_handoffs_are_not_stored(store):
+    assert store.put(None) is None
+    assert store.put(make_handoff("P1"), schema_errors=[{"path": "step2_data"}]) is None
+    assert store.stats() == {"entries": 0, "duplicates": 0}
+
+
+def test_index_filters_and_export(store):
+    store.put_many([
+        make_handoff("P1", city="Paris", room="Kitchen"),
+        make_handoff("P2", city="Seoul", room="Living"),
+        make_handoff("P3", city="Paris", style="JAPANDI", room="KITCHEN"),
+    ])
+
+    assert store.count(city="Paris") == 2
+    assert store.count(city="Paris", room_type="kitchen") == 2
+    assert store.count(city="Paris", interior_style="JAPANDI") == 1
+    assert [row["project_id"] for row in store.find(room_type="Kitchen")] == ["P3", "P1"]
+    assert store.facets("city") == [("Paris", 2), ("Seoul", 1)]
+
+    out = io.StringIO()
+    assert store.export_ndjson(out, city="Paris") == 2
+    assert [json.loads(line)["project_id"] for line in out.getvalue().splitlines()] == ["P1", "P3"]
+
+
+def test_iter_json_pages_through_all_rows(store):
+    store.put_many(make_handoff(f"P{index}") for index in range(7))
+
+    assert len(list(store.iter_json(batch=3))) == 7
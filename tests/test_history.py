@@ -0,0 +1,55 @@
+"""history - Step 1 블록 중복 제거와 토큰 예산 기반 턴 제외"""
+
+from core import build_combined_prompt, default_settings
+from fake_responses import render_canned_response
+from history import (
+    STEP1_BLOCK_OMITTED,
+    _render,
+    build_compact_history,
+    dedupe_step1_blocks,
+    history_tokens,
+    pair_turns,
+)
+
+STEP1 = {"project_id": "P1", "city": "Seoul", "scenes": [{"id": index, "note": "oak " * 20} for index in range(20)]}
+
+
+def make_messages(n_turns):
+    settings = default_settings()
+    response = render_canned_response(build_combined_prompt(settings, STEP1, ""))
+    messages = []
+    for turn in range(n_turns):
+        messages.append({"role": "user", "content": build_combined_prompt(settings, STEP1, f"turn {turn}")})
+        messages.append({"role": "assistant", "content": f"{response}\nturn {turn}"})
+    return messages
+
+
+def test_dedupe_keeps_first_step1_block_only():
+    prompt = build_combined_prompt(default_settings(), STEP1, "again")
+    seen = set()
+
+    assert dedupe_step1_blocks(prompt, seen) is prompt
+    deduped = dedupe_step1_blocks(prompt, seen)
+    assert STEP1_BLOCK_OMITTED in deduped
+    assert '"scenes"' not in deduped
+    assert dedupe_step1_blocks("no block", seen) == "no block"
+
+
+def test_budget_drops_oldest_turns_like_uncached_render():
+    messages = make_messages(12)
+    turns = pair_turns(messages)
+    budget = history_tokens(_render(turns[5:], 2))
+
+    history = build_compact_history(messages, token_budget=budget)
+
+    # 메모를 쓰지 않은 렌더링과 같은 결과 (예산 안에 드는 가장 이른 시작 턴 = 5)
+    assert history == _render(turns[5:], 2)
+    assert history_tokens(history) <= budget
+    assert history[0]["parts"][0].endswith("turn 5")
+    assert '"scenes"' in history[0]["parts"][0]
+
+
+def test_history_within_budget_is_unchanged():
+    messages = make_messages(3)
+
+    assert build_compact_history(messages) == _render(pair_turns(messages), 2)
@@ -0,0 +1,111 @@
+"""ingest - 스트리밍 JSON 값 분리, 입력 경로 순회, 검증 / 중복 제거"""
+
+import io
+import json
+
+import pytest
+
+from ingest import (
+    DUPLICATE_CONTENT,
+    DUPLICATE_PROJECT,
+    INVALID_JSON,
+    INVALID_STEP1,
+    ingest,
+    iter_json_values,
+    iter_step1_documents,
+)
+
+
+def step1(project_id, **overrides):
+    data = {
+        "project_id": project_id,
+        "region": "EU",
+        "city": "Paris",
+        "season": "WINTER",
+        "model_age": 35,
+        "occupation": "Gallery Curator",
+        "fashion_color": "#C19A6B",
+        "fashion_color_name": "Camel",
+        "biometric_ids": ["bio_001"],
+    }
+    data.update(overrides)
+    return data
+
+
+def values(text, chunk_size=4):
+    return list(iter_json_values(io.StringIO(text), chunk_size=chunk_size))
+
+
+def test_single_value_and_top_level_array():
+    assert values('{"a": 1}') == [{"a": 1}]
+    assert values('[{"a": 1}, {"b": [1, 2]}, 3]') == [{"a": 1}, {"b": [1, 2]}, 3]
+
+
+def test_concatenated_values_across_small_chunks():
+    text = '{"a": "x"}\n{"b": 2}, {"c": [1, 2, 3]}   12345 true'
+
+    assert values(text) == [{"a": "x"}, {"b": 2}, {"c": [1, 2, 3]}, 12345, True]
+
+
+def test_number_split_at_chunk_boundary_is_not_truncated():
+    # 청크 경계에서 "1234" 까지만 읽혀도 뒤 숫자까지 이어 디코딩
+    assert values("1234567 89", chunk_size=4) == [1234567, 89]
+
+
+def test_malformed_value_raises_after_valid_prefix():
+    stream = iter_json_values(io.StringIO('{"a": 1} {"b": '), chunk_size=4)
+
+    assert next(stream) == {"a": 1}
+    with pytest.raises(json.JSONDecodeError):
+        next(stream)
+
+
+def test_documents_from_directory_tree(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.json").write_text(json.dumps([step1("P1"), step1("P2")]), encoding="utf-8")
+    (tmp_path / "sub" / "b.ndjson").write_text(json.dumps(step1("P3")) + "\n\n{bad\n", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("ignored", encoding="utf-8")
+
+    documents = [(source.replace(str(tmp_path), ""), value, error) for source, value, error in
+                 iter_step1_documents(str(tmp_path))]
+
+    assert [source for source, _, _ in documents] == ["/a.json#0", "/a.json#1", "/sub/b.ndjson:1", "/sub/b.ndjson:3"]
+    assert [value["project_id"] for _, value, _ in documents[:3]] == ["P1", "P2", "P3"]
+    assert documents[3][1] is None and documents[3][2].startswith("JSON 파싱 오류")
+
+
+def test_ingest_counts_rejections(tmp_path):
+    path = tmp_path / "step1.json"
+    path.write_text(
+        "\n".join(json.dumps(item) for item in [
+            step1("P1"),
+            step1("P1"),
+            step1("P1", city="Lyon"),
+            step1("P2", fashion_color="camel"),
+            step1("P3"),
+        ]) + '\n{"broken": ',
+        encoding="utf-8",
+    )
+    queue, rejects = io.StringIO(), io.StringIO()
+
+    counts = ingest(str(path), queue, rejects)
+
+    assert counts == {
+        "accepted": 2,
+        INVALID_JSON: 1,
+        INVALID_STEP1: 1,
+        DUPLICATE_CONTENT: 1,
+        DUPLICATE_PROJECT: 1,
+    }
+    assert [json.loads(line)["project_id"] for line in queue.getvalue().splitlines()] == ["P1", "P3"]
+    reasons = [json.loads(line)["reason"] for line in rejects.getvalue().splitlines()]
+    assert reasons == [DUPLICATE_CONTENT, DUPLICATE_PROJECT, INVALID_STEP1, INVALID_JSON]
+
+
+def test_allow_duplicate_project_id(tmp_path):
+    path = tmp_path / "step1.ndjson"
+    path.write_text(json.dumps(step1("P1")) + "\n" + json.dumps(step1("P1", city="Lyon")) + "\n", encoding="utf-8")
+
+    counts = ingest(str(path), io.StringIO(), dedupe_project_id=False)
+
+    assert counts["accepted"] == 2
@@ -0,0 +1,51 @@
+"""model_catalog - 디스크 저장 실패 시에도 single-flight 조회가 풀리는지"""
+
+import threading
+
+from backends import FakeBackend
+from model_catalog import ModelCatalog
+
+# 루트 권한에서도 쓸 수 없는 경로
+UNWRITABLE_PATH = "/proc/nonexistent/model_catalog.json"
+
+
+def call_with_timeout(fn, timeout=5):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=fn()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "조회가 끝나지 않음 (in-flight 키가 남음)"
+    return result["value"]
+
+
+def wait_until(predicate, interval=0.01):
+    event = threading.Event()
+    while not predicate():
+        event.wait(interval)
+    return True
+
+
+def test_refresh_survives_unwritable_cache_path():
+    catalog = ModelCatalog(path=UNWRITABLE_PATH)
+    backend = FakeBackend()
+
+    assert catalog.refresh(backend, "") == backend.list_models()
+    assert call_with_timeout(lambda: catalog.refresh(backend, "")) == backend.list_models()
+    assert catalog.fetches == 2
+    assert catalog.save_errors == 2
+    assert catalog.info(backend, "")["refreshing"] is False
+
+
+def test_stale_entry_keeps_refreshing_after_save_error():
+    catalog = ModelCatalog(path=UNWRITABLE_PATH, ttl_s=0)
+    backend = FakeBackend()
+
+    assert catalog.get(backend, "") == backend.list_models()
+    for _ in range(2):
+        # 만료된 목록은 즉시 반환하고 백그라운드 갱신 - 저장 실패 후에도 다시 갱신됨
+        fetches = catalog.fetches
+        assert catalog.get(backend, "") == backend.list_models()
+        call_with_timeout(lambda: wait_until(
+            lambda: catalog.fetches > fetches and not catalog.info(backend, "")["refreshing"]
+        ))
+
@@ -0,0 +1,84 @@
+"""prompt_compiler - 표 축약과 컴파일본 보존 검증"""
+
+import os
+
+import pytest
+
+from prompt import PROMPT_FILES, PROMPTS_DIR, clean_prompt_text
+from prompt_compiler import check_compiled, compact_table, compile_prompts, minify_module, verify_module
+
+MODULE = "\n".join([
+    "# ==========",
+    "# 섹션 1: 테스트 규칙",
+    "# ==========",
+    "",
+    "## §1.1 비율",
+    "━━━━━━━━━━━━",
+    "exterior_format은 Step 1 비율을 따른다.",
+    "┌──────┬──────────┐",
+    "│ 비율 │ 포맷     │",
+    "├──────┼──────────┤",
+    "│ 9:16 │ VERTICAL │",
+    "│      │ 세로형   │",
+    "└──────┴──────────┘",
+    "",
+    "## §1.2 룸",
+    "├── room_types는 PARIS_STYLE 인테리어에서도 유지",
+    "└── 마지막 항목",
+])
+
+
+@pytest.fixture
+def compiled():
+    return minify_module("99_test.md", MODULE)
+
+
+def test_compact_table_merges_wrapped_cells():
+    rows = compact_table([
+        "┌────┬────┐",
+        "│ a  │ b  │",
+        "├────┼────┤",
+        "│ 가 │ 나 │",
+        "│    │ 다 │",
+        "└────┴────┘",
+    ])
+
+    assert rows == ["a | b", "가 | 나 다"]
+
+
+def test_minify_strips_decoration_and_keeps_content(compiled):
+    assert "━━━" not in compiled
+    assert "9:16 | VERTICAL 세로형" in compiled
+    assert "- room_types는 PARIS_STYLE 인테리어에서도 유지" in compiled
+    assert verify_module("99_test.md", MODULE, compiled) == []
+
+
+def test_verify_reports_missing_terms_and_words(compiled):
+    damaged = compiled.replace("PARIS_STYLE", "").replace("세로형", "")
+
+    problems = verify_module("99_test.md", MODULE, damaged)
+
+    assert any("누락된 용어" in problem and "PARIS_STYLE" in problem for problem in problems)
+    assert any("누락된 단어" in problem and "세로형" in problem for problem in problems)
+
+
+def test_verify_reports_section_reorder(compiled):
+    preamble, rest = compiled.split("## §1.1")
+    first, second = rest.split("## §1.2")
+    reordered = preamble + "## §1.2" + second + "\n\n## §1.1" + first
+
+    problems = verify_module("99_test.md", MODULE, reordered)
+
+    assert problems == ["99_test.md: 섹션 구조 불일치 (3 → 3)"]
+
+
+def test_shipped_prompts_compile_without_loss_and_are_current():
+    results, problems = compile_prompts()
+
+    assert problems == []
+    assert [result["filename"] for result in results] == PROMPT_FILES
+    assert check_compiled(results) == []
+    for result in results:
+        with open(os.path.join(PROMPTS_DIR, result["filename"]), "r", encoding="utf-8") as f:
+            source = clean_prompt_text(f.read())
+        assert result["compiled_bytes"] < len(source.encode("utf-8"))
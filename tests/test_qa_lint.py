@@ -0,0 +1,102 @@
+"""qa_lint - §10 QA 규칙의 로컬 판정"""
+
+import json
+
+import pytest
+
+from core import build_combined_prompt, default_settings
+from fake_responses import render_canned_response
+from qa_lint import lint_response, main, qa_summary
+
+
+@pytest.fixture
+def settings():
+    return default_settings()
+
+
+@pytest.fixture
+def response():
+    return render_canned_response("")
+
+
+def failed(findings):
+    return {finding["id"]: finding["detail"] for finding in findings if not finding["ok"]}
+
+
+def test_canned_response_passes_all_checks(settings, response):
+    findings = lint_response(response, settings)
+
+    assert failed(findings) == {}
+    assert qa_summary(findings) == {"passed": 8, "total": 8, "errors": 0, "warnings": 0}
+
+
+def test_aspect_ratio_mismatch(settings, response):
+    findings = lint_response(response, dict(settings, aspect_ratio="16:9"))
+
+    detail = failed(findings)["aspect_ratio"]
+    assert "exterior_format 4:5 ≠ 16:9" in detail
+    assert "'16:9 format'" in detail
+
+
+def test_missing_quadrant_and_json_room(settings, response):
+    response = response.replace("Lower-right quadrant - LAUNDRY", "Lower-right corner - LAUNDRY")
+    response = response.replace('"Laundry"\n', '"Bathroom"\n')
+
+    detail = failed(lint_response(response, settings))["quadrants"]
+
+    assert "쿼드런트 누락: Laundry" in detail
+    assert "JSON room_types 누락: Laundry" in detail
+
+
+def test_forbidden_keyword_and_negative_without_borders(settings, response):
+    response = response.replace("edge-to-edge without borders", "as a 2x2 grid")
+    response = response.replace("white borders, dividing lines, ", "")
+
+    problems = failed(lint_response(response, settings))
+
+    assert "금지 키워드 '2x2 grid'" in problems["seamless"]
+    assert problems["negative"] == "경계선 금지(borders / dividing lines) 없음"
+
+
+def test_tropical_climate_conflict_is_warning(settings, response):
+    findings = lint_response(response, dict(settings, climate_type="Tropical"))
+
+    season = next(finding for finding in findings if finding["id"] == "season")
+    assert not season["ok"]
+    assert season["severity"] == "warning"
+    assert qa_summary(findings)["errors"] == 0
+
+
+def test_json_override_replaces_parsed_handoff(settings, response):
+    findings = lint_response(response, settings, json_data={})
+
+    problems = failed(findings)
+    assert problems["handoff"] == "JSON 블록 없음"
+    assert problems["camera_meta"] == "camera_meta 없음"
+
+
+def test_cli_merges_derived_fields_before_linting(settings, tmp_path, capsys):
+    # 기본 설정(derive_fields)이면 모델은 Derived_Fields 필드를 생략한 JSON을 낸다
+    path = tmp_path / "response.md"
+    path.write_text(render_canned_response(build_combined_prompt(settings, None, "make it")), encoding="utf-8")
+
+    assert main([str(path)]) == 0
+    assert "8/8 통과" in capsys.readouterr().out
+
+    assert main([str(path), "--no-derive-fields"]) == 1
+    out = capsys.readouterr().out
+    assert "exterior_format - ≠ 4:5" in out
+    assert "JSON room_types 누락" in out
+
+
+def test_cli_step1_sets_settings_and_derived_values(settings, tmp_path, capsys):
+    step1 = {"project_id": "P7", "city": "Seoul", "fashion_color": "#112233", "aspect_ratio": "9:16"}
+    step1_path = tmp_path / "step1.json"
+    step1_path.write_text(json.dumps(step1), encoding="utf-8")
+    derive_settings = dict(settings, city="Seoul", fashion_color="#112233", aspect_ratio="9:16")
+    response = render_canned_response(build_combined_prompt(derive_settings, step1, "make it"))
+    path = tmp_path / "response.md"
+    path.write_text(response, encoding="utf-8")
+
+    assert main([str(path), "--step1", str(step1_path)]) == 0
+    assert "✅ 패션 컬러: #112233" in capsys.readouterr().out
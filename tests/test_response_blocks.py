@@ -0,0 +1,92 @@
+"""response_blocks - fenced 블록 스캔과 핸드오프 블록 선택"""
+
+import json
+
+from response_blocks import ParsedResponse, scan_blocks, select_handoff
+
+HANDOFF = {
+    "schema_version": "5.9.0",
+    "project_id": "P1",
+    "step1_data": {},
+    "step2_data": {},
+    "room_target": {},
+}
+
+
+def fenced(lang, body):
+    return f"```{lang}\n{body}\n```"
+
+
+def test_scan_blocks_records_language_and_body():
+    text = "intro\n" + fenced("markdown", "exterior prompt") + "\n\n" + fenced("JSON", '{"a": 1}') + "\ntail"
+
+    blocks = scan_blocks(text)
+
+    assert [block.lang for block in blocks] == ["markdown", "json"]
+    assert [block.body(text) for block in blocks] == ["exterior prompt", '{"a": 1}']
+    assert all(block.closed for block in blocks)
+    assert text[blocks[1].start:blocks[1].end] == fenced("JSON", '{"a": 1}')
+
+
+def test_unclosed_last_block_is_kept_open():
+    text = fenced("markdown", "done") + "\n```json\n{\"partial\": "
+
+    blocks = scan_blocks(text)
+
+    assert [block.closed for block in blocks] == [True, False]
+    assert blocks[1].body(text) == '{"partial": '
+
+
+def test_select_handoff_prefers_schema_shaped_block():
+    draft = fenced("json", '{"negative_space_zones": {"kitchen": "GRID_3x3_ZONE_5_6"}}')
+    broken = fenced("json", '{"schema_version": "5.9.0", "project_id": ')
+    handoff = fenced("json", json.dumps(HANDOFF))
+    text = "\n\n".join([draft, broken, handoff])
+
+    block, data = select_handoff(text, scan_blocks(text))
+
+    assert data == HANDOFF
+    assert block.body(text) == json.dumps(HANDOFF)
+
+
+def test_select_handoff_falls_back_to_first_parsable_json():
+    text = "\n".join([fenced("json", "{not json"), fenced("json", '{"light_kelvin": 2700}')])
+
+    _, data = select_handoff(text, scan_blocks(text))
+
+    assert data == {"light_kelvin": 2700}
+
+
+def test_select_handoff_ignores_unclosed_and_other_languages():
+    text = fenced("markdown", json.dumps(HANDOFF)) + "\n```json\n" + json.dumps(HANDOFF)
+
+    assert select_handoff(text, scan_blocks(text)) == (None, None)
+
+
+def test_parsed_response_sections():
+    text = "\n".join([
+        "2.1 외관 프롬프트(배경) [마크다운]",
+        fenced("markdown", "Exterior of a loft in Paris."),
+        "2.2 인테리어 4-쿼드런트 프롬프트(인테리어) [마크다운]",
+        fenced("markdown", "Seamless quad.\n\nUpper-left quadrant - KITCHEN: Oak counters.\n\n"
+                           "Upper-right quadrant - LIVING: Linen sofa."),
+        "=== STEP 3용 복사 ===",
+        fenced("json", json.dumps(HANDOFF)),
+        "[네거티브 프롬프트 - TARGET_MODEL]",
+        "--no people",
+        "✅ STEP 2 QA 체크리스트",
+        "? JSON 블록 정상 출력",
+    ])
+
+    parsed = ParsedResponse(text)
+    sections = parsed.sections
+
+    assert parsed.json_data == HANDOFF
+    assert sections["exterior"] == "Exterior of a loft in Paris."
+    assert [(position, label) for position, label, _ in sections["quadrants"]] == [
+        ("Upper-left", "KITCHEN"),
+        ("Upper-right", "LIVING"),
+    ]
+    assert sections["negative"] == "--no people"
+    assert sections["qa"] == "? JSON 블록 정상 출력"
+    assert '"schema_version"' not in parsed.clean_text
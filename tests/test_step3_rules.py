@@ -0,0 +1,127 @@
+"""step3_rules - §0.6 FORMAT MAPPING / §2.2 카메라 표 기반 로컬 계산 필드와 병합"""
+
+from core import build_combined_prompt, default_settings, make_assistant_message
+from fake_responses import render_canned_response
+from step3_rules import (
+    derive_camera,
+    derive_formats,
+    derive_handoff,
+    derived_fields_line,
+    derived_paths,
+    merge_derived,
+    omit_paths,
+    parse_derived_fields_line,
+)
+
+
+def test_format_mapping_from_rules_table():
+    assert derive_formats({"aspect_ratio": "9:16"}) == {"exterior_format": "9:16", "interior_format": "1:1"}
+    assert derive_formats({}) == {"exterior_format": "16:9", "interior_format": "1:1"}
+    # 표에 없는 비율은 exterior_format을 모델에 맡김
+    assert derive_formats({"aspect_ratio": "3:2"}) == {"interior_format": "1:1"}
+
+
+def test_derive_handoff_only_contains_table_backed_fields():
+    settings = dict(default_settings(), city="Paris (FR)")
+    derived = derive_handoff(settings, {"biometric_ids": ["bio_1", " "]}, schema_version="5.9.0")
+
+    assert derived["schema_version"] == "5.9.0"
+    assert derived["step1_data"]["city"] == "Paris"
+    assert derived["step1_data"]["biometric_ids"] == ["bio_1"]
+    assert derived["step2_data"]["room_types"] == settings["room_types"]
+    for field in ("light_kelvin", "entropy"):
+        assert field not in derived["step2_data"]
+
+
+def test_camera_meta_from_lens_and_height_tables():
+    camera = derive_camera(dict(default_settings(), housing_type="VILLA", room_types=["Kitchen", "Bedroom", "Laundry"]))
+
+    assert camera["default"]["lens_mm_range"] == "35-85mm"
+    assert camera["default"]["tilt_correction"].startswith("Tilt-shift lens effect")
+    assert "eye_level_cm" not in camera["default"]
+    # 높이 규칙이 없는 룸(Laundry)은 default 사용
+    assert set(camera["overrides"]) == {"kitchen", "bedroom"}
+    assert camera["overrides"]["bedroom"]["eye_level_cm"] == 60
+    assert camera["overrides"]["bedroom"]["camera_angle"] == "low angle"
+    assert camera["overrides"]["kitchen"]["lens_mm_range"] == "35-85mm"
+    assert "vanishing_lines" not in camera["overrides"]["kitchen"]
+
+
+def test_studio_camera_has_no_room_overrides():
+    camera = derive_camera(dict(default_settings(), housing_type="STUDIO"))
+
+    assert camera["default"]["lens_mm_range"] == "24-50mm"
+    assert "overrides" not in camera
+
+
+def test_studio_leaves_room_types_to_model():
+    derived = derive_handoff(dict(default_settings(), housing_type="STUDIO"))
+
+    assert "room_types" not in derived["step2_data"]
+    assert "biometric_ids" not in derived["step1_data"]
+
+
+def test_derived_fields_line_round_trip():
+    derived = derive_handoff(default_settings(), schema_version="5.9.0")
+    prompt = "Project_ID: P1\n" + derived_fields_line(derived) + "\nEntropy_Level: 5"
+
+    assert parse_derived_fields_line(prompt) == derived_paths(derived)
+    assert "step2_data.camera_meta.overrides.bedroom.eye_level_cm" in derived_paths(derived)
+    assert "step2_data.camera_meta.default.{lens_mm_range, tilt_correction}" in prompt
+    # 같은 키를 가진 룸 overrides는 한 조각으로 묶음
+    assert "step2_data.camera_meta.overrides.{kitchen, living, bedroom}.{eye_level_cm, camera_angle," in prompt
+    assert "LOCAL (omit from the Step 3 JSON: schema_version, project_id, step1_data.{" in prompt
+    assert parse_derived_fields_line("no line here") == []
+
+
+def test_omitted_camera_fields_merge_into_valid_handoff():
+    settings = default_settings()
+    message = make_assistant_message(
+        render_canned_response(build_combined_prompt(settings, None, "make it")),
+        derive_handoff(settings, schema_version="5.9.0"),
+    )
+
+    camera = message["json_data"]["step2_data"]["camera_meta"]
+    assert message["schema_errors"] == []
+    assert camera["overrides"]["living"]["eye_level_cm"] == 90
+    # 표에 없는 값(vanishing_lines, default 높이)은 모델 값 유지
+    assert camera["overrides"]["living"]["vanishing_lines"] == "two-point"
+    assert camera["default"]["eye_level_cm"] == 120
+
+
+def test_merge_fills_missing_and_keeps_model_values():
+    model = {"step2_data": {"exterior_format": "4:5", "secondary_color": None}, "room_target": {"room_type": "kitchen"}}
+    derived = {"project_id": "P1", "step2_data": {"exterior_format": "16:9", "secondary_color": "#112233"}}
+
+    merged = merge_derived(model, derived)
+
+    assert merged["project_id"] == "P1"
+    assert merged["step2_data"] == {"exterior_format": "4:5", "secondary_color": "#112233"}
+    assert merged["room_target"] == {"room_type": "kitchen"}
+    assert model["step2_data"]["secondary_color"] is None
+
+
+def test_merge_override_and_missing_json():
+    model = {"step2_data": {"exterior_format": "4:5"}}
+    derived = {"step2_data": {"exterior_format": "16:9"}}
+
+    assert merge_derived(model, derived, override=True)["step2_data"]["exterior_format"] == "16:9"
+    assert merge_derived(None, derived) is None
+    assert merge_derived(model, None) is model
+
+
+def test_omit_paths_returns_trimmed_copy():
+    data = {"schema_version": "5.9.0", "step1_data": {"city": "Paris", "season": "WINTER"}}
+
+    data["step2_data"] = {"camera_meta": {"default": {"lens_mm_range": "24mm", "vanishing_lines": "two-point"}}}
+
+    trimmed = omit_paths(data, [
+        "schema_version", "step1_data.city", "step2_data.missing",
+        "step2_data.camera_meta.default.lens_mm_range", "step2_data.camera_meta.overrides.kitchen.eye_level_cm",
+    ])
+
+    assert trimmed == {
+        "step1_data": {"season": "WINTER"},
+        "step2_data": {"camera_meta": {"default": {"vanishing_lines": "two-point"}}},
+    }
+    assert data["step1_data"]["city"] == "Paris"
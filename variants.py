@@ -0,0 +1,181 @@
+"""
+LG Art Director System STEP 2 v5.9.0 - Variant Generator
+같은 조합 프롬프트로 N개 변형을 동시에 생성하고 로컬 점수로 순위를 매겨 최선안을 고름
+
+- 변형마다 temperature / top_p와 변형 seed 지시문을 달리해 서로 다른 해석을 유도
+  (설치된 SDK의 GenerationConfig에는 seed 필드가 없어 프롬프트 지시문으로 대신함)
+- 점수: Step 3 JSON 스키마 검증, room_types 전체 반영, 비율 일치, 필수 섹션 존재 (모델 호출 없음)
+- 전체 지연 ≈ 가장 긴 변형 하나 (순차 재생성 N회 대신 한 번의 대기)
+"""
+
+import asyncio
+import time
+
+from client_pool import run_coroutine
+from core import GENERATION_CONFIG, estimate_tokens, get_chat_session
+from handoff_schema import validate_handoff
+from history import history_tokens
+from rate_limit import get_rate_limiter
+from response_blocks import ParsedResponse
+from step3_rules import merge_derived
+
+DEFAULT_VARIANTS = 3
+MAX_VARIANTS = 4
+# 변형 i의 (temperature, top_p) - 첫 변형은 기본 설정
+VARIANT_SAMPLING = [
+    (GENERATION_CONFIG["temperature"], GENERATION_CONFIG["top_p"]),
+    (0.95, 0.95),
+    (0.5, 0.9),
+    (1.1, 0.98),
+]
+VARIANT_TAG = "[VARIANT]"
+
+# 점수 항목별 가중치 (합계 100)
+SCORE_WEIGHTS = {
+    "schema": 40,
+    "room_types": 25,
+    "aspect_ratio": 15,
+    "sections": 20,
+}
+REQUIRED_SECTIONS = ("exterior", "interior", "negative")
+
+
+def variant_config(index):
+    """변형 index의 generation_config"""
+    temperature, top_p = VARIANT_SAMPLING[index % len(VARIANT_SAMPLING)]
+    return dict(GENERATION_CONFIG, temperature=temperature, top_p=top_p)
+
+
+def variant_prompt(combined_prompt, index, count, seed):
+    """첫 변형은 원래 프롬프트, 나머지는 seed 지시문을 덧붙여 다른 해석 유도"""
+    if index == 0:
+        return combined_prompt
+    return "\n".join([
+        combined_prompt,
+        "",
+        VARIANT_TAG,
+        f"Variant {index + 1}/{count} (seed {seed + index}): produce an independent interpretation "
+        "with different materials, light and camera choices while keeping every inherited value and rule.",
+    ])
+
+
+def score_response(text, settings, derived=None):
+    """
+    로컬 점수 {"score": 0-100, "checks": [{"name", "ok", "detail"}], "schema_errors", "json_data", "text_content"}
+    파싱 결과도 함께 반환해 화면 / 변형 교체 시 다시 파싱하지 않음
+    부분 점수: 스키마 오류 수 / 누락 룸 수 / 누락 섹션 수에 비례해 감점
+    derived: 로컬 계산 Step 3 필드 (있으면 병합한 JSON으로 채점)
+    """
+    parsed = ParsedResponse(text)
+    json_data = merge_derived(parsed.json_data, derived)
+    sections = parsed.sections
+    checks = []
+    score = 0.0
+
+    schema_errors = validate_handoff(json_data) if isinstance(json_data, dict) else []
+    if not isinstance(json_data, dict):
+        checks.append({"name": "schema", "ok": False, "detail": "Step 3 JSON 없음"})
+    else:
+        ok = not schema_errors
+        score += SCORE_WEIGHTS["schema"] * (1.0 if ok else max(0.0, 0.5 - 0.05 * len(schema_errors)))
+        checks.append({"name": "schema", "ok": ok, "detail": "통과" if ok else f"오류 {len(schema_errors)}건"})
+
+    step2 = json_data.get("step2_data") if isinstance(json_data, dict) else None
+    step2 = step2 if isinstance(step2, dict) else {}
+    if settings.get("housing_type") == "STUDIO":
+        # 스튜디오는 같은 공간의 4개 앵글 (§6.3)
+        missing = [] if len(sections["quadrants"]) >= 4 else ["쿼드런트 4개"]
+        room_score = 0.0 if missing else 1.0
+    else:
+        expected_rooms = [room.lower() for room in settings.get("room_types") or []]
+        json_rooms = {str(room).lower() for room in step2.get("room_types") or []}
+        quadrant_rooms = {label.lower() for _, label, _ in sections["quadrants"]}
+        missing = [room for room in expected_rooms if room not in json_rooms or room not in quadrant_rooms]
+        room_score = 1 - len(missing) / len(expected_rooms) if expected_rooms else 1.0
+    score += SCORE_WEIGHTS["room_types"] * room_score
+    checks.append({"name": "room_types", "ok": not missing, "detail": "전체 반영" if not missing else f"누락: {', '.join(missing)}"})
+
+    expected_ratio = settings.get("aspect_ratio")
+    exterior_format = step2.get("exterior_format")
+    ratio_ok = exterior_format == expected_ratio and f"{expected_ratio} format" in sections["exterior"]
+    score += SCORE_WEIGHTS["aspect_ratio"] * (1 if ratio_ok else 0.5 if exterior_format == expected_ratio else 0)
+    checks.append({
+        "name": "aspect_ratio",
+        "ok": ratio_ok,
+        "detail": f"{expected_ratio}" if ratio_ok else f"기대 {expected_ratio} / JSON {exterior_format or '-'}",
+    })
+
+    missing_sections = [name for name in REQUIRED_SECTIONS if not sections[name]]
+    score += SCORE_WEIGHTS["sections"] * (1 - len(missing_sections) / len(REQUIRED_SECTIONS))
+    checks.append({
+        "name": "sections",
+        "ok": not missing_sections,
+        "detail": "전체" if not missing_sections else f"누락: {', '.join(missing_sections)}",
+    })
+
+    return {
+        "score": round(score, 1),
+        "checks": checks,
+        "schema_errors": schema_errors,
+        "json_data": json_data,
+        "text_content": parsed.clean_text,
+    }
+
+
+async def _run_variant(backend, model_name, history, system_instruction, index, prompt, trace=None):
+    started = time.perf_counter()
+    chat = get_chat_session(backend, model_name, history, system_instruction, generation_config=variant_config(index))
+    response = await get_rate_limiter().call_async(
+        lambda: chat.send_message_async(prompt),
+        input_tokens=estimate_tokens(system_instruction) + history_tokens(history) + estimate_tokens(prompt),
+        trace=trace,
+    )
+    if trace is not None:
+        # 완료 시점은 첫 토큰 시점이 아니므로 ttft_ms는 비워 둠
+        trace.add_usage(response)
+    return response.text or "", (time.perf_counter() - started) * 1000
+
+
+async def generate_variants(backend, model_name, settings, combined_prompt, count=DEFAULT_VARIANTS, history=None,
+                            system_instruction=None, seed=0, trace=None, derived=None):
+    """
+    N개 변형 동시 생성 후 점수순 정렬
+    반환: [{"index", "content", "score", "checks", "schema_errors", "json_data", "text_content", "elapsed_ms", "temperature"}]
+    (점수 내림차순)
+    일부 변형이 실패해도 나머지로 순위를 매기며, 전부 실패하면 첫 예외를 전파
+    """
+    count = max(1, min(int(count), MAX_VARIANTS))
+    outcomes = await asyncio.gather(*[
+        _run_variant(
+            backend, model_name, list(history or []), system_instruction, index,
+            variant_prompt(combined_prompt, index, count, seed), trace,
+        )
+        for index in range(count)
+    ], return_exceptions=True)
+
+    variants = []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, BaseException):
+            continue
+        text, elapsed_ms = outcome
+        variants.append({
+            "index": index,
+            "content": text,
+            **score_response(text, settings, derived),
+            "elapsed_ms": round(elapsed_ms, 1),
+            "temperature": variant_config(index)["temperature"],
+        })
+    if not variants:
+        raise next(outcome for outcome in outcomes if isinstance(outcome, BaseException))
+    if trace is not None:
+        trace.update(variants=len(variants), variant_failures=count - len(variants))
+    return sorted(variants, key=lambda variant: (-variant["score"], variant["index"]))
+
+
+def run_variants(backend, model_name, settings, combined_prompt, count=DEFAULT_VARIANTS, history=None,
+                 system_instruction=None, seed=0, trace=None, derived=None):
+    """동기 진입점 (Streamlit 등 이벤트 루프 밖에서 호출)"""
+    return run_coroutine(generate_variants(
+        backend, model_name, settings, combined_prompt, count, history, system_instruction, seed,
+        trace=trace, derived=derived,
+    ))